@@ -0,0 +1,154 @@
+# archetypes.py
+# 設定表編譯：啟動時檢查 CELL_CONFIG / VIRUS_CONFIG / WEAPON_CONFIG，轉成不可變的 archetype 紀錄
+# (預先算好每個角度的方向向量、以 tick 計的冷卻、整數類型代碼)，熱路徑不再逐次查 dict / 組字串 / 算三角函數。
+# 設定表可在執行中重新載入 (reload_if_changed)：玩家武器下一發就生效，敵人從下一隻生成開始生效
+import importlib
+import math
+import os
+from collections import namedtuple
+
+import config
+from bullets import KIND_CODES
+
+# 子彈的靜態參數 (BulletStore.spawn 直接讀欄位)
+BulletSpec = namedtuple("BulletSpec", "kind damage speed size range bounce bounce_damage color")
+# 玩家武器：directions 為每個固定角度預先算好的 (dx, dy)；random_arc 時改在發射當下隨機取角度
+WeaponArchetype = namedtuple("WeaponArchetype", "key bullet cooldown_ticks directions random_arc")
+CellArchetype = namedtuple("CellArchetype", "skin_id name hp speed bullet_speed damage color")
+# 敵人：fire_offsets 為相對發射點的 x 偏移 (單發 / 雙發)
+EnemyArchetype = namedtuple("EnemyArchetype", "type_id hp speed size score drop_rate kill_bonus bullet fire_rate fire_offsets")
+Tables = namedtuple("Tables", "cells enemies weapons default_weapon boss_bullet")
+
+BOSS_TYPE = 999
+RANDOM_ARC = "random_45_135"
+ARC_RANGE = (-135, -45) # 弧射的隨機發射角度 (上方)
+FIRE_OFFSETS = {"single": (0,), "double": (-15, 15)}
+
+class ConfigError(ValueError):
+    """設定表內容不合法 (啟動時直接失敗；熱重載時保留舊的表)"""
+
+def _number(errors, where, value, minimum=0):
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or value < minimum:
+        errors.append(f"{where}: expected number >= {minimum}, got {value!r}")
+        return minimum
+    return value
+
+def _require(errors, where, conf, keys):
+    missing = [k for k in keys if k not in conf]
+    if missing:
+        errors.append(f"{where}: missing {', '.join(missing)}")
+    return not missing
+
+def _bullet(errors, where, conf, default_speed=10):
+    kind = conf.get("type", "linear")
+    if kind not in KIND_CODES:
+        errors.append(f"{where}: unknown bullet type {kind!r}")
+        kind = "linear"
+    return BulletSpec(
+        kind=KIND_CODES[kind],
+        damage=_number(errors, f"{where}.damage", conf.get("damage", 1)),
+        speed=_number(errors, f"{where}.speed", conf.get("speed", default_speed)),
+        size=_number(errors, f"{where}.size", conf.get("size", 5), 1),
+        range=_number(errors, f"{where}.range", conf.get("range", 9999), 1),
+        bounce=int(_number(errors, f"{where}.bounce", conf.get("bounce", 0))),
+        bounce_damage=_number(errors, f"{where}.bounce_damage", conf.get("bounce_damage", 0.3)),
+        color=conf.get("color", None),
+    )
+
+def _weapon(errors, key, conf, sim_fps, fire_cooldown):
+    where = f"WEAPON_CONFIG[{key!r}]"
+    bullet = _bullet(errors, where, conf)
+    mult = _number(errors, f"{where}.fire_rate_mult", conf.get("fire_rate_mult", 1.0))
+    if mult <= 0:
+        errors.append(f"{where}.fire_rate_mult: must be > 0")
+        mult = 1.0
+    angles = conf.get("angles")
+    directions, random_arc = (), False
+    if angles == RANDOM_ARC:
+        random_arc = True
+    elif isinstance(angles, list) and angles:
+        directions = tuple((math.cos(math.radians(a)) * bullet.speed, math.sin(math.radians(a)) * bullet.speed)
+                           for a in (_number(errors, f"{where}.angles", a, -360) for a in angles))
+    else:
+        errors.append(f"{where}.angles: expected a non-empty list or {RANDOM_ARC!r}")
+    return WeaponArchetype(key, bullet, fire_cooldown * sim_fps / mult, directions, random_arc)
+
+def _enemy(errors, type_id, conf):
+    where = f"VIRUS_CONFIG[{type_id}]"
+    if not _require(errors, where, conf, ("hp", "speed", "size", "score", "drop_rate")):
+        return None
+    bullet, fire_rate, offsets = None, 0.0, ()
+    if type_id == BOSS_TYPE:
+        _require(errors, where, conf, ("kill_bonus",))
+    else:
+        attack = conf.get("attack")
+        if not isinstance(attack, dict) or not _require(errors, f"{where}.attack", attack,
+                                                         ("mode", "damage", "bullet_speed", "fire_rate")):
+            errors.append(f"{where}.attack: required for normal enemies")
+            return None
+        offsets = FIRE_OFFSETS.get(attack["mode"])
+        if offsets is None:
+            errors.append(f"{where}.attack.mode: unknown mode {attack['mode']!r}")
+            offsets = FIRE_OFFSETS["single"]
+        bullet = _bullet(errors, f"{where}.attack", {"damage": attack["damage"], "speed": attack["bullet_speed"]})
+        fire_rate = _number(errors, f"{where}.attack.fire_rate", attack["fire_rate"])
+    drop_rate = _number(errors, f"{where}.drop_rate", conf["drop_rate"])
+    if drop_rate > 1:
+        errors.append(f"{where}.drop_rate: must be <= 1")
+    return EnemyArchetype(
+        type_id=type_id, hp=_number(errors, f"{where}.hp", conf["hp"], 1),
+        speed=_number(errors, f"{where}.speed", conf["speed"]), size=_number(errors, f"{where}.size", conf["size"], 1),
+        score=_number(errors, f"{where}.score", conf["score"]), drop_rate=drop_rate,
+        kill_bonus=conf.get("kill_bonus", 0), bullet=bullet, fire_rate=fire_rate, fire_offsets=offsets,
+    )
+
+def compile_tables(cfg):
+    """檢查並編譯設定表；有任何錯誤就丟出 ConfigError (一次列出全部問題)"""
+    errors = []
+    cells = {}
+    for skin_id, conf in cfg.CELL_CONFIG.items():
+        where = f"CELL_CONFIG[{skin_id}]"
+        if _require(errors, where, conf, ("name", "hp", "speed", "bullet_speed", "damage", "color")):
+            cells[skin_id] = CellArchetype(
+                skin_id, conf["name"], _number(errors, f"{where}.hp", conf["hp"], 1),
+                _number(errors, f"{where}.speed", conf["speed"]), conf["bullet_speed"], conf["damage"], conf["color"])
+    enemies = {}
+    for type_id, conf in cfg.VIRUS_CONFIG.items():
+        enemy = _enemy(errors, type_id, conf)
+        if enemy is not None:
+            enemies[type_id] = enemy
+    weapons = {key: _weapon(errors, key, conf, cfg.SIM_FPS, cfg.FIRE_COOLDOWN) for key, conf in cfg.WEAPON_CONFIG.items()}
+    if "default" not in weapons:
+        errors.append("WEAPON_CONFIG: missing 'default'")
+    if BOSS_TYPE not in cfg.VIRUS_CONFIG:
+        errors.append(f"VIRUS_CONFIG: missing boss type {BOSS_TYPE}")
+    if errors:
+        raise ConfigError("invalid game config:\n  " + "\n  ".join(errors))
+    boss_bullet = BulletSpec(KIND_CODES["linear"], 1, 0, 10, 9999, 0, 0.3, None)
+    return Tables(cells, enemies, weapons, weapons["default"], boss_bullet)
+
+# 目前生效的表 (模組載入時編譯，設定錯誤會讓啟動直接失敗)
+current = compile_tables(config)
+_config_mtime = os.stat(config.__file__).st_mtime_ns
+
+def reload_if_changed():
+    """config.py 有變動時重新載入並編譯三張表；失敗時保留舊表並回傳錯誤訊息，成功回傳 True，沒變回傳 False
+    (只有 CELL / VIRUS / WEAPON 三張表會熱更新，其他常數仍需重啟)"""
+    global current, _config_mtime
+    mtime = os.stat(config.__file__).st_mtime_ns
+    if mtime == _config_mtime:
+        return False
+    _config_mtime = mtime
+    try:
+        current = compile_tables(importlib.reload(config))
+    except Exception as e: # 編輯到一半的檔案可能丟出任何例外 (NameError、表格式錯誤的 TypeError...)
+        return str(e) if isinstance(e, ConfigError) else f"{type(e).__name__}: {e}"
+    return True
+
+def log_reload(tag):
+    """reload_if_changed() 並把結果印出 (server.py / workers.py 定期呼叫)"""
+    result = reload_if_changed()
+    if result is True:
+        print(f"[{tag}] config tables reloaded")
+    elif result:
+        print(f"[{tag}] config reload rejected, keeping previous tables:\n{result}")
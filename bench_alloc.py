@@ -0,0 +1,108 @@
+# bench_alloc.py
+# 實體配置壓力測試：模擬長時間遊玩中敵人/道具不斷生成與消失，比較
+#   legacy  舊寫法 (每個實體一個 __dict__ + uuid4 字串 id，用完丟掉)
+#   fresh   __slots__ + 整數 id，但不回收 (EntityPool(enabled=False))
+#   pooled  __slots__ + 整數 id + free-list 回收 (房間實際使用的方式)
+# 回報每個生成/消失循環的耗時、每組 (敵人+道具) 佔用的 GC 追蹤物件數與記憶體、各代 GC 次數與最長 GC 暫停
+# (完整 GC 的成本與被追蹤的物件數成正比；__slots__ 物件沒有額外的 __dict__)
+#
+#   python bench_alloc.py --cycles 200000
+import argparse
+import gc
+import itertools
+import random
+import time
+import tracemalloc
+import uuid
+
+from config import VIRUS_CONFIG, MAP_WIDTH
+from game_objects import Enemy, Item, EntityPool
+
+class LegacyEnemy:
+    """舊版 Enemy 的配置型態 (僅供對照)"""
+    def __init__(self, type_id, rng):
+        stats = VIRUS_CONFIG[type_id]
+        self.x = rng.randint(0, MAP_WIDTH - stats["size"])
+        self.y = rng.randint(-100, 0)
+        self.size = stats["size"]
+        self.rng = rng
+        self.id = str(uuid.uuid4())
+        self.type = type_id
+        self.hp = self.max_hp = stats["hp"]
+        self.speed = stats["speed"]
+        self.score = stats["score"]
+        self.prob_drop = stats["drop_rate"]
+        self.move_timer = self.dx = self.dy = 0
+
+class LegacyItem:
+    def __init__(self, x, y, item_type):
+        self.x, self.y, self.size = x, y, 20
+        self.id = str(uuid.uuid4())
+        self.item_type = item_type
+        self.dy = 2
+
+def churn(mode, cycles, live, seed):
+    """維持 live 隻敵人與道具，每個循環殺掉最舊的一隻並生成一隻新的"""
+    rng = random.Random(seed)
+    next_id = itertools.count(1).__next__
+    enemy_pool = EntityPool(Enemy, enabled=(mode == "pooled"))
+    item_pool = EntityPool(Item, enabled=(mode == "pooled"))
+
+    def spawn():
+        if mode == "legacy":
+            enemy = LegacyEnemy(rng.choice((1, 2, 3)), rng)
+            return enemy, LegacyItem(enemy.x, enemy.y, "spread")
+        enemy = enemy_pool.acquire(next_id(), rng.choice((1, 2, 3)), rng)
+        return enemy, item_pool.acquire(next_id(), enemy.x, enemy.y, "spread")
+
+    enemies, items = {}, []
+    gc.collect()
+    tracked_before = len(gc.get_objects())
+    tracemalloc.start()
+    for _ in range(live):
+        enemy, item = spawn()
+        enemies[enemy.id] = enemy
+        items.append(item)
+    live_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    tracked = (len(gc.get_objects()) - tracked_before) / live
+
+    runs = [0, 0, 0]
+    pauses = []
+    started = [0.0]
+    def on_gc(phase, info):
+        if phase == "start":
+            runs[info["generation"]] += 1
+            started[0] = time.perf_counter()
+        else:
+            pauses.append(time.perf_counter() - started[0])
+    gc.collect()
+    gc.callbacks.append(on_gc)
+    t0 = time.perf_counter()
+    try:
+        for _ in range(cycles):
+            old_id = next(iter(enemies))
+            enemy_pool.release(enemies.pop(old_id))
+            item_pool.release(items.pop(0))
+            enemy, item = spawn()
+            enemies[enemy.id] = enemy
+            items.append(item)
+    finally:
+        elapsed = time.perf_counter() - t0
+        gc.callbacks.remove(on_gc)
+    return elapsed / cycles, tracked, live_bytes / live, runs, max(pauses, default=0.0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Entity allocation / GC pressure benchmark")
+    parser.add_argument("--cycles", type=int, default=200000)
+    parser.add_argument("--live", type=int, default=64, help="enemies and items kept alive at once")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    print(f"{'mode':<8}{'ns/cycle':>10}{'tracked':>9}{'bytes':>7}{'gen0':>7}{'gen1':>7}{'gen2':>7}{'max pause ms':>14}")
+    for mode in ("legacy", "fresh", "pooled"):
+        per_cycle, tracked, nbytes, (gen0, gen1, gen2), pause = churn(mode, args.cycles, args.live, args.seed)
+        print(f"{mode:<8}{per_cycle * 1e9:>10.0f}{tracked:>9.1f}{nbytes:>7.0f}{gen0:>7}{gen1:>7}{gen2:>7}{pause * 1000:>14.3f}")
+
+if __name__ == "__main__":
+    main()
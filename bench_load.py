@@ -0,0 +1,305 @@
+# bench_load.py
+# 端到端壓力測試：在本機啟動 server (或連上本機已在跑的 server)，用大量 asyncio socket.io client 模擬瀏覽器：
+# join_game 後以前端相同的頻率送 move (帶序號) / shoot / use_skill，完整解碼每個 state_update (含音效事件)。
+# 人數分段遞增，每段回報：輸入到畫面的延遲 (送出 move 到收到 ack 涵蓋該序號的快照)、快照到達間隔與抖動、
+# 每位 client 的下行流量，以及從 /metrics 取得的 server tick 耗時、overrun 與過載降級等級。只允許連本機
+#
+#   python bench_load.py --ramp 50,200,500,1000 --step-seconds 20 --procs 4
+#   python bench_load.py --ramp 100,300 --room-workers 4                 # server 用 worker 行程跑房間
+#   python bench_load.py --url http://127.0.0.1:8000 --ramp 100         # 連上已在跑的 server
+#
+# client 端需要 aiohttp (python-socketio 的 asyncio client 依賴)；client 數上千時用 --procs 分散到多個行程
+import argparse
+import asyncio
+import multiprocessing as mp
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+import socketio
+
+from config import SIM_FPS, MAX_MOVE_STEPS_PER_TICK
+from protocol import SnapshotDecoder
+
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+MOVE_INTERVAL = 1 / (SIM_FPS * MAX_MOVE_STEPS_PER_TICK) # 與 frontend/main.js 的 MOVE_SEND_MS 相同
+FIRE_INTERVAL = 0.15 # 前端 doFire 的連射限制
+SKILL_INTERVAL = 3.0 # 每隔幾秒檢查一次能量，有就放技能
+CONNECT_BATCH = 50   # 同時建立連線的數量
+SAMPLE_CAP = 20000   # 每段每個行程最多回傳幾筆延遲樣本
+
+class LoadClient:
+    """一個模擬玩家：搖桿方向每 0.3~1.5 秒換一次 (約四分之一的時間放開)，按住射擊，偶爾放技能"""
+    def __init__(self, index, rng, stats):
+        self.index = index
+        self.rng = rng
+        self.stats = stats
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.decoder = SnapshotDecoder()
+        self.seq = 0
+        self.sent = {} # seq -> 送出時間 (尚未被 ack)
+        self.last_arrival = None
+        self.tasks = []
+        self.sio.on("state_update", self.on_state)
+        self.sio.on("disconnect", self.on_disconnect)
+        self.sio.on("server_busy", self.on_busy)
+
+    async def start(self, url):
+        await self.sio.connect(url, transports=["websocket"])
+        await self.sio.emit("join_game", {"name": f"load{self.index}"[:8]})
+        self.tasks = [asyncio.create_task(self._move()), asyncio.create_task(self._fire())]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+    def on_disconnect(self, *args):
+        self.stats["disconnects"] += 1
+
+    def on_busy(self, data):
+        self.stats["rejected"] += 1 # 過載時被拒絕加入 (見 overload.py)
+
+    def on_state(self, data):
+        now = time.perf_counter()
+        stats = self.stats
+        stats["bytes"] += len(data)
+        stats["packets"] += 1
+        if self.last_arrival is not None:
+            stats["interarrival"].append(now - self.last_arrival)
+        self.last_arrival = now
+        if not self.decoder.apply(data):
+            stats["desyncs"] += 1 # delta 的 baseline 不在手上 (封包被丟)，等下一個關鍵幀
+            return
+        ack = self.decoder.ack
+        if ack is None or not self.sent: return
+        for seq in [s for s in self.sent if s <= ack]:
+            stats["latency"].append(now - self.sent.pop(seq))
+
+    async def _move(self):
+        try:
+            await self._move_loop()
+        except socketio.exceptions.SocketIOError:
+            pass # 已斷線
+
+    async def _move_loop(self):
+        dx = dy = 0
+        next_turn = 0.0
+        while True:
+            now = time.perf_counter()
+            if now >= next_turn:
+                held = self.rng.random() > 0.25
+                dx = self.rng.uniform(-1, 1) if held else 0
+                dy = self.rng.uniform(-1, 1) if held else 0
+                next_turn = now + self.rng.uniform(0.3, 1.5)
+            if dx or dy:
+                self.seq += 1
+                self.sent[self.seq] = now
+                await self.sio.emit("move", {"seq": self.seq, "dx": dx, "dy": dy})
+            await asyncio.sleep(MOVE_INTERVAL)
+
+    async def _fire(self):
+        try:
+            await self._fire_loop()
+        except socketio.exceptions.SocketIOError:
+            pass
+
+    async def _fire_loop(self):
+        next_skill = time.perf_counter() + self.rng.uniform(0, SKILL_INTERVAL)
+        while True:
+            await self.sio.emit("shoot")
+            now = time.perf_counter()
+            if now >= next_skill:
+                next_skill = now + SKILL_INTERVAL
+                if self._charge() >= 1:
+                    await self.sio.emit("use_skill")
+            await asyncio.sleep(FIRE_INTERVAL)
+
+    def _charge(self):
+        for meta, state in self.decoder.entities["players"].values():
+            if meta is not None and state is not None and meta[0] == self.sio.sid:
+                return state[5]
+        return 0
+
+def _new_stats():
+    return {"bytes": 0, "packets": 0, "desyncs": 0, "disconnects": 0, "rejected": 0, "connect_errors": 0,
+            "latency": [], "interarrival": []}
+
+def _trim(samples, rng):
+    return samples if len(samples) <= SAMPLE_CAP else rng.sample(samples, SAMPLE_CAP)
+
+async def _agent(url, commands, results, seed):
+    """一個行程內的 client 群：依指令增加到指定人數，量測一段時間後回傳統計"""
+    rng = random.Random(seed)
+    clients = []
+    stats = _new_stats()
+    loop = asyncio.get_running_loop()
+    while True:
+        cmd = await loop.run_in_executor(None, commands.get)
+        if cmd[0] == "stop":
+            break
+        _, target, warmup, seconds = cmd
+        while len(clients) > target: # 人數往下調 (觀察降級後的恢復)
+            await clients.pop().stop()
+        while len(clients) < target:
+            batch = [LoadClient(seed * 100000 + len(clients) + i, random.Random(rng.random()), stats)
+                     for i in range(min(CONNECT_BATCH, target - len(clients)))]
+            done = await asyncio.gather(*(c.start(url) for c in batch), return_exceptions=True)
+            for c, result in zip(batch, done):
+                if isinstance(result, Exception):
+                    stats["connect_errors"] += 1
+                else:
+                    clients.append(c)
+            if not any(c.sio.connected for c in batch): break # server 已不接受連線
+        await asyncio.sleep(warmup)
+        stats.clear()
+        stats.update(_new_stats())
+        results.put(("started", None))
+        started, cpu = time.perf_counter(), time.process_time()
+        await asyncio.sleep(seconds)
+        elapsed = time.perf_counter() - started
+        # client 行程本身的 CPU 使用率：接近 100% 時量到的延遲包含產生負載的一方，需要加 --procs
+        out = dict(stats, elapsed=elapsed, cpu=(time.process_time() - cpu) / elapsed,
+                   connected=sum(c.sio.connected for c in clients),
+                   latency=_trim(stats["latency"], rng), interarrival=_trim(stats["interarrival"], rng))
+        results.put(("done", out))
+    await asyncio.gather(*(c.stop() for c in clients), return_exceptions=True)
+
+def agent_main(url, commands, results, seed):
+    asyncio.run(_agent(url, commands, results, seed))
+
+# --- server 端量測 (/metrics) ---
+SERVER_COUNTERS = ("ticks", "frame_overruns", "dropped_ticks", "snapshots_dropped", "client_resyncs", "slow_evictions")
+
+async def scrape(url):
+    """回傳 ({counter: 所有來源加總}, tick p99 秒, 降級等級 (各來源取最大))；server 沒開量測時回傳 None"""
+    import aiohttp
+    try:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url.rstrip("/") + "/metrics") as resp:
+                text = await resp.text()
+    except aiohttp.ClientError:
+        return None
+    counters = dict.fromkeys(SERVER_COUNTERS, 0.0)
+    tick_p99 = 0.0
+    shed_level = 0
+    for line in text.splitlines():
+        if line.startswith("#") or " " not in line: continue
+        name, value = line.rsplit(" ", 1)
+        metric = name.split("{", 1)[0]
+        if metric.startswith("cellwars_") and metric.endswith("_total") and metric[9:-6] in counters:
+            counters[metric[9:-6]] += float(value)
+        elif metric == "cellwars_tick_seconds" and 'quantile="0.99"' in name:
+            tick_p99 = max(tick_p99, float(value))
+        elif metric == "cellwars_overload_level":
+            shed_level = max(shed_level, int(float(value)))
+    return counters, tick_p99, shed_level
+
+def start_server(port, room_workers):
+    env = dict(os.environ, LEADERBOARD_DB="", ROOM_WORKERS=str(room_workers), METRICS_ENABLED="1")
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "server:sio_app", "--host", "127.0.0.1",
+                             "--port", str(port), "--log-level", "warning"],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+
+async def wait_ready(url, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if await scrape(url) is not None: return
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"server at {url} did not come up within {timeout:.0f} s")
+
+# --- 報表 ---
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def report_header():
+    print(f"{'clients':>8}{'conn':>6}{'lat p50':>9}{'lat p99':>9}{'gap p50':>9}{'gap p99':>9}{'jitter':>8}"
+          f"{'KB/s/cl':>9}{'tick p99':>9}{'overrun':>8}{'dropped':>8}{'snapdrop':>9}{'shed':>5}{'desync':>7}{'disc':>6}{'reject':>7}{'cl cpu':>7}")
+    print(f"{'':>8}{'':>6}{'ms':>9}{'ms':>9}{'ms':>9}{'ms':>9}{'ms':>8}{'':>9}{'ms':>9}")
+
+def report_step(target, parts, before, after):
+    lat = [v for p in parts for v in p["latency"]]
+    gaps = [v for p in parts for v in p["interarrival"]]
+    connected = sum(p["connected"] for p in parts)
+    elapsed = max(p["elapsed"] for p in parts)
+    kbps = sum(p["bytes"] for p in parts) / elapsed / max(connected, 1) / 1024
+    jitter = statistics.pstdev(gaps) * 1000 if len(gaps) > 1 else 0.0
+    line = (f"{target:>8}{connected:>6}{percentile(lat, 50) * 1000:>9.1f}{percentile(lat, 99) * 1000:>9.1f}"
+            f"{percentile(gaps, 50) * 1000:>9.1f}{percentile(gaps, 99) * 1000:>9.1f}{jitter:>8.1f}{kbps:>9.2f}")
+    if before is not None and after is not None:
+        delta = {k: after[0][k] - before[0][k] for k in SERVER_COUNTERS}
+        line += (f"{after[1] * 1000:>9.2f}{delta['frame_overruns']:>8.0f}{delta['dropped_ticks']:>8.0f}"
+                 f"{delta['snapshots_dropped']:>9.0f}{after[2]:>5}")
+    else:
+        line += f"{'-':>9}{'-':>8}{'-':>8}{'-':>9}{'-':>5}"
+    desyncs = sum(p["desyncs"] for p in parts)
+    disconnects = sum(p["disconnects"] for p in parts)
+    rejected = sum(p["rejected"] for p in parts)
+    cpu = max(p["cpu"] for p in parts) * 100
+    print(line + f"{desyncs:>7}{disconnects:>6}{rejected:>7}{cpu:>6.0f}%", flush=True)
+    errors = sum(p["connect_errors"] for p in parts)
+    if errors:
+        print(f"{'':>8}  {errors} connection attempts failed")
+
+async def run(args):
+    ramp = [int(n) for n in args.ramp.split(",")]
+    url = args.url or f"http://127.0.0.1:{args.port}"
+    if urlparse(url).hostname not in LOCAL_HOSTS:
+        raise SystemExit(f"refusing to load-test {url}: only localhost targets are allowed")
+    server = None if args.url else start_server(args.port, args.room_workers)
+    ctx = mp.get_context("spawn")
+    agents = []
+    try:
+        await wait_ready(url)
+        results = ctx.Queue()
+        for i in range(args.procs):
+            commands = ctx.Queue()
+            process = ctx.Process(target=agent_main, args=(url, commands, results, args.seed + i), daemon=True)
+            process.start()
+            agents.append((process, commands))
+        print(f"target {url}  procs {args.procs}  step {args.warmup:.0f}+{args.step_seconds:.0f} s"
+              + ("" if args.url else f"  room workers {args.room_workers}"))
+        report_header()
+        loop = asyncio.get_running_loop()
+        for target in ramp:
+            # 人數平均分給各行程；暖身期間 (連線、加入、第一個關鍵幀) 不計入
+            for i, (_, commands) in enumerate(agents):
+                commands.put(("ramp", target // args.procs + (i < target % args.procs), args.warmup, args.step_seconds))
+            # 每個行程連線完成、暖身後回報 started，全部開始量測時取 server 計數的起點
+            for _ in agents:
+                await loop.run_in_executor(None, results.get)
+            before = await scrape(url)
+            parts = [(await loop.run_in_executor(None, results.get))[1] for _ in agents]
+            after = await scrape(url)
+            report_step(target, parts, before, after)
+    finally:
+        for process, commands in agents:
+            commands.put(("stop",))
+        for process, _ in agents:
+            process.join(timeout=5)
+            if process.is_alive(): process.terminate()
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end socket.io load test against a local server")
+    parser.add_argument("--ramp", default="50,200,500", help="comma separated client counts, one measured step each (may go down)")
+    parser.add_argument("--step-seconds", type=float, default=15.0, help="measurement window per step")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds after ramping up before measuring")
+    parser.add_argument("--procs", type=int, default=1, help="client processes (Python clients are CPU bound)")
+    parser.add_argument("--url", default=None, help="use an already running local server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="port for the server started by this tool")
+    parser.add_argument("--room-workers", type=int, default=0, help="ROOM_WORKERS for the started server")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args(argv)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+# bench_sim.py
+# 無網路的模擬壓力測試：在同一個行程內用合成玩家 (bot) 灌輸入，連續呼叫 Room.update()，
+# 回報 ticks/sec、各階段 p50/p99 耗時與每 tick 配置量。用來抓效能退化與估算機器規格
+#
+#   python bench_sim.py --players 8 --ticks 3000 --weapon all --scenario all
+#   python bench_sim.py --scenario waves --enemies 500      # 大波次 (敵人 AI 批次化的目標規模)
+#   python bench_sim.py --scenario skills --enemies 200     # 所有玩家一直保持 3 格充能，技能持續在場
+import argparse
+from array import array
+import gc
+import random
+import sys
+import time
+import tracemalloc
+
+from config import SIM_FPS
+from metrics import PHASES
+from rooms import Room
+
+WEAPONS = ("default", "spread_lv2", "ricochet_lv2", "arc_lv2")
+SCENARIOS = ("waves", "boss", "skills")
+
+def _buffer(capacity):
+    """預先配置好的 float 樣本緩衝 (量測期間寫入不會新增物件，不影響 sys.getallocatedblocks())"""
+    return array("d", bytes(8 * capacity))
+
+class PhaseRecorder:
+    """Room.profiler 的實作：每個 tick 記錄各階段的 perf_counter 差值 (秒)，最多 capacity 筆"""
+    def __init__(self, capacity):
+        self.buffers = {name: _buffer(capacity) for name in PHASES}
+        self.counts = dict.fromkeys(PHASES, 0)
+        self._last = 0.0
+
+    @property
+    def samples(self):
+        return {name: buf[:self.counts[name]] for name, buf in self.buffers.items()}
+
+    def start(self):
+        self._last = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        i = self.counts[name]
+        if i < len(self.buffers[name]):
+            self.buffers[name][i] = now - self._last
+            self.counts[name] = i + 1
+        self._last = now
+
+class Bot:
+    """腳本化的玩家：每 15 tick 換一次移動方向，每 tick 射擊，有能量就放技能 (charged 時充能永遠補滿)"""
+    def __init__(self, sid, weapon, rng, charged=False):
+        self.sid = sid
+        self.weapon = weapon
+        self.rng = rng
+        self.charged = charged
+        self.dx = self.dy = 0
+
+    def arm(self, player):
+        # 掉命會重置武器，重新吃兩次道具回到 lv2
+        if self.weapon == "default" or player.weapon_type != "default":
+            return
+        item_type = self.weapon.split("_")[0]
+        player.apply_item(item_type)
+        player.apply_item(item_type)
+
+    def act(self, room, tick):
+        if tick % 15 == 0:
+            self.dx = self.rng.choice([-1, 0, 1])
+            self.dy = self.rng.choice([-1, 0, 1])
+        room.move(self.sid, {"dx": self.dx, "dy": self.dy})
+        room.shoot(self.sid)
+        player = room.gs.players[self.sid]
+        if self.charged:
+            player.charge = 3
+        if player.charge >= 1:
+            room.use_skill(self.sid)
+        self.arm(player)
+
+def percentile(values, pct):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run(players, ticks, weapon, scenario, seed, trace, enemies=None):
+    rng = random.Random(seed)
+    room = Room("bench", seed=seed)
+    if enemies is not None: # 大波次：提高上限，約一秒內補滿
+        room.max_enemies = enemies
+        room.enemy_spawns_per_tick = max(1, enemies // SIM_FPS)
+    bots = []
+    for i in range(players):
+        sid = f"bot_{i}"
+        room.join(sid, sid)
+        bots.append(Bot(sid, WEAPONS[i % len(WEAPONS)] if weapon == "all" else weapon, rng, scenario == "skills"))
+    if scenario == "boss":
+        room.spawn_boss()
+    elif enemies is not None:
+        while len(room.gs.enemies) < enemies: # 先補滿再開始計時
+            room.update()
+    room.snapshot() # 送掉加入時的關鍵幀，之後量的是穩定狀態的 delta
+
+    # 量測期間的樣本全部寫進預先配置的緩衝，net alloc blocks 才只反映模擬本身
+    recorder = PhaseRecorder(ticks)
+    room.profiler = recorder
+    gc_runs = [0, 0, 0]
+    gc_pause = [0.0, 0.0] # 開始時間, 最長暫停
+    def on_gc(phase, info):
+        # 記錄每一代的次數與每次暫停時間 (GC 暫停會直接落在 tick 中間)
+        if phase == "start":
+            gc_runs[info["generation"]] += 1
+            gc_pause[0] = time.perf_counter()
+        else:
+            gc_pause[1] = max(gc_pause[1], time.perf_counter() - gc_pause[0])
+    gc.callbacks.append(on_gc)
+    if trace:
+        tracemalloc.start()
+
+    totals = _buffer(ticks)
+    sent_bytes = 0
+    blocks_before = sys.getallocatedblocks()
+    started = time.perf_counter()
+    try:
+        for i in range(ticks):
+            tick = room.gs.clock.tick
+            t0 = time.perf_counter()
+            for bot in bots:
+                bot.act(room, tick)
+            room.update()
+            if room.snapshot_due(): # 與伺服器相同，只在快照 tick 序列化
+                packets = room.snapshot()
+                sent_bytes += sum(len(packet) for _, packet in packets)
+            totals[i] = time.perf_counter() - t0
+    finally:
+        elapsed = time.perf_counter() - started
+        blocks_after = sys.getallocatedblocks()
+        gc.callbacks.remove(on_gc)
+        peak = 0
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        room.profiler = None
+
+    return {
+        "ticks_per_sec": ticks / elapsed,
+        "phases": recorder.samples,
+        "total": totals,
+        "alloc_blocks_per_tick": (blocks_after - blocks_before) / ticks,
+        "gc_per_tick": [n / ticks for n in gc_runs],
+        "gc_max_pause": gc_pause[1],
+        "bytes_per_tick": sent_bytes / ticks,
+        "trace_peak": peak,
+        "entities": (len(room.gs.enemies), len(room.gs.bullets), len(room.gs.items)),
+    }
+
+def report(title, result, trace):
+    print(f"== {title}")
+    print(f"  {result['ticks_per_sec']:.0f} ticks/s  (realtime x{result['ticks_per_sec'] / SIM_FPS:.1f})")
+    print(f"  {'phase':<10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name in PHASES:
+        samples = result["phases"][name]
+        print(f"  {name:<10}{percentile(samples, 50) * 1000:>10.3f}{percentile(samples, 99) * 1000:>10.3f}")
+    print(f"  {'total':<10}{percentile(result['total'], 50) * 1000:>10.3f}{percentile(result['total'], 99) * 1000:>10.3f}")
+    gen0, gen1, gen2 = result["gc_per_tick"]
+    print(f"  net alloc blocks/tick {result['alloc_blocks_per_tick']:+.1f}  "
+          f"gc/tick gen0 {gen0:.3f} gen1 {gen1:.4f} gen2 {gen2:.4f}  max gc pause {result['gc_max_pause'] * 1000:.2f} ms")
+    print(f"  state bytes/tick (all players) {result['bytes_per_tick']:.0f}")
+    if trace:
+        print(f"  tracemalloc peak {result['trace_peak'] / 1024:.1f} KiB")
+    enemies, bullets, items = result["entities"]
+    print(f"  final entities: enemies={enemies} bullets={bullets} items={items}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Room.update() benchmark with synthetic players")
+    parser.add_argument("--players", type=int, default=8)
+    parser.add_argument("--ticks", type=int, default=3000)
+    parser.add_argument("--weapon", choices=WEAPONS + ("all",), default="all",
+                        help="all = bots cycle through every weapon")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--enemies", type=int, default=None, help="raise the enemy cap for a large wave (waves scenario)")
+    parser.add_argument("--tracemalloc", action="store_true", help="also report peak traced memory (slow)")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    for scenario in scenarios:
+        result = run(args.players, args.ticks, args.weapon, scenario, args.seed, args.tracemalloc, args.enemies)
+        wave = f" / {args.enemies} enemies" if args.enemies and scenario != "boss" else ""
+        if scenario == "skills":
+            wave += " / 3 charges"
+        report(f"{scenario} / {args.players} players{wave} / weapon={args.weapon} / {args.ticks} ticks", result, args.tracemalloc)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# bullets.py
+# 子彈改為 Structure-of-Arrays (NumPy)：所有子彈在同一個批次步驟內移動、反彈、
+# 判斷射程與出界，刪除時用 swap-remove 壓實，取代逐顆呼叫 Bullet.update()
+import math
+import random
+import numpy as np
+from config import MAP_WIDTH, MAP_HEIGHT
+
+# 運動類型代碼 (對應 WEAPON_CONFIG 的 "type")
+KIND_CODES = {"linear": 0, "bounce": 1, "arc": 2}
+KIND_NAMES = ("linear", "bounce", "arc")
+KIND_BOUNCE = KIND_CODES["bounce"]
+KIND_ARC = KIND_CODES["arc"]
+
+# 擁有者類型代碼
+OWNER_CODES = {"player": 0, "enemy": 1, "boss": 2}
+OWNER_NAMES = ("player", "enemy", "boss")
+OWNER_PLAYER = OWNER_CODES["player"]
+
+# handle_hit 的結果 (HIT_CONSUMED 為假值，可以直接當「子彈是否保留」用)
+HIT_CONSUMED, HIT_BOUNCED, HIT_RETARGETED = 0, 1, 2 # 子彈消失 / 原路彈回 / 轉向下一個目標
+
+HIT_SET_SIZE = 8 # 彈射子彈記住最近命中的幾個目標 (不重複命中、轉向時略過)；滿了覆蓋最舊的
+
+class BulletRef:
+    """單顆子彈的輕量視圖，讓碰撞判定沿用 check_collision / handle_hit 的寫法"""
+    __slots__ = ("store", "i")
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    x = property(lambda self: float(self.store.x[self.i]))
+    y = property(lambda self: float(self.store.y[self.i]))
+    size = property(lambda self: float(self.store.size[self.i]))
+    damage = property(lambda self: float(self.store.damage[self.i]))
+    bounce_left = property(lambda self: int(self.store.bounce_left[self.i]))
+    b_type = property(lambda self: KIND_NAMES[self.store.kind[self.i]])
+    owner_type = property(lambda self: OWNER_NAMES[self.store.owner_type[self.i]])
+    owner_id = property(lambda self: self.store.owner_id[self.i])
+    hit_set = property(lambda self: self.store.hit_set(self.i))
+
+    def handle_hit(self, target_id, targets=None):
+        return self.store.handle_hit(self.i, target_id, targets)
+
+class BulletStore:
+    # 會隨 swap-remove 一起搬移的 NumPy 欄位
+    FIELDS = (
+        ("x", np.float64), ("y", np.float64), ("dx", np.float64), ("dy", np.float64),
+        ("size", np.float64), ("damage", np.float64), ("speed", np.float64),
+        ("dist_traveled", np.float64), ("range_limit", np.float64),
+        ("bounce_damage_mult", np.float64), ("bounce_left", np.int32),
+        ("curve_dir", np.float64), ("kind", np.int8), ("owner_type", np.int8),
+        ("style", np.int16), ("bid", np.uint16), ("hit_count", np.uint8),
+    )
+
+    def __init__(self, rng=None, capacity=256):
+        self.rng = rng or random.Random()
+        self.n = 0
+        self.capacity = capacity
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.next_bid = 0   # 子彈 id (u16 循環使用，存活期間不會重複)
+        self.hits = np.zeros((capacity, HIT_SET_SIZE), dtype=np.int64) # 彈射子彈已命中的目標 id (環狀，hit_count 筆有效)
+        self.owner_id = []  # 玩家 sid 字串 / 敵人 id，長度永遠等於 n
+        # 顯示用樣式 (owner_type, color, size) 去重後的表，前端靠它上色
+        self.styles = []
+        self._style_codes = {}
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, dtype in self.FIELDS:
+            old = getattr(self, name)
+            arr = np.zeros(self.capacity, dtype=dtype)
+            arr[:self.n] = old[:self.n]
+            setattr(self, name, arr)
+        hits = np.zeros((self.capacity, HIT_SET_SIZE), dtype=np.int64)
+        hits[:self.n] = self.hits[:self.n]
+        self.hits = hits
+
+    def _style_code(self, owner_type, color, size):
+        key = (owner_type, color, size)
+        code = self._style_codes.get(key)
+        if code is None:
+            code = self._style_codes[key] = len(self.styles)
+            self.styles.append(key)
+        return code
+
+    def count_owner(self, owner_id):
+        return self.owner_id.count(owner_id)
+
+    def spawn(self, x, y, owner_id, owner_type, spec, dx, dy):
+        """對應舊 Bullet(...) 建構子；spec 為 archetypes.BulletSpec，方向向量 (dx, dy) 由呼叫端預先算好"""
+        if self.n == self.capacity:
+            self._grow()
+        i = self.n
+        kind = spec.kind
+        self.x[i], self.y[i], self.dx[i], self.dy[i] = x, y, dx, dy
+        self.size[i] = spec.size
+        self.damage[i] = spec.damage
+        self.speed[i] = spec.speed
+        self.dist_traveled[i] = 0
+        self.range_limit[i] = spec.range
+        self.bounce_damage_mult[i] = spec.bounce_damage
+        self.bounce_left[i] = spec.bounce
+        self.hit_count[i] = 0
+        self.kind[i] = kind
+        # 弧射擺動方向 (非弧射為 0，批次運算時自然不受影響)
+        self.curve_dir[i] = self.rng.choice([-1, 1]) if kind == KIND_ARC else 0
+        self.owner_type[i] = OWNER_CODES[owner_type]
+        self.style[i] = self._style_code(owner_type, spec.color, spec.size)
+        self.bid[i] = self.next_bid
+        self.next_bid = (self.next_bid + 1) & 0xFFFF
+        self.owner_id.append(owner_id)
+        self.n += 1
+        return i
+
+    def spawn_many(self, xs, ys, owner_ids, owner_type, spec, dx, dy):
+        """批次版 spawn：同一種子彈一次寫入多顆 (xs / ys 為陣列，owner_ids 為串列，dx / dy 全部相同)"""
+        k = len(owner_ids)
+        while self.n + k > self.capacity:
+            self._grow()
+        s = slice(self.n, self.n + k)
+        kind = spec.kind
+        self.x[s], self.y[s], self.dx[s], self.dy[s] = xs, ys, dx, dy
+        self.size[s] = spec.size
+        self.damage[s] = spec.damage
+        self.speed[s] = spec.speed
+        self.dist_traveled[s] = 0
+        self.range_limit[s] = spec.range
+        self.bounce_damage_mult[s] = spec.bounce_damage
+        self.bounce_left[s] = spec.bounce
+        self.hit_count[s] = 0
+        self.kind[s] = kind
+        self.curve_dir[s] = [self.rng.choice([-1, 1]) for _ in range(k)] if kind == KIND_ARC else 0
+        self.owner_type[s] = OWNER_CODES[owner_type]
+        self.style[s] = self._style_code(owner_type, spec.color, spec.size)
+        self.bid[s] = (self.next_bid + np.arange(k)) & 0xFFFF
+        self.next_bid = (self.next_bid + k) & 0xFFFF
+        self.owner_id.extend(owner_ids)
+        self.n += k
+
+    def update(self, now):
+        """所有子彈移動一步 (now 為模擬時間秒數)，並移除超出射程/地圖的子彈"""
+        n = self.n
+        if n == 0: return
+        x, y = self.x[:n], self.y[:n]
+        dx, dy = self.dx[:n], self.dy[:n]
+
+        # 弧形運動：整個 tick 共用同一個擺動量，由模擬時鐘決定
+        wobble = math.cos(now * 5) * 5
+        x += dx + wobble * self.curve_dir[:n]
+        y += dy
+        dist = self.dist_traveled[:n]
+        dist += self.speed[:n]
+
+        # 邊界反彈 (彈射屬性)
+        bounce_left = self.bounce_left[:n]
+        can_bounce = (self.kind[:n] == KIND_BOUNCE) & (bounce_left > 0)
+        hit_x = can_bounce & ((x <= 0) | (x >= MAP_WIDTH))
+        hit_y = can_bounce & (y <= 0) # 頂部
+        dx[hit_x] *= -1
+        dy[hit_y] *= -1
+        hit_wall = hit_x | hit_y
+        bounce_left[hit_wall] -= 1
+
+        # 撞牆的子彈本 tick 一定存活；其餘檢查射程與一般邊界
+        in_bounds = (x >= -50) & (x <= MAP_WIDTH + 50) & (y >= -50) & (y <= MAP_HEIGHT + 50)
+        self.compact(hit_wall | ((dist <= self.range_limit[:n]) & in_bounds))
+
+    def compact(self, keep):
+        """批次 swap-remove：用尾端存活的子彈填補前段的空洞"""
+        n = self.n
+        new_n = int(np.count_nonzero(keep))
+        if new_n == n: return
+        holes = np.flatnonzero(~keep[:new_n])
+        fillers = np.flatnonzero(keep[new_n:n]) + new_n
+        for name, _ in self.FIELDS:
+            arr = getattr(self, name)
+            arr[holes] = arr[fillers]
+        self.hits[holes] = self.hits[fillers]
+        for h, f in zip(holes.tolist(), fillers.tolist()):
+            self.owner_id[h] = self.owner_id[f]
+        del self.owner_id[new_n:]
+        self.n = new_n
+
+    def hit_set(self, i):
+        """彈射子彈已命中過的目標 id (最多 HIT_SET_SIZE 個)；其他子彈為空"""
+        count = int(self.hit_count[i])
+        return self.hits[i, :min(count, HIT_SET_SIZE)].tolist() if count else ()
+
+    def handle_hit(self, i, target_id, targets=None):
+        """處理命中後的邏輯 (回傳 HIT_CONSUMED / HIT_BOUNCED / HIT_RETARGETED)；
+        targets 為 spatial.PointIndex 時，彈射子彈轉向最近、還沒打過的目標 (射程內沒有就原路彈回)"""
+        if self.kind[i] == KIND_BOUNCE and self.bounce_left[i] > 0:
+            self.damage[i] *= self.bounce_damage_mult[i]
+            self.bounce_left[i] -= 1
+            if target_id is not None:
+                count = int(self.hit_count[i])
+                self.hits[i, count % HIT_SET_SIZE] = target_id
+                self.hit_count[i] = min(count + 1, 255)
+
+            r = self.size[i] / 2
+            cx, cy = self.x[i] + r, self.y[i] + r
+            found = targets.nearest(cx, cy, 1, self.range_limit[i] - self.dist_traveled[i],
+                                    self.hit_set(i)) if targets is not None else ()
+            if found:
+                tx, ty = targets.position(found[0])
+                dist = math.hypot(tx - cx, ty - cy) or 1.0
+                self.dx[i] = (tx - cx) / dist * self.speed[i]
+                self.dy[i] = (ty - cy) / dist * self.speed[i]
+                result = HIT_RETARGETED
+            else:
+                self.dx[i] *= -1
+                self.dy[i] *= -1
+                result = HIT_BOUNCED
+            # 稍微推開，避免黏在剛打到的敵人身上
+            self.x[i] += self.dx[i] * 2
+            self.y[i] += self.dy[i] * 2
+            return result
+        return HIT_CONSUMED
+
+    def near(self, grid, owner_mask):
+        """回傳外接框碰到 grid 非空格子的子彈索引 (broadphase 前置篩選)"""
+        n = self.n
+        occupied = grid.occupancy()
+        cs, cols, rows = grid.cell_size, grid.cols, grid.rows
+        x, y, size = self.x[:n], self.y[:n], self.size[:n]
+        c0 = np.clip(x // cs, 0, cols - 1).astype(np.intp)
+        c1 = np.clip((x + size) // cs, 0, cols - 1).astype(np.intp)
+        r0 = np.clip(y // cs, 0, rows - 1).astype(np.intp)
+        r1 = np.clip((y + size) // cs, 0, rows - 1).astype(np.intp)
+        # 子彈比格子小，外接框最多跨 2x2 格，檢查四個角落即可；過大的子彈一律列入
+        hit = (occupied[r0 * cols + c0] | occupied[r0 * cols + c1] |
+               occupied[r1 * cols + c0] | occupied[r1 * cols + c1] | (size > cs))
+        return np.flatnonzero(hit & owner_mask)
+
+    def ref(self, i):
+        return BulletRef(self, i)
@@ -1,9 +1,17 @@
 # client_config.py
-GITHUB_USER = "Kuaan"
-GITHUB_REPO = "Cell_Wars"
-ASSETS_BASE = f"https://raw.githubusercontent.com/{GITHUB_USER}/{GITHUB_REPO}/main/assets/"
-SOUNDS_BASE = f"{ASSETS_BASE}sounds/"
+from frontend_build import asset_version
+from config import SIM_FPS, SNAPSHOT_EVERY # 前端內插需要知道伺服器的 tick 頻率與快照間隔 (直接用伺服器換算好的值)
+from config import CELL_CONFIG, MAP_WIDTH, MAP_HEIGHT, MAX_MOVE_STEPS_PER_TICK # 前端預測自己的移動要用同一套規則
+
+CELL_SPEEDS = {skin: conf["speed"] for skin, conf in CELL_CONFIG.items()}
+
 SERVER_URL = "https://cell-wars.onrender.com"
+# 圖片/音效由遊戲伺服器的 /assets 提供 (ETag + 壓縮 + 版本相符時永久快取)
+ASSETS_BASE = f"{SERVER_URL}/assets/"
+SOUNDS_BASE = f"{ASSETS_BASE}sounds/"
+ASSET_VERSION = asset_version()
+# True：頁面只引用伺服器上以內容雜湊命名的 JS/CSS bundle；False：bundle 內嵌在頁面中
+BUNDLE_FROM_SERVER = False
 
 # 這裡可以定義初始音量或其他前端參數
 DEFAULT_VOL_BGM = 0.4
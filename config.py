@@ -1,13 +1,64 @@
 # config.py 4.0
 import math
+import os
 
 # --- 地圖與基礎設定 ---
 MAP_WIDTH = 600
 MAP_HEIGHT = 500
 MAX_ENEMIES = 5
+ENEMY_SPAWNS_PER_TICK = 1 # 敵人不足時每個 tick 最多補幾隻 (大波次/hoard 模式可調高)
 INVINCIBLE_TIME = 1.5  # 復活/受傷無敵時間
 FIRE_COOLDOWN = 0.15   # 基礎射速限制
 PLAYER_LIVES = 5       # 玩家命數
+SIM_FPS = 30           # 固定步長模擬頻率 (所有計時以 tick 為單位)
+MAX_CATCHUP_STEPS = 5  # 落後時單次最多追趕幾個 tick，超過的積欠直接丟棄
+INVINCIBLE_TICKS = round(INVINCIBLE_TIME * SIM_FPS)
+SKILL_DURATION = 10     # 技能 (繞行護盾) 持續秒數
+SKILL_DURATION_TICKS = round(SKILL_DURATION * SIM_FPS)
+SKILL_DURABILITY = 10   # 撞怪或擋下一顆敵方子彈各扣 1，歸零就消失
+SKILL_DAMAGE = 1        # 每次撞怪造成的傷害
+SKILL_HIT_INTERVAL = 10 # 同一個技能兩次撞怪之間至少隔幾個 tick
+SKILL_ORBIT_RADIUS = 55 # 繞行半徑 (以玩家中心計)
+SKILL_ORBIT_SPEED = 0.15 # 每個 tick 轉幾弧度
+GRID_CELL_SIZE = 50    # 碰撞網格格子大小 (broadphase)
+SNAPSHOT_RATE = int(os.environ.get("SNAPSHOT_RATE", "15")) # 每秒送幾次狀態快照 (與模擬頻率脫鉤，前端內插補間)
+SNAPSHOT_EVERY = max(1, round(SIM_FPS / SNAPSHOT_RATE))     # 換算成每幾個 tick 送一次 (經 client_config 注入前端，內插延遲以此為準)
+KEYFRAME_INTERVAL = 30 # 每幾個快照送一次完整關鍵幀 (其餘送 delta)
+ROOM_CAPACITY = 8      # 每個房間的玩家上限
+INTEREST_RADIUS = 400  # 道具與其他玩家的子彈超出此半徑就不送給該玩家 (自己與敵方子彈一律送)
+SNAPSHOT_BYTE_CAP = 1200 # 單一玩家每幀封包的上限，超過時依距離丟掉其他玩家的子彈 (自己與敵方子彈照送)
+MAX_MOVE_STEPS_PER_TICK = 2 # 每個 tick 最多套用幾次 move (各用自己的向量，多的留到下個 tick)
+SEND_QUEUE_DEPTH = 2    # 每位玩家最多積幾個未送出的快照，超過就清空並改送關鍵幀 (見 outbound.py)
+SLOW_CLIENT_LAG = 0.25  # 封包從排入到送完超過此秒數就算落後
+SLOW_CLIENT_GRACE = 2.0 # 持續落後這麼久就降低該玩家的快照頻率 (恢復正常同樣久之後調回)
+SLOW_CLIENT_SEND_EVERY = 3 # 降頻後每幾個快照才送一次
+SLOW_CLIENT_EVICT_AFTER = float(os.environ.get("SLOW_CLIENT_EVICT_AFTER", "15")) # 降頻後仍持續落後多久就斷線 (0 = 不斷線)
+LEADERBOARD_SIZE = 5     # 全服排行榜保留前幾名
+LEADERBOARD_DB = os.environ.get("LEADERBOARD_DB", "leaderboard.db") # 玩家紀錄的 SQLite 檔 (空字串 = 不持久化)
+LEADERBOARD_FLUSH_INTERVAL = 5.0   # 玩家紀錄每隔幾秒批次寫入一次
+LEADERBOARD_BROADCAST_INTERVAL = 1.0 # 排行榜變動每隔幾秒廣播一次 (只送變動的名次)
+OVERLOAD_HIGH = 0.85      # 模擬+序列化佔牆上時間的比例超過此值就升一級降級 (見 overload.py)
+OVERLOAD_LOW = 0.5        # 低於此值且沒有遲到的 tick 才算恢復
+OVERLOAD_LATE_RATIO = 0.1 # 一個視窗內超過這個比例的迴圈醒來時已遲到 (需要追趕) 也算過載
+OVERLOAD_WINDOW = 1.0     # 每隔幾秒評估一次
+OVERLOAD_RECOVER_WINDOWS = 5 # 連續幾個視窗都恢復才降一級 (升級只要一個視窗，避免來回震盪)
+OVERLOAD_BULLETS_PER_OWNER = 24 # 降級時每位玩家場上的子彈上限
+OVERLOAD_ENEMY_SCALE = 0.5      # 降級時敵人上限與每 tick 生成數的倍率
+OVERLOAD_SNAPSHOT_SCALE = 2     # 降級時快照間隔的倍數
+OVERLOAD_INTEREST_SCALE = 0.6   # 降級時視野半徑的倍率 (遠處的道具與其他玩家的子彈不送)
+ROOM_WORKERS = int(os.environ.get("ROOM_WORKERS", "0")) # >0 時房間模擬改在多個 worker 行程中執行
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0" # 各階段計時與 /metrics
+METRICS_PROFILER = os.environ.get("METRICS_PROFILER", "0") == "1" # 啟動時就開啟取樣 profiler
+# 開放 /metrics/profile (GET 取 collapsed stacks，POST enable=1/0 開關)；沒有驗證，只在內部網路或除錯時開啟
+METRICS_PROFILE_ENDPOINT = METRICS_PROFILER or os.environ.get("METRICS_PROFILE_ENDPOINT", "0") == "1"
+CONFIG_HOT_RELOAD = os.environ.get("CONFIG_HOT_RELOAD", "0") == "1" # 開發用：config.py 存檔後重新編譯角色/怪物/武器表 (archetypes.py)
+CONFIG_RELOAD_INTERVAL = 2.0 # 檢查 config.py 是否變動的間隔 (秒)
+REPLAY_DIR = os.environ.get("REPLAY_DIR", "") # 有設定時每個房間寫一份重播紀錄到此目錄 (見 replay.py)
+REPLAY_CHECKPOINT_EVERY = 300 # 重播紀錄每幾個 tick 存一次完整狀態 (跳轉時從最近的一份開始重跑)
+ROOM_STATE_DIR = os.environ.get("ROOM_STATE_DIR", "") # 有設定時定期把每個房間的完整狀態存到此目錄，重啟後還原 (見 roomstate.py)
+ROOM_CHECKPOINT_EVERY = 5 * SIM_FPS # 房間狀態每幾個 tick 存一次 (當機時最多倒退這麼久)
+HANDOFF_SOCKET = os.environ.get("HANDOFF_SOCKET", "") # 部署交接用的 Unix socket：新行程啟動時向舊行程接手所有房間
+RESUME_GRACE = float(os.environ.get("RESUME_GRACE", "10")) # 斷線後保留角色幾秒，期間帶 token 重連可接回 (0 = 立即移除)
 
 # --- 角色設定 (Cell) ---
 CELL_CONFIG = {
@@ -0,0 +1,103 @@
+# enemies.py
+# 普通敵人的批次 AI (Structure-of-Arrays，同 bullets.py)：位置、速度、遊走計時與射擊機率放在 NumPy 陣列，
+# 每個 tick 只呼叫一次向量化 RNG 決定全部敵人的遊走、接觸傷害與射擊，取代逐隻呼叫 Enemy.update()。
+# Enemy 物件仍是碰撞/序列化用的紀錄，陣列在 AI 階段結束時把座標寫回 (sync)；Boss 不在這裡，由 rooms.py 控制
+import numpy as np
+from config import MAP_WIDTH, MAP_HEIGHT
+
+WANDER_INTERVAL = 30 # 每隔幾個 tick 左右遊走一次
+WANDER_STEPS = np.array([-20.0, 20.0, 0.0])
+CONTACT_HIT_CHANCE = 0.2 # 碰到玩家時每個 tick 造成傷害的機率
+PLAYER_RADIUS = 15 # 接觸判定時玩家的半徑 (check_collision 的 r1_override)
+
+class EnemyStore:
+    FIELDS = (
+        ("x", np.float64), ("y", np.float64), ("size", np.float64), ("speed", np.float64),
+        ("move_timer", np.int32), ("fire_rate", np.float64),
+    )
+
+    def __init__(self, np_rng, capacity=64):
+        self.np_rng = np_rng # 房間的 numpy Generator (與 Python RNG 同種子，各自獨立的序列)
+        self.n = 0
+        self.capacity = capacity
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.objs = [] # Enemy，與陣列同序；Enemy.slot 記錄自己的索引
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, dtype in self.FIELDS:
+            old = getattr(self, name)
+            arr = np.zeros(self.capacity, dtype=dtype)
+            arr[:self.n] = old[:self.n]
+            setattr(self, name, arr)
+
+    def add(self, enemy):
+        if self.n == self.capacity:
+            self._grow()
+        i = self.n
+        self.x[i], self.y[i], self.size[i] = enemy.x, enemy.y, enemy.size
+        self.speed[i] = enemy.speed
+        self.move_timer[i] = 0
+        self.fire_rate[i] = enemy.arch.fire_rate
+        enemy.slot = i
+        self.objs.append(enemy)
+        self.n += 1
+
+    def remove(self, enemy):
+        """swap-remove；不在 store 裡的敵人 (Boss) 直接略過"""
+        i = enemy.slot
+        if i < 0: return
+        last = self.n - 1
+        if i != last:
+            for name, _ in self.FIELDS:
+                arr = getattr(self, name)
+                arr[i] = arr[last]
+            moved = self.objs[last]
+            self.objs[i] = moved
+            moved.slot = i
+        self.objs.pop()
+        self.n = last
+        enemy.slot = -1
+
+    def step(self):
+        """全部敵人移動一步；回傳本 tick 的 (接觸判定, 射擊判定) 亂數，與遊走共用同一次 RNG 呼叫"""
+        n = self.n
+        wander, contact, fire = self.np_rng.random((3, n))
+        x, y = self.x[:n], self.y[:n]
+        timer = self.move_timer[:n]
+        y += self.speed[:n] * 0.5
+        timer += 1
+        turn = timer > WANDER_INTERVAL
+        x[turn] += WANDER_STEPS[(wander[turn] * len(WANDER_STEPS)).astype(np.intp)]
+        timer[turn] = 0
+        np.clip(x, 0, MAP_WIDTH - self.size[:n], out=x)
+        y[y > MAP_HEIGHT] = -50
+        return contact, fire
+
+    def touching(self, player):
+        """與 check_collision(player, enemy, r1_override=PLAYER_RADIUS) 相同的判定 (bool 陣列)"""
+        n = self.n
+        r2 = self.size[:n] / 2
+        dx = (player.x + PLAYER_RADIUS) - (self.x[:n] + r2)
+        dy = (player.y + PLAYER_RADIUS) - (self.y[:n] + r2)
+        return dx * dx + dy * dy < (PLAYER_RADIUS + r2) ** 2 * 0.8
+
+    def firing(self, draws):
+        """回傳本 tick 開火的敵人，依 archetype 分組：[(arch, 索引陣列)]"""
+        idx = np.flatnonzero(draws < self.fire_rate[:self.n])
+        groups = {}
+        for i in idx.tolist():
+            arch = self.objs[i].arch
+            groups.setdefault(arch, []).append(i)
+        return [(arch, np.array(group, dtype=np.intp)) for arch, group in groups.items()]
+
+    def sync(self):
+        """把陣列中的座標寫回 Enemy 物件 (碰撞與序列化讀物件)"""
+        n = self.n
+        for enemy, x, y in zip(self.objs, self.x[:n].tolist(), self.y[:n].tolist()):
+            enemy.x = x
+            enemy.y = y
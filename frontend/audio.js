@@ -32,7 +32,7 @@ const soundList = {
 
 async function loadSound(key, url) {
     try {
-        const response = await fetch(url);
+        const response = await fetch(url + ASSET_QS);
         const arrayBuffer = await response.arrayBuffer();
         const decodedBuffer = await audioCtx.decodeAudioData(arrayBuffer);
         audioBuffers[key] = decodedBuffer;
@@ -46,11 +46,23 @@ Promise.all(Object.keys(soundList).map(key => loadSound(key, soundList[key]))).t
     btn.disabled = false;
 });
 
-function playSfx(key) {
+// pan: -1 (左) ~ 1 (右)，gain: 依距離衰減的音量 (位置音效用，預設為置中、原音量)
+function playSfx(key, pan = 0, gain = 1) {
     if (volSFX <= 0.01 || !audioBuffers[key]) return;
     const source = audioCtx.createBufferSource();
     source.buffer = audioBuffers[key];
-    source.connect(gainNodeSFX);
+    let node = source;
+    if (gain < 1) {
+        const g = audioCtx.createGain();
+        g.gain.value = gain;
+        node.connect(g); node = g;
+    }
+    if (pan !== 0 && audioCtx.createStereoPanner) {
+        const p = audioCtx.createStereoPanner();
+        p.pan.value = pan;
+        node.connect(p); node = p;
+    }
+    node.connect(gainNodeSFX);
     source.start(0);
 }
 
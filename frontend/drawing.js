@@ -1,4 +1,11 @@
 // frontend/drawing.js
+// sprite 由 main.js 的 loadSprite 產生：{ img, sx, sy, sw, sh } (sw=0 代表整張圖)
+function drawSprite(s, x, y, w, h) {
+    if (!s || !s.img.complete) return;
+    if (s.sw) ctx.drawImage(s.img, s.sx, s.sy, s.sw, s.sh, x, y, w, h);
+    else ctx.drawImage(s.img, x, y, w, h);
+}
+
 function draw() {
     ctx.clearRect(0, 0, canvas.width, canvas.height);
     const time = Date.now();
@@ -30,8 +37,7 @@ function draw() {
     // 2. 繪製技能物件
     ctx.globalAlpha = 0.6;
     (gameState.skill_objects || []).forEach(obj => {
-        let img = skins.cells[(obj.skin || 1) - 1];
-        if(img && img.complete) ctx.drawImage(img, obj.x, obj.y, 30, 30);
+        drawSprite(skins.cells[(obj.skin || 1) - 1], obj.x, obj.y, 30, 30);
     });
     ctx.globalAlpha = 1.0;
 
@@ -39,12 +45,11 @@ function draw() {
     for (let id in gameState.enemies) {
         let e = gameState.enemies[id];
         if (e.type === 999) {
-            if(skins.boss.complete) ctx.drawImage(skins.boss, e.x, e.y, e.size, e.size);
+            drawSprite(skins.boss, e.x, e.y, e.size, e.size);
             const hpRatio = Math.max(0, e.hp / e.max_hp);
             ctx.fillStyle = "#bd93f9"; ctx.fillRect(e.x, e.y-10, e.size * hpRatio, 8);
         } else {
-            let img = skins.viruses[(e.type || 1) - 1];
-            if(img && img.complete) ctx.drawImage(img, e.x, e.y, e.size, e.size);
+            drawSprite(skins.viruses[(e.type || 1) - 1], e.x, e.y, e.size, e.size);
             const hpRatio = Math.max(0, e.hp / e.max_hp);
             ctx.fillStyle = "#ff5555"; ctx.fillRect(e.x, e.y-6, e.size * hpRatio, 3);
         }
@@ -55,8 +60,7 @@ function draw() {
         let p = gameState.players[id];
         if (p.invincible) ctx.globalAlpha = 0.5;
         
-        let img = skins.cells[(p.skin || 1) - 1];
-        if(img && img.complete) ctx.drawImage(img, p.x, p.y, 30, 30);
+        drawSprite(skins.cells[(p.skin || 1) - 1], p.x, p.y, 30, 30);
         
         ctx.globalAlpha = 1.0;
         ctx.fillStyle = (id === myId) ? "#f1fa8c" : "white";
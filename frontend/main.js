@@ -1,20 +1,29 @@
 // frontend/main.js
 
-// 圖片載入
+// 圖片載入 (造型優先從 atlas 裁切，一次請求取得全部小圖)
 const skins = { cells: [], viruses: [], boss: null };
 function loadImg(path) {
     let img = new Image(); img.src = path;
     return img;
 }
+const atlasImg = ATLAS ? loadImg(ASSETS_BASE + "atlas.png" + ASSET_QS) : null;
+function loadSprite(name) {
+    if (ATLAS && ATLAS[name]) {
+        const [sx, sy, sw, sh] = ATLAS[name];
+        return { img: atlasImg, sx, sy, sw, sh };
+    }
+    return { img: loadImg(ASSETS_BASE + name + ".png" + ASSET_QS), sw: 0 }; // sw=0 代表整張圖
+}
 
 for(let i=1; i<=3; i++) {
-    skins.cells.push(loadImg(ASSETS_BASE + "cell_" + i + ".png"));
-    skins.viruses.push(loadImg(ASSETS_BASE + "virus_" + i + ".png"));
+    skins.cells.push(loadSprite("cell_" + i));
+    skins.viruses.push(loadSprite("virus_" + i));
 }
-skins.boss = loadImg(ASSETS_BASE + "boss_1.png");
+skins.boss = loadSprite("boss_1");
 
 // 遊戲狀態與連線
-const socket = io(SERVER_URL, { reconnection: true });
+// 斷線 (含伺服器部署交接) 後很快重試；重連時帶 session token 接回原本的角色 (伺服器保留 RESUME_GRACE 秒)
+const socket = io(SERVER_URL, { reconnection: true, reconnectionDelay: 250, reconnectionDelayMax: 2000 });
 const canvas = document.getElementById('gameCanvas');
 const ctx = canvas.getContext('2d');
 
@@ -22,37 +31,318 @@ let gameState = { players: {}, enemies: {}, bullets: [], items: [], skill_object
 let myId = null;
 let lastShotTime = 0;
 
-socket.on('connect', () => { myId = socket.id; });
-
-// 接收音效指令 (調用 audio.js 裡的 playSfx)
-socket.on('sfx', (data) => {
-    switch(data.type) {
-        case 'character_hitted': playSfx('p_hit'); break;
-        case 'boss_coming': playSfx('boss_come'); break;
-        case 'boss_hitted': playSfx('boss_hit'); break;
-        case 'boss_shot': playSfx('boss_shot'); break;
-        case 'enemy_hitted': playSfx('e_hit'); break;
-        case 'enemy_nor_shot': playSfx('e_shot'); break;
-        case 'skill_slime': playSfx('skill'); break;
-        case 'powerup': playSfx('powerup'); break;
+let session = null; // 伺服器發的重連 token
+let playerName = null;
+
+socket.on('connect', () => {
+    myId = socket.id;
+    if (session) socket.emit('join_game', { name: playerName, token: session });
+});
+socket.on('session', (data) => { session = data.token; });
+// 伺服器主動斷線 (部署交接/停機) 時 socket.io 不會自動重連
+socket.on('disconnect', (reason) => { if (reason === 'io server disconnect' && session) socket.connect(); });
+
+// --- 二進位狀態封包解碼 (格式與代碼表需與 protocol.py 一致) ---
+const MSG_KEY = 0, MSG_DELTA = 1;
+const FLAG_WARNING = 1, FLAG_STYLES = 2, FLAG_EVENTS = 4, FLAG_ACK = 8;
+const EVENT_POSITIONAL = 0x80;
+const SFX_TYPES = ["character_hitted", "boss_coming", "boss_hitted", "boss_shot", "enemy_hitted", "enemy_nor_shot",
+                   "skill_slime", "powerup"];
+const WEAPON_ICONS = ["🔥", "🔱", "⚡", "🌙"];
+const ITEM_TYPES = ["spread", "ricochet", "arc", "heal"];
+const OWNER_NAMES = ["player", "enemy", "boss"];
+const ENTITY_KINDS = ["players", "enemies", "items", "skills"];
+const textDecoder = new TextDecoder();
+
+// 以實體 id 為 key 的本地副本，delta 直接套用在上面
+const snap = {
+    tick: -1, w: false, styles: [], events: [], ack: null,
+    players: new Map(), enemies: new Map(), items: new Map(), skills: new Map(), bullets: new Map()
+};
+
+class PacketReader {
+    constructor(buf) { this.view = new DataView(buf); this.bytes = new Uint8Array(buf); this.pos = 0; }
+    u8() { return this.view.getUint8(this.pos++); }
+    i8() { return this.view.getInt8(this.pos++); }
+    u16() { const v = this.view.getUint16(this.pos, true); this.pos += 2; return v; }
+    i16() { const v = this.view.getInt16(this.pos, true); this.pos += 2; return v; }
+    u32() { const v = this.view.getUint32(this.pos, true); this.pos += 4; return v; }
+    str() {
+        const len = this.u8();
+        const s = textDecoder.decode(this.bytes.subarray(this.pos, this.pos + len));
+        this.pos += len;
+        return s;
+    }
+}
+
+const META_READERS = {
+    players: (r) => ({ sid: r.str(), name: r.str(), c: r.str(), skin: r.u8() }),
+    enemies: (r) => ({ type: r.u16(), size: r.u16(), max_hp: r.u16() }),
+    items: (r) => ({ type: ITEM_TYPES[r.u8()] }),
+    skills: (r) => ({ skin: r.u8() })
+};
+const STATE_READERS = {
+    players: (r, e) => {
+        e.x = r.i16(); e.y = r.i16(); e.hp = r.u16(); e.max_hp = r.u16(); e.score = r.u32();
+        e.charge = r.u8(); e.hit_accumulated = r.u8(); e.invincible = r.u8() === 1; e.w_icon = WEAPON_ICONS[r.u8()];
+    },
+    enemies: (r, e) => { e.x = r.i16(); e.y = r.i16(); e.hp = r.u16(); },
+    items: (r, e) => { e.x = r.i16(); e.y = r.i16(); },
+    skills: (r, e) => { e.x = r.i16(); e.y = r.i16(); }
+};
+
+function applySnapshot(buf) {
+    const r = new PacketReader(buf);
+    const type = r.u8(), tick = r.u32(), baseTick = r.u32(), flags = r.u8();
+    // delta 必須建立在目前持有的那一幀上 (同 tick 重送則為冪等)，否則等下一個關鍵幀
+    if (type === MSG_DELTA && baseTick !== snap.tick && tick !== snap.tick) return false;
+    if (type === MSG_KEY) {
+        ENTITY_KINDS.forEach(kind => snap[kind].clear());
+        snap.bullets.clear();
+    }
+    snap.w = (flags & FLAG_WARNING) !== 0;
+    snap.ack = (flags & FLAG_ACK) ? r.u32() : null;
+    if (flags & FLAG_STYLES) {
+        snap.styles = [];
+        for (let n = r.u8(); n > 0; n--) {
+            const owner = OWNER_NAMES[r.u8()], s = r.u8(), c = r.str();
+            snap.styles.push({ owner: owner, s: s, c: c || null });
+        }
+    }
+    // 音效事件：只屬於這一包，不累積到下一幀
+    snap.events = [];
+    if (flags & FLAG_EVENTS) {
+        for (let n = r.u8(); n > 0; n--) {
+            const c = r.u8();
+            if (c & EVENT_POSITIONAL) snap.events.push({ type: SFX_TYPES[c & 0x7f], x: r.i16(), y: r.i16() });
+            else snap.events.push({ type: SFX_TYPES[c], x: null, y: null });
+        }
+    }
+
+    for (const kind of ENTITY_KINDS) {
+        const map = snap[kind];
+        for (let n = r.u16(); n > 0; n--) map.delete(r.u32());
+        for (let n = r.u16(); n > 0; n--) {
+            const id = r.u32();
+            map.set(id, Object.assign(map.get(id) || {}, META_READERS[kind](r)));
+        }
+        for (let n = r.u16(); n > 0; n--) {
+            const id = r.u32();
+            STATE_READERS[kind](r, map.get(id) || {});
+        }
+    }
+
+    // 子彈：打包陣列 (新增的依序是 ids / styles / vxs / vys，移動的是 ids / xs / ys)
+    for (let n = r.u16(); n > 0; n--) snap.bullets.delete(r.u16());
+    let n = r.u16(), ids = [];
+    for (let i = 0; i < n; i++) ids.push(r.u16());
+    const added = ids.map(id => {
+        const b = { style: 0, x: 0, y: 0, vx: 0, vy: 0, fresh: true };
+        snap.bullets.set(id, b);
+        return b;
+    });
+    added.forEach(b => { b.style = r.u8(); });
+    added.forEach(b => { b.vx = r.i8(); });
+    added.forEach(b => { b.vy = r.i8(); });
+    n = r.u16(); ids = [];
+    for (let i = 0; i < n; i++) ids.push(r.u16());
+    const moved = ids.map(id => snap.bullets.get(id) || {});
+    moved.forEach(b => { b.px = b.x; b.x = r.i16(); });
+    moved.forEach(b => { b.py = b.y; b.y = r.i16(); });
+    // 已有舊位置的子彈改用實際位移當速度 (反彈會改變方向)
+    const dt = tick - snap.tick;
+    if (dt > 0) moved.forEach(b => {
+        if (!b.fresh) { b.vx = (b.x - b.px) / dt; b.vy = (b.y - b.py) / dt; }
+        b.fresh = false;
+    });
+
+    snap.tick = tick;
+    return true;
+}
+
+// 轉回 drawing.js / updateUI 使用的結構 (s 為 snap 或內插後的快照)
+function buildGameState(s = snap) {
+    const state = { players: {}, enemies: {}, bullets: [], items: [], skill_objects: [], w: s.w };
+    for (const p of s.players.values()) state.players[p.sid] = p;
+    for (const [id, e] of s.enemies) state.enemies[id] = e;
+    for (const b of s.bullets.values()) {
+        const st = s.styles[b.style] || {};
+        state.bullets.push({ x: b.x, y: b.y, owner: st.owner, c: st.c, s: st.s });
+    }
+    for (const item of s.items.values()) state.items.push(item);
+    for (const k of s.skills.values()) state.skill_objects.push(k);
+    return state;
+}
+
+// --- 快照緩衝與內插：伺服器每 SNAPSHOT_EVERY 個 tick 才送一次，畫面由 requestAnimationFrame 驅動 ---
+const TICK_MS = 1000 / SIM_FPS;
+const INTERP_DELAY = 2 * SNAPSHOT_EVERY;    // 畫面落後最新快照兩個間隔，確保手上有前後兩幀可內插
+const MAX_EXTRAPOLATE = 2 * SNAPSHOT_EVERY; // 快照斷流時子彈最多往前外插幾個 tick
+const TELEPORT_DIST = 100;                  // 兩幀間位移超過此值 (重生) 就不內插
+const snapshotBuffer = [];
+let clockOffset = null; // 伺服器 tick ≈ performance.now() / TICK_MS + clockOffset
+
+function copyEntities(map) {
+    const out = new Map();
+    for (const [id, e] of map) out.set(id, { ...e });
+    return out;
+}
+
+function pushSnapshot() {
+    const last = snapshotBuffer[snapshotBuffer.length - 1];
+    if (last && snap.tick <= last.tick) snapshotBuffer.length = 0; // 換房或重連，tick 重新起算
+    snapshotBuffer.push({
+        tick: snap.tick, w: snap.w, styles: snap.styles,
+        players: copyEntities(snap.players), enemies: copyEntities(snap.enemies), items: copyEntities(snap.items),
+        skills: copyEntities(snap.skills), bullets: copyEntities(snap.bullets)
+    });
+    if (snapshotBuffer.length > 8) snapshotBuffer.shift();
+    // 時鐘平滑地追隨封包到達時間，網路抖動不會讓畫面跳動；差太多 (分頁休眠) 直接校正
+    const target = snap.tick - performance.now() / TICK_MS;
+    if (clockOffset === null || Math.abs(target - clockOffset) > SIM_FPS) clockOffset = target;
+    else clockOffset += (target - clockOffset) * 0.1;
+}
+
+function lerpEntities(a, b, alpha) {
+    if (a === b) return b;
+    const out = new Map();
+    for (const [id, eb] of b) {
+        const ea = a.get(id);
+        if (!ea || Math.abs(eb.x - ea.x) + Math.abs(eb.y - ea.y) > TELEPORT_DIST) { out.set(id, eb); continue; }
+        out.set(id, { ...eb, x: ea.x + (eb.x - ea.x) * alpha, y: ea.y + (eb.y - ea.y) * alpha });
+    }
+    return out;
+}
+
+function interpolateState(t) {
+    const buf = snapshotBuffer;
+    let i = 0;
+    while (i < buf.length && buf[i].tick <= t) i++;
+    const a = buf[Math.max(0, i - 1)], b = buf[Math.min(i, buf.length - 1)];
+    const alpha = a === b ? 0 : (t - a.tick) / (b.tick - a.tick);
+
+    // 子彈：兩幀都有的內插，只在新一幀出現的依速度從 b 往回推，斷流時往前外插
+    const bullets = new Map();
+    const back = a === b ? 0 : b.tick - a.tick;
+    const bt = Math.max(-back, Math.min(t - b.tick, MAX_EXTRAPOLATE));
+    for (const [id, bb] of b.bullets) {
+        const ba = a.bullets.get(id);
+        if (ba && a !== b) bullets.set(id, { style: bb.style, x: ba.x + (bb.x - ba.x) * alpha, y: ba.y + (bb.y - ba.y) * alpha });
+        else bullets.set(id, { style: bb.style, x: bb.x + bb.vx * bt, y: bb.y + bb.vy * bt });
     }
+    return buildGameState({
+        w: b.w, styles: b.styles, bullets,
+        players: lerpEntities(a.players, b.players, alpha), enemies: lerpEntities(a.enemies, b.enemies, alpha),
+        items: lerpEntities(a.items, b.items, alpha), skills: lerpEntities(a.skills, b.skills, alpha)
+    });
+}
+
+// --- 本地玩家的移動預測 (client-side prediction) ---
+// 搖桿向量以固定頻率取樣送出 (帶序號)，同時在本地套用與伺服器相同的移動規則 (速度同 CELL_CONFIG，夾在地圖內)；
+// 快照帶回伺服器已處理的序號 (ack)，以快照中的位置為起點重放尚未確認的輸入。其他實體仍照內插顯示
+const PLAYER_SIZE = 30;
+const MOVE_SEND_MS = TICK_MS / MOVE_STEPS_PER_TICK; // 與伺服器每 tick 的移動步數上限相同
+const MAX_PENDING_INPUTS = 4 * SIM_FPS * MOVE_STEPS_PER_TICK; // 伺服器長時間沒回應時不再累積
+const stick = { dx: 0, dy: 0, active: false };
+const pendingInputs = [];
+let inputSeq = 0;
+let predicted = null;             // 自己的預測位置 {x, y}
+const correction = { x: 0, y: 0 }; // 校正時的跳動量，畫面上逐幀收斂
+
+function myPlayer() {
+    for (const p of snap.players.values()) if (p.sid === myId) return p;
+    return null;
+}
+
+function stepPlayer(pos, speed, dx, dy) {
+    pos.x = Math.max(0, Math.min(MAP_WIDTH - PLAYER_SIZE, pos.x + dx * speed));
+    pos.y = Math.max(0, Math.min(MAP_HEIGHT - PLAYER_SIZE, pos.y + dy * speed));
+}
+
+function reconcile() {
+    const me = myPlayer();
+    if (!me || snap.ack === null) { predicted = null; return; }
+    while (pendingInputs.length && pendingInputs[0].seq <= snap.ack) pendingInputs.shift();
+    const pos = { x: me.x, y: me.y };
+    const speed = CELL_SPEEDS[me.skin] || 0;
+    for (const inp of pendingInputs) stepPlayer(pos, speed, inp.dx, inp.dy);
+    // 小幅誤差平滑帶過，重生等大幅位移直接跳過去
+    if (predicted && Math.abs(predicted.x - pos.x) + Math.abs(predicted.y - pos.y) < TELEPORT_DIST) {
+        correction.x += predicted.x - pos.x;
+        correction.y += predicted.y - pos.y;
+    } else {
+        correction.x = correction.y = 0;
+    }
+    predicted = pos;
+}
+
+setInterval(() => {
+    if (!stick.active) return;
+    const inp = { seq: ++inputSeq, dx: stick.dx, dy: stick.dy };
+    socket.emit('move', inp);
+    const me = myPlayer();
+    if (!predicted || !me) return;
+    stepPlayer(predicted, CELL_SPEEDS[me.skin] || 0, inp.dx, inp.dy);
+    pendingInputs.push(inp);
+    if (pendingInputs.length > MAX_PENDING_INPUTS) pendingInputs.shift();
+}, MOVE_SEND_MS);
+
+function renderLoop(now) {
+    if (snapshotBuffer.length) {
+        gameState = interpolateState(now / TICK_MS + clockOffset - INTERP_DELAY);
+        const me = gameState.players[myId];
+        if (me && predicted) {
+            correction.x *= 0.8; correction.y *= 0.8;
+            gameState.players[myId] = { ...me, x: predicted.x + correction.x, y: predicted.y + correction.y };
+        }
+        draw(); // draw() 在 drawing.js 定義
+    }
+    requestAnimationFrame(renderLoop);
+}
+requestAnimationFrame(renderLoop);
+
+// 音效事件 -> audio.js 的音效 key；有位置的依與自己的距離衰減並左右聲道定位
+const SFX_KEYS = {
+    character_hitted: 'p_hit', boss_coming: 'boss_come', boss_hitted: 'boss_hit', boss_shot: 'boss_shot',
+    enemy_hitted: 'e_hit', enemy_nor_shot: 'e_shot', skill_slime: 'skill', powerup: 'powerup'
+};
+const HEARING_RANGE = 600; // 超過此距離的音效降到最小音量
+
+function playEvents(events) {
+    if (!events.length) return;
+    let me = null;
+    for (const p of snap.players.values()) if (p.sid === myId) { me = p; break; }
+    for (const ev of events) {
+        const key = SFX_KEYS[ev.type];
+        if (!key) continue;
+        if (ev.x === null || !me) { playSfx(key); continue; }
+        const dx = ev.x - (me.x + 15), dy = ev.y - (me.y + 15);
+        const pan = Math.max(-1, Math.min(1, dx / (HEARING_RANGE / 2)));
+        playSfx(key, pan, Math.max(0.2, 1 - Math.hypot(dx, dy) / HEARING_RANGE));
+    }
+}
+
+// 全服排行榜：伺服器只送變動的名次 {n: 名次數, set: [[rank, name, score]]}，有變動才重畫
+const leaderboard = [];
+socket.on('leaderboard', (data) => {
+    for (const [rank, name, score] of data.set) leaderboard[rank] = { name: name, score: score };
+    leaderboard.length = data.n;
+    document.getElementById('lb-content').innerHTML = leaderboard.map((p, i) => `<span class="score-pill">${i==0?'👑':''}${p.name}:${p.score}</span>`).join('');
 });
 
-// 更新畫面
+// 收到快照只更新緩衝與 UI，繪圖交給 renderLoop
 socket.on('state_update', (data) => {
-    gameState = data;
-    requestAnimationFrame(draw); // draw() 在 drawing.js 定義
-    updateUI();
+    if (!applySnapshot(data)) return;
+    pushSnapshot();
+    reconcile();
+    playEvents(snap.events);
+    updateUI(buildGameState());
 });
 
-function updateUI() {
-    if (!myId || !gameState.players[myId]) return;
-    const me = gameState.players[myId];
+function updateUI(state) {
+    if (!myId || !state.players[myId]) return;
+    const me = state.players[myId];
     
-    // 排行榜
-    const sorted = Object.values(gameState.players).sort((a,b)=>b.score-a.score).slice(0,3);
-    document.getElementById('lb-content').innerHTML = sorted.map((p, i) => `<span class="score-pill">${i==0?'👑':''}${p.name}:${p.score}</span>`).join('');
-
     // 能量條
     for(let i=1; i<=3; i++) {
         const elSeg = document.getElementById('seg'+i);
@@ -79,8 +369,11 @@ const manager = nipplejs.create({
     size: 100,
     color: 'white'
 });
-manager.on('move', (evt, data) => { if(data.vector) socket.emit('move', { dx: data.vector.x, dy: -data.vector.y }); });
-manager.on('end', () => { socket.emit('move', { dx: 0, dy: 0 }); });
+// 搖桿只更新向量，送出與預測由上面的固定頻率取樣處理
+manager.on('move', (evt, data) => {
+    if (data.vector) { stick.dx = data.vector.x; stick.dy = -data.vector.y; stick.active = true; }
+});
+manager.on('end', () => { stick.dx = stick.dy = 0; stick.active = false; });
 
 function doFire() {
     const now = Date.now();
@@ -108,7 +401,16 @@ document.getElementById('start-btn').onclick = function() {
         audioCtx.resume().then(() => { console.log("AudioContext unlocked"); });
     }
     playBGM();
-    const name = document.getElementById('name-input').value || 'Cell';
-    socket.emit('join_game', { name: name });
+    playerName = document.getElementById('name-input').value || 'Cell';
+    socket.emit('join_game', { name: playerName });
     document.getElementById('login-overlay').style.display = 'none';
 };
+
+// 伺服器過載時不收新玩家：回到登入畫面，等一段時間後才能再按
+socket.on('server_busy', (data) => {
+    const btn = document.getElementById('start-btn');
+    document.getElementById('login-overlay').style.display = '';
+    btn.disabled = true;
+    btn.innerText = "伺服器忙碌中，請稍後再試";
+    setTimeout(() => { btn.disabled = false; btn.innerText = "進入戰場"; }, data.retry_after * 1000);
+});
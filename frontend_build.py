@@ -0,0 +1,218 @@
+# frontend_build.py
+# 前端建置/快取層：
+# - render_page()：每個行程只渲染一次頁面 (依檔案 mtime 與 client_config 值做快取)，Streamlit rerun 不再重讀檔案
+# - build_bundle()：壓縮過的 JS/CSS bundle，以內容雜湊命名 (server.py 的 /bundle 可直接提供)
+# - AssetStore：server.py 的 /assets 用，ETag + immutable 快取，並預先壓縮 (gzip / brotli)
+# - python frontend_build.py atlas：把各造型的小 PNG 打包成 assets/atlas.png + atlas.json (需要 Pillow)
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+
+try:
+    import brotli # 選用：有裝才提供 .br
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_DIR = os.path.join(ROOT, "frontend")
+ASSETS_DIR = os.path.join(ROOT, "assets")
+ATLAS_JSON = os.path.join(ASSETS_DIR, "atlas.json")
+JS_FILES = ("audio.js", "drawing.js", "main.js") # 注入順序即執行順序
+SOURCE_FILES = ("index.html", "style.css") + JS_FILES
+
+# 打包進 atlas 的造型 (Boss 圖太大，維持單獨一張)
+ATLAS_SPRITES = ("cell_1", "cell_2", "cell_3", "cell_4", "s_cell_1", "s_cell_2", "virus_1", "virus_2", "virus_3")
+ATLAS_PADDING = 1
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# 只壓縮有意義的類型 (PNG 本身已壓縮)
+COMPRESSIBLE = {".wav", ".js", ".css", ".json", ".html", ".svg"}
+
+def _read(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()[:12]
+
+# --- 壓縮 ---
+def minify_js(src):
+    """保守的壓縮：去掉縮排、空行與整行註解；保留換行讓 ASI 行為不變 (前端沒有跨行的樣板字串)"""
+    lines = (line.strip() for line in src.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+def minify_css(src):
+    src = re.sub(r"/\*.*?\*/", "", src, flags=re.S)
+    src = re.sub(r"\s+", " ", src)
+    return re.sub(r"\s*([{};])\s*", r"\1", src).strip()
+
+# --- bundle 與頁面 ---
+_bundle_cache = {}
+_page_cache = {}
+
+def _source_key():
+    return tuple(os.stat(os.path.join(FRONTEND_DIR, name)).st_mtime_ns for name in SOURCE_FILES)
+
+def build_bundle():
+    """回傳 {"js", "css", "js_name", "css_name"}，檔案沒變時直接用快取"""
+    key = _source_key()
+    bundle = _bundle_cache.get(key)
+    if bundle is None:
+        js = "\n".join(minify_js(_read(os.path.join(FRONTEND_DIR, name))) for name in JS_FILES)
+        css = minify_css(_read(os.path.join(FRONTEND_DIR, "style.css")))
+        bundle = {
+            "js": js, "css": css,
+            "js_name": f"bundle.{_digest(js.encode())}.js",
+            "css_name": f"style.{_digest(css.encode())}.css",
+        }
+        _bundle_cache.clear()
+        _bundle_cache[key] = bundle
+    return bundle
+
+def load_atlas():
+    """atlas.json 的內容；尚未建置時回傳 None (前端改用單張圖片)"""
+    if not os.path.exists(ATLAS_JSON):
+        return None
+    with open(ATLAS_JSON, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def render_page(cfg):
+    """渲染遊戲頁面；同一個行程內只有在前端檔案或設定改變時才重新渲染"""
+    values = (cfg.SERVER_URL, cfg.ASSETS_BASE, cfg.SOUNDS_BASE, cfg.DEFAULT_VOL_BGM,
+              cfg.DEFAULT_VOL_SFX, cfg.BUNDLE_FROM_SERVER, cfg.ASSET_VERSION, cfg.SIM_FPS, cfg.SNAPSHOT_EVERY,
+              tuple(sorted(cfg.CELL_SPEEDS.items())), cfg.MAP_WIDTH, cfg.MAP_HEIGHT, cfg.MAX_MOVE_STEPS_PER_TICK)
+    key = (_source_key(), values)
+    page = _page_cache.get(key)
+    if page is not None:
+        return page
+
+    bundle = build_bundle()
+    if cfg.BUNDLE_FROM_SERVER:
+        bundle_css = f'<link rel="stylesheet" href="{cfg.SERVER_URL}/bundle/{bundle["css_name"]}">'
+        bundle_js = f'<script src="{cfg.SERVER_URL}/bundle/{bundle["js_name"]}"></script>'
+    else:
+        bundle_css = f"<style>{bundle['css']}</style>"
+        bundle_js = f"<script>\n{bundle['js']}\n</script>"
+    atlas = load_atlas()
+    fields = {
+        "bundle_css": bundle_css,
+        "bundle_js": bundle_js,
+        "server_url": cfg.SERVER_URL,
+        "assets_base": cfg.ASSETS_BASE,
+        "sounds_base": cfg.SOUNDS_BASE,
+        "asset_qs": f"?v={cfg.ASSET_VERSION}" if cfg.ASSET_VERSION else "",
+        "atlas": json.dumps(atlas["frames"]) if atlas else "null",
+        "vol_bgm": str(cfg.DEFAULT_VOL_BGM),
+        "vol_sfx": str(cfg.DEFAULT_VOL_SFX),
+        "sim_fps": str(cfg.SIM_FPS),
+        "snapshot_every": str(cfg.SNAPSHOT_EVERY),
+        "cell_speeds": json.dumps(cfg.CELL_SPEEDS),
+        "map_width": str(cfg.MAP_WIDTH),
+        "map_height": str(cfg.MAP_HEIGHT),
+        "move_steps": str(cfg.MAX_MOVE_STEPS_PER_TICK),
+    }
+    # 一次掃描取代所有佔位符 (不會誤改注入內容裡的大括號)
+    template = _read(os.path.join(FRONTEND_DIR, "index.html"))
+    page = re.sub(r"\{(" + "|".join(fields) + r")\}", lambda m: fields[m.group(1)], template)
+    _page_cache.clear()
+    _page_cache[key] = page
+    return page
+
+# --- 靜態資源 ---
+class AssetStore:
+    """啟動時掃描 assets/ 計算每個檔案的 ETag；壓縮版本第一次被請求時產生並留在記憶體"""
+    def __init__(self, root=ASSETS_DIR):
+        self.root = root
+        self.files = {} # 相對路徑 -> (絕對路徑, etag)
+        for dirpath, _, filenames in os.walk(root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                if rel.startswith("ori/"): continue # 原始素材不對外提供
+                with open(path, "rb") as f:
+                    self.files[rel] = (path, _digest(f.read()))
+        # 整體版本號：任何檔案改變都會變，前端以 ?v= 帶上，版本相符的請求可永久快取
+        self.version = _digest("".join(f"{rel}:{etag};" for rel, (_, etag) in sorted(self.files.items())).encode())
+        self._encoded = {}
+
+    def _variant(self, rel, path, encoding):
+        key = (rel, encoding)
+        body = self._encoded.get(key)
+        if body is None:
+            with open(path, "rb") as f:
+                raw = f.read()
+            body = gzip.compress(raw, 9) if encoding == "gzip" else brotli.compress(raw, quality=9)
+            if len(body) >= len(raw):
+                body = b"" # 壓縮無效，之後直接送原檔
+            self._encoded[key] = body
+        return body or None
+
+    def lookup(self, rel, version=None, if_none_match=None, accept_encoding=""):
+        """回傳 (status, headers, body 或檔案路徑)；找不到時回傳 None"""
+        entry = self.files.get(rel)
+        if entry is None:
+            return None
+        path, etag = entry
+        body, encoding = path, None
+        if os.path.splitext(rel)[1] in COMPRESSIBLE:
+            for candidate in (("br",) if brotli else ()) + ("gzip",):
+                if candidate in accept_encoding:
+                    variant = self._variant(rel, path, candidate)
+                    if variant is not None:
+                        body, encoding = variant, candidate
+                        break
+        # 不同壓縮版本的內容不同，ETag 也要不同
+        tag = f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+        headers = {
+            "ETag": tag,
+            "Cache-Control": IMMUTABLE if version == self.version else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if if_none_match and tag in if_none_match:
+            return 304, headers, b""
+        headers["Content-Type"] = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return 200, headers, body
+
+    def precompress(self):
+        """預先產生所有可壓縮檔案的壓縮版本 (啟動時呼叫，避免第一個玩家等待)"""
+        for rel, (path, _) in self.files.items():
+            if os.path.splitext(rel)[1] in COMPRESSIBLE:
+                for encoding in (("br",) if brotli else ()) + ("gzip",):
+                    self._variant(rel, path, encoding)
+
+def asset_version(root=ASSETS_DIR):
+    """與 AssetStore.version 相同的版本號 (Streamlit 端用來組 ?v=)"""
+    return AssetStore(root).version
+
+# --- 建置指令 ---
+def build_atlas():
+    """以單列 shelf 排列各造型，輸出 assets/atlas.png 與 frames 座標 (x, y, w, h)"""
+    from PIL import Image # 只有建置時需要
+    images = [(name, Image.open(os.path.join(ASSETS_DIR, f"{name}.png")).convert("RGBA")) for name in ATLAS_SPRITES]
+    width = sum(im.width + ATLAS_PADDING for _, im in images)
+    height = max(im.height for _, im in images)
+    atlas = Image.new("RGBA", (width, height))
+    frames = {}
+    x = 0
+    for name, im in images:
+        atlas.paste(im, (x, 0))
+        frames[name] = [x, 0, im.width, im.height]
+        x += im.width + ATLAS_PADDING
+    atlas.save(os.path.join(ASSETS_DIR, "atlas.png"), optimize=True)
+    with open(ATLAS_JSON, "w", encoding="utf-8") as f:
+        json.dump({"image": "atlas.png", "frames": frames}, f)
+    return frames
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["atlas"]:
+        print(build_atlas())
+    else:
+        bundle = build_bundle()
+        print(bundle["js_name"], len(bundle["js"]), bundle["css_name"], len(bundle["css"]))
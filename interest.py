@@ -0,0 +1,33 @@
+# interest.py
+# 每位玩家的關聯性過濾 (interest management)：compress_state 產生的完整 frame
+# 依觀看者裁切後才交給各自的 SnapshotEncoder 編碼，擁擠的房間不再對每個人廣播全部子彈
+import numpy as np
+from config import INTEREST_RADIUS, SNAPSHOT_BYTE_CAP
+
+# frame["bullet_owner"] 的特殊值 (其餘為發射者的玩家 nid，nid 從 1 開始)
+OWNER_HOSTILE = 0  # 敵人 / Boss 的子彈
+OWNER_ORPHAN = -1  # 發射者已離開的玩家子彈
+
+def filter_frame(frame, viewer_nid, center, radius=INTEREST_RADIUS, byte_cap=SNAPSHOT_BYTE_CAP):
+    """回傳觀看者專屬的 frame (不修改原 frame)
+    - 玩家、敵人 (含 Boss)、技能、自己的子彈與敵方子彈一律保留，不受位元組上限影響
+    - 道具與其他玩家的子彈只保留 radius 內的
+    - 其他玩家的子彈排在最後、由近到遠，編碼時依實際的 delta 大小截到 byte_cap 以內 (見 protocol.encode_frame)
+    """
+    cx, cy = center
+    r2 = radius * radius
+    view = dict(frame)
+    view["items"] = {nid: v for nid, v in frame["items"].items()
+                     if (v[1][0] - cx) ** 2 + (v[1][1] - cy) ** 2 <= r2}
+
+    xs, ys = frame["bullets"][1:3]
+    owner = frame["bullet_owner"]
+    d2 = (xs.astype(np.float64) - cx) ** 2 + (ys.astype(np.float64) - cy) ** 2
+    kept = (owner == viewer_nid) | (owner == OWNER_HOSTILE)
+    others = np.flatnonzero(~kept & (d2 <= r2))
+    others = others[np.argsort(d2[others], kind="stable")]
+    idx = np.concatenate((np.flatnonzero(kept), others))
+    view["bullets"] = tuple(column[idx] for column in frame["bullets"])
+    view["optional_bullets"] = len(others)
+    view["byte_cap"] = byte_cap
+    return view
@@ -0,0 +1,142 @@
+# leaderboard.py
+# 全服排行榜與玩家紀錄：以名字當作玩家識別 (沒有帳號系統)，記錄歷史最高分與遊玩次數。
+# 前 K 名用排序串列增量維護，分數有變化才更新；持久化用 SQLite (WAL)，寫入在背景執行緒批次進行 (write-behind)，
+# 擊殺時只改記憶體中的待寫入表，同一個名字在一次 flush 之間的多次變動合併成一筆
+import bisect
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    name TEXT PRIMARY KEY,
+    best_score INTEGER NOT NULL DEFAULT 0,
+    plays INTEGER NOT NULL DEFAULT 0,
+    last_seen REAL NOT NULL DEFAULT 0
+)
+"""
+UPSERT = """
+INSERT INTO profiles (name, best_score, plays, last_seen) VALUES (?, ?, ?, ?)
+ON CONFLICT(name) DO UPDATE SET
+    best_score = MAX(best_score, excluded.best_score),
+    plays = plays + excluded.plays,
+    last_seen = excluded.last_seen
+"""
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL") # WAL 下只在 checkpoint 時 fsync，斷電最多遺失最後一批
+    conn.execute(SCHEMA)
+    return conn
+
+class TopK:
+    """名字 -> 最高分；前 k 名存成依 (-分數, 名字) 排序的串列，submit 為 O(k)"""
+    def __init__(self, k):
+        self.k = k
+        self.best = {}
+        self.top = []
+        self.version = 0 # 前 k 名每變動一次加一
+
+    def submit(self, name, score):
+        """回傳是否刷新了該名字的最高分 (前 k 名是否變動看 version)"""
+        old = self.best.get(name)
+        if old is not None and score <= old:
+            return False
+        self.best[name] = score
+        top = self.top
+        entry = (-score, name)
+        if len(top) >= self.k and entry > top[-1]:
+            return True # 沒擠進前 k 名
+        if old is not None:
+            i = bisect.bisect_left(top, (-old, name))
+            if i < len(top) and top[i] == (-old, name):
+                del top[i]
+        bisect.insort(top, entry)
+        del top[self.k:]
+        self.version += 1
+        return True
+
+    def entries(self):
+        return [(name, -neg) for neg, name in self.top]
+
+class ScoreStore:
+    """SQLite 玩家紀錄的 write-behind：record_* 只寫進記憶體，背景執行緒每 flush_interval 秒用一個 transaction 寫入"""
+    def __init__(self, path, flush_interval):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending = {} # name -> [best_score, plays]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._conn = _connect(path)
+        self._thread = threading.Thread(target=self._run, name="leaderboard-writer", daemon=True)
+        self._thread.start()
+
+    def load_top(self, k):
+        return self._conn.execute(
+            "SELECT name, best_score FROM profiles WHERE best_score > 0 ORDER BY best_score DESC, name LIMIT ?", (k,)).fetchall()
+
+    def record_score(self, name, score):
+        with self._lock:
+            row = self._pending.setdefault(name, [0, 0])
+            row[0] = max(row[0], score)
+
+    def record_play(self, name):
+        with self._lock:
+            self._pending.setdefault(name, [0, 0])[1] += 1
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending: return
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(UPSERT, [(name, best, plays, now) for name, (best, plays) in pending.items()])
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"[leaderboard] flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        self._conn.close()
+
+class Leaderboard:
+    """全服前 k 名 + 持久化；store 為 None 時只保留在記憶體 (重啟即清空)"""
+    def __init__(self, k, store=None):
+        self.topk = TopK(k)
+        self.store = store
+        if store is not None:
+            for name, score in store.load_top(k):
+                self.topk.submit(name, score)
+        self.sent = [] # 上一次廣播時的前 k 名
+        self.sent_version = self.topk.version
+
+    def joined(self, name):
+        if self.store is not None: self.store.record_play(name)
+
+    def submit(self, name, score):
+        if self.topk.submit(name, score) and self.store is not None:
+            self.store.record_score(name, score)
+
+    def full(self):
+        """給新加入的玩家：整張榜 (格式同 delta)"""
+        entries = self.topk.entries()
+        return {"n": len(entries), "set": [[rank, name, score] for rank, (name, score) in enumerate(entries)]}
+
+    def delta(self):
+        """與上次廣播相比有變動的名次 [[rank, name, score]]；沒有變動回傳 None"""
+        if self.topk.version == self.sent_version: return None
+        entries = self.topk.entries()
+        changed = [[rank, name, score] for rank, (name, score) in enumerate(entries)
+                   if rank >= len(self.sent) or self.sent[rank] != (name, score)]
+        self.sent, self.sent_version = entries, self.topk.version
+        return {"n": len(entries), "set": changed}
+
+    def close(self):
+        if self.store is not None: self.store.close()
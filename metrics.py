@@ -0,0 +1,213 @@
+# metrics.py
+# 熱路徑量測：各階段耗時的滾動視窗 (Room.profiler 介面 start/lap)、實體數量、
+# 掉幀、發送延遲與每 tick 位元組數，以 Prometheus 文字格式輸出 (server.py 的 /metrics)
+import sys
+import threading
+import time
+from collections import Counter
+
+PHASES = ("inputs", "spawn", "items", "skills", "bullets", "ai", "serialize")
+WINDOW = 1024 # 滾動視窗保留最近幾筆樣本
+QUANTILES = (0.5, 0.9, 0.99)
+CLIENT_LAG_TOP = 5 # /metrics 只列出送出落後最嚴重的幾個 client (依名次，不以 sid 當標籤)
+
+class RollingHistogram:
+    """固定長度的環狀緩衝；observe 只做一次 list 指派，分位數在輸出時才排序"""
+    __slots__ = ("values", "i", "n", "count", "total")
+
+    def __init__(self, window=WINDOW):
+        self.values = [0.0] * window
+        self.i = 0
+        self.n = 0
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, v):
+        self.values[self.i] = v
+        self.i = (self.i + 1) % len(self.values)
+        if self.n < len(self.values): self.n += 1
+        self.count += 1
+        self.total += v
+
+    def export(self):
+        return {"window": self.values[:self.n], "count": self.count, "sum": self.total}
+
+class Metrics:
+    """單一行程的量測資料；房間在同一個執行緒依序 update，可共用一個實例"""
+    def __init__(self):
+        self.phases = {name: RollingHistogram() for name in PHASES}
+        self.hists = {
+            "tick_seconds": RollingHistogram(),         # update() 一次的總耗時
+            "emit_seconds": RollingHistogram(),         # 封包從產生到交給送出佇列的延遲
+            "send_lag_seconds": RollingHistogram(),     # 封包在送出佇列中等到送完的時間 (所有 client)
+            "bytes_per_tick": RollingHistogram(),       # 每次送出的總位元組 (含所有接收者)
+        }
+        self.counters = Counter()  # ticks / frame_overruns / dropped_ticks / bytes_sent / 送出佇列相關
+        self.rooms = {}            # room_id -> {kind: count}
+        self.clients = {}          # sid -> 最近一次量到的送出落後秒數 (只匯出最慢的 CLIENT_LAG_TOP 個，不以 sid 當標籤)
+        self.gauges = {}           # 目前值 (例如 overload_level)
+        self._last = 0.0
+        self._tick_start = 0.0
+
+    # --- Room.profiler 介面 ---
+    def start(self):
+        self._last = self._tick_start = time.perf_counter()
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.phases[name].observe(now - self._last)
+        self._last = now
+        if name == "ai": # update() 的最後一段
+            self.hists["tick_seconds"].observe(now - self._tick_start)
+            self.counters["ticks"] += 1
+
+    # --- 其他事件 ---
+    def frame_overrun(self, dropped):
+        """LoopTimer 落後 (需要追趕) 時呼叫；dropped 為超過追趕上限而丟棄的 tick 數"""
+        self.counters["frame_overruns"] += 1
+        self.counters["dropped_ticks"] += dropped
+
+    def emitted(self, seconds, nbytes):
+        self.hists["emit_seconds"].observe(seconds)
+        self.hists["bytes_per_tick"].observe(nbytes)
+        self.counters["bytes_sent"] += nbytes
+
+    def client_lag(self, sid, seconds):
+        self.hists["send_lag_seconds"].observe(seconds)
+        self.clients[sid] = seconds
+
+    def forget_client(self, sid):
+        self.clients.pop(sid, None)
+
+    def observe_room(self, room):
+        gs = room.gs
+        self.rooms[room.id] = {
+            "players": len(gs.players), "enemies": len(gs.enemies), "bullets": len(gs.bullets),
+            "items": len(gs.items), "skills": len(gs.skills),
+        }
+
+    def forget_room(self, room_id):
+        self.rooms.pop(room_id, None)
+
+    def export(self):
+        """可 pickle 的快照 (worker 行程定期送回前端)"""
+        return {
+            "phases": {k: h.export() for k, h in self.phases.items()},
+            "hists": {k: h.export() for k, h in self.hists.items()},
+            "counters": dict(self.counters),
+            "rooms": {k: dict(v) for k, v in self.rooms.items()},
+            "client_lag_top": sorted(self.clients.values(), reverse=True)[:CLIENT_LAG_TOP],
+            "gauges": dict(self.gauges),
+        }
+
+# --- Prometheus 文字格式 ---
+def _labels(labels):
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+def _summary(lines, name, hist, labels):
+    window = sorted(hist["window"])
+    for q in QUANTILES:
+        v = window[min(len(window) - 1, int(len(window) * q))] if window else 0.0
+        lines.append(f"{name}{_labels({**labels, 'quantile': q})} {v:.9g}")
+    lines.append(f"{name}_sum{_labels(labels)} {hist['sum']:.9g}")
+    lines.append(f"{name}_count{_labels(labels)} {hist['count']}")
+
+HIST_HELP = {
+    "tick_seconds": "Wall time of one Room.update() call",
+    "emit_seconds": "Latency from snapshot to hand-off to the per-client send queues",
+    "send_lag_seconds": "Time a snapshot waited in a client send queue until flushed",
+    "bytes_per_tick": "Bytes sent for one room snapshot across all recipients",
+}
+COUNTER_HELP = {
+    "ticks": "Simulation ticks executed",
+    "frame_overruns": "Loop wake-ups that were late and had to catch up",
+    "dropped_ticks": "Ticks discarded beyond the catch-up limit",
+    "bytes_sent": "Total state bytes sent",
+    "snapshots_dropped": "Queued snapshots discarded for slow clients",
+    "client_resyncs": "Send queue overflows that forced a keyframe",
+    "client_downgrades": "Slow clients moved to a lower snapshot rate",
+    "slow_evictions": "Clients disconnected for staying too far behind",
+    "overload_changes": "Load shedding level changes",
+    "joins_rejected": "Joins refused while shedding load",
+}
+GAUGE_HELP = {
+    "overload_level": "Current load shedding level (0 = normal, see overload.py)",
+}
+
+def render(sources):
+    """sources: [(labels, Metrics.export())]；同名指標集中輸出，HELP/TYPE 只出現一次"""
+    lines = [
+        "# HELP cellwars_phase_seconds Wall time per game loop phase",
+        "# TYPE cellwars_phase_seconds summary",
+    ]
+    for labels, data in sources:
+        for phase, hist in data["phases"].items():
+            _summary(lines, "cellwars_phase_seconds", hist, {**labels, "phase": phase})
+    for name, help_text in HIST_HELP.items():
+        metric = f"cellwars_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+        for labels, data in sources:
+            _summary(lines, metric, data["hists"][name], labels)
+    for name, help_text in COUNTER_HELP.items():
+        metric = f"cellwars_{name}_total"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        for labels, data in sources:
+            lines.append(f"{metric}{_labels(labels)} {data['counters'].get(name, 0)}")
+    for name, help_text in GAUGE_HELP.items():
+        metric = f"cellwars_{name}"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for labels, data in sources:
+            if name in data.get("gauges", {}):
+                lines.append(f"{metric}{_labels(labels)} {data['gauges'][name]}")
+    lines += ["# HELP cellwars_entities Live entities per room", "# TYPE cellwars_entities gauge"]
+    for labels, data in sources:
+        for room_id, counts in data["rooms"].items():
+            for kind, n in counts.items():
+                lines.append(f"cellwars_entities{_labels({**labels, 'room': room_id, 'kind': kind})} {n}")
+    lines += ["# HELP cellwars_client_lag_top_seconds Latest send lag of the slowest clients (rank 1 = slowest)",
+              "# TYPE cellwars_client_lag_top_seconds gauge"]
+    for labels, data in sources:
+        for rank, lag in enumerate(data.get("client_lag_top", ()), 1):
+            lines.append(f"cellwars_client_lag_top_seconds{_labels({**labels, 'rank': str(rank)})} {lag:.9g}")
+    return "\n".join(lines) + "\n"
+
+class SamplingProfiler:
+    """背景執行緒定時取樣目標執行緒的呼叫堆疊，輸出 collapsed stacks (可直接餵給 flamegraph)"""
+    def __init__(self, interval=0.005, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.stacks = Counter()
+        self._stop = None
+
+    @property
+    def running(self):
+        return self._stop is not None
+
+    def start(self):
+        if self.running: return
+        self.stacks.clear()
+        self._stop = threading.Event()
+        threading.Thread(target=self._run, args=(self._stop,), name="sampling-profiler", daemon=True).start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+    def _run(self, stop):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {n}" for stack, n in self.stacks.most_common()) + "\n"
+
+# 本行程共用的實例
+METRICS = Metrics()
@@ -0,0 +1,122 @@
+# outbound.py
+# 每位玩家各自的送出佇列：遊戲迴圈只把封包放進佇列就返回 (不 await 網路)，由每個 client 自己的 sender task 依序送出。
+# 佇列有深度上限；delta 封包依賴上一包，不能單獨丟掉，所以塞滿時整個佇列清空、請房間下一包改送關鍵幀，
+# 期間到的 delta 直接丟棄，關鍵幀一到就取代所有尚未送出的舊封包。
+# 持續落後的 client 先降低快照頻率，仍跟不上就斷線 (SLOW_CLIENT_* 設定)
+import asyncio
+import time
+from collections import deque
+
+from config import SEND_QUEUE_DEPTH, SLOW_CLIENT_LAG, SLOW_CLIENT_GRACE, SLOW_CLIENT_SEND_EVERY, SLOW_CLIENT_EVICT_AFTER
+from protocol import MSG_KEY
+
+class ClientQueue:
+    __slots__ = ("sid", "pending", "wake", "task", "in_flight", "awaiting_key", "lag",
+                 "slow_since", "fast_since", "downgraded", "evicting")
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.pending = deque() # (packet, 放入佇列的時間)
+        self.wake = asyncio.Event()
+        self.task = None
+        self.in_flight = None # 正在送的封包放入佇列的時間
+        self.awaiting_key = False # 丟過封包，等關鍵幀才恢復送出
+        self.lag = 0.0
+        self.slow_since = None
+        self.fast_since = None
+        self.downgraded = False
+        self.evicting = False
+
+class Outbox:
+    """emit: sio.emit；flushed(sid): 等該 client 的傳輸層送完 (背壓來源，可省略)；
+    control(sid, op, *args): 呼叫玩家所在房間的 resync / set_send_every；evict(sid): 斷線 (coroutine)"""
+    def __init__(self, emit, flushed=None, control=None, evict=None, metrics=None):
+        self.emit = emit
+        self.flushed = flushed
+        self.control = control
+        self.evict = evict
+        self.metrics = metrics
+        self.clients = {} # sid -> ClientQueue
+
+    def push(self, sid, packet):
+        """遊戲迴圈呼叫：只排入佇列，不等待"""
+        c = self.clients.get(sid)
+        if c is None:
+            c = self.clients[sid] = ClientQueue(sid)
+            c.task = asyncio.create_task(self._sender(c))
+        now = time.perf_counter()
+        if packet[0] == MSG_KEY:
+            # 關鍵幀自成一包，佇列裡還沒送的舊封包都不需要了
+            self._dropped(len(c.pending))
+            c.pending.clear()
+            c.awaiting_key = False
+        elif c.awaiting_key:
+            self._dropped(1)
+            return
+        elif len(c.pending) >= SEND_QUEUE_DEPTH:
+            self._dropped(len(c.pending) + 1)
+            c.pending.clear()
+            c.awaiting_key = True
+            if self.control is not None: self.control(sid, "resync")
+            if self.metrics is not None: self.metrics.counters["client_resyncs"] += 1
+            return
+        c.pending.append((packet, now))
+        c.wake.set()
+        # 卡住的連線不會有送完的回報，排入時也檢查最舊一包等了多久
+        oldest = c.in_flight if c.in_flight is not None else c.pending[0][1]
+        if now - oldest > SLOW_CLIENT_LAG:
+            self._observe(c, now - oldest, now)
+
+    def forget(self, sid):
+        """client 斷線時呼叫"""
+        c = self.clients.pop(sid, None)
+        if c is not None:
+            c.task.cancel()
+        if self.metrics is not None: self.metrics.forget_client(sid)
+
+    async def _sender(self, c):
+        while True:
+            if not c.pending:
+                c.wake.clear()
+                await c.wake.wait()
+                continue
+            packet, queued_at = c.pending.popleft()
+            c.in_flight = queued_at
+            await self.emit('state_update', packet, to=c.sid)
+            if self.flushed is not None:
+                await self.flushed(c.sid)
+            c.in_flight = None
+            now = time.perf_counter()
+            self._observe(c, now - queued_at, now)
+
+    def _dropped(self, n):
+        if n and self.metrics is not None:
+            self.metrics.counters["snapshots_dropped"] += n
+
+    def _observe(self, c, lag, now):
+        """更新 client 的落後量：持續超過 SLOW_CLIENT_LAG 先降頻、再斷線；恢復正常一段時間後回到原本頻率"""
+        c.lag = lag
+        if self.metrics is not None: self.metrics.client_lag(c.sid, lag)
+        if lag <= SLOW_CLIENT_LAG:
+            c.slow_since = None
+            if c.downgraded:
+                if c.fast_since is None:
+                    c.fast_since = now
+                elif now - c.fast_since >= SLOW_CLIENT_GRACE:
+                    c.downgraded = False
+                    c.fast_since = None
+                    if self.control is not None: self.control(c.sid, "set_send_every", 1)
+            return
+        c.fast_since = None
+        if c.slow_since is None:
+            c.slow_since = now
+        slow_for = now - c.slow_since
+        if not c.downgraded and slow_for >= SLOW_CLIENT_GRACE:
+            c.downgraded = True
+            if self.control is not None: self.control(c.sid, "set_send_every", SLOW_CLIENT_SEND_EVERY)
+            if self.metrics is not None: self.metrics.counters["client_downgrades"] += 1
+        elif (c.downgraded and SLOW_CLIENT_EVICT_AFTER and slow_for >= SLOW_CLIENT_EVICT_AFTER
+              and not c.evicting and self.evict is not None):
+            c.evicting = True
+            if self.metrics is not None: self.metrics.counters["slow_evictions"] += 1
+            asyncio.ensure_future(self.evict(c.sid))
@@ -0,0 +1,81 @@
+# overload.py
+# 過載時逐級降級 (load shedding)：一個行程內所有房間共用同一個事件迴圈/執行緒，
+# 這裡累計 update() + snapshot() 的耗時佔牆上時間的比例 (使用率) 與遲到的 tick，
+# 每個視窗判斷一次：超過 OVERLOAD_HIGH 升一級，連續 OVERLOAD_RECOVER_WINDOWS 個視窗低於 OVERLOAD_LOW 才降一級。
+# 等級由遊戲迴圈寫進 Room.shed_level，各項降級在 rooms.py 內判斷：
+#   1 每位玩家場上的子彈數上限 (OVERLOAD_BULLETS_PER_OWNER)
+#   2 + 敵人上限與生成速度打折 (OVERLOAD_ENEMY_SCALE)
+#   3 + 快照頻率減半、視野半徑縮小 (遠處的道具/子彈不送)
+#   4 + 拒絕新玩家加入
+import time
+
+from config import (OVERLOAD_HIGH, OVERLOAD_LOW, OVERLOAD_WINDOW, OVERLOAD_RECOVER_WINDOWS, OVERLOAD_LATE_RATIO)
+
+CAP_BULLETS = 1
+SHED_ENEMIES = 2
+SHED_SNAPSHOTS = 3
+REJECT_JOINS = 4
+MAX_LEVEL = REJECT_JOINS
+
+class OverloadController:
+    """observe(busy, steps) 由遊戲迴圈在每次醒來後呼叫；level 為目前的降級等級"""
+    def __init__(self, metrics=None, name="server"):
+        self.metrics = metrics
+        self.name = name
+        self.level = 0
+        self.window_start = time.perf_counter()
+        self.busy = 0.0
+        self.wakeups = 0
+        self.late = 0
+        self.calm_windows = 0
+        self.utilization = 0.0 # 上一個視窗的使用率
+        if metrics is not None: metrics.gauges["overload_level"] = 0
+
+    def observe(self, busy, steps=1):
+        """busy：這次醒來花在模擬與序列化的秒數；steps > 1 代表 tick 已經遲到 (LoopTimer 在追趕)"""
+        self.busy += busy
+        self.wakeups += 1
+        if steps > 1: self.late += 1
+        now = time.perf_counter()
+        if now - self.window_start >= OVERLOAD_WINDOW:
+            self._evaluate(now)
+
+    def poll(self):
+        """沒有房間在跑 (沒人呼叫 observe) 時等級也要能恢復，否則清空後會一直拒絕加入"""
+        now = time.perf_counter()
+        if now - self.window_start >= OVERLOAD_WINDOW:
+            self._evaluate(now)
+
+    def _evaluate(self, now):
+        elapsed = now - self.window_start
+        self.utilization = self.busy / elapsed
+        late_ratio = self.late / self.wakeups if self.wakeups else 0.0
+        idle = self.wakeups == 0
+        self.window_start, self.busy, self.wakeups, self.late = now, 0.0, 0, 0
+        if idle:
+            # 閒置期間每個經過的視窗都算平靜
+            self.calm_windows += int(elapsed / OVERLOAD_WINDOW)
+            level = max(0, self.level - self.calm_windows // OVERLOAD_RECOVER_WINDOWS)
+            self.calm_windows %= OVERLOAD_RECOVER_WINDOWS
+            if level != self.level: self._set(level)
+        elif self.utilization > OVERLOAD_HIGH or late_ratio > OVERLOAD_LATE_RATIO:
+            self.calm_windows = 0
+            if self.level < MAX_LEVEL: self._set(self.level + 1)
+        elif self.utilization < OVERLOAD_LOW and late_ratio == 0:
+            self.calm_windows += 1
+            if self.level > 0 and self.calm_windows >= OVERLOAD_RECOVER_WINDOWS:
+                self.calm_windows = 0
+                self._set(self.level - 1)
+        else:
+            self.calm_windows = 0 # 介於兩個門檻之間：維持目前等級
+
+    def _set(self, level):
+        print(f"[overload] {self.name}: level {self.level} -> {level} (utilization {self.utilization:.0%})")
+        self.level = level
+        if self.metrics is not None:
+            self.metrics.gauges["overload_level"] = level
+            self.metrics.counters["overload_changes"] += 1
+
+    @property
+    def rejecting(self):
+        return self.level >= REJECT_JOINS
@@ -0,0 +1,340 @@
+# protocol.py
+# 二進位狀態封包：定期送出關鍵幀 (keyframe)，其餘 tick 只送與上一幀的差異 (delta)。
+# 位置量化成 int16，子彈以打包陣列 (ids / xs / ys) 傳送；解碼器在 frontend/main.js (SnapshotDecoder 為給工具用的 Python 版)
+#
+# 封包格式 (little-endian)：
+#   u8 msg_type (0=KEY, 1=DELTA) | u32 tick | u32 base_tick | u8 flags (bit0 警告, bit1 附樣式表, bit2 附事件, bit3 附 ack)
+#   [ack]    u32 接收者已被套用的最後一筆移動輸入序號 (每位玩家各自的值，前端據此重放尚未確認的預測)
+#   [樣式表] u8 count + (u8 owner, u8 size, str color) * count
+#   [事件]   u8 count + (u8 code [bit7 = 附位置] + 有位置時 i16 x, i16 y) * count
+#            (上一個快照之後發生的音效，整個房間共用同一段，不做差異編碼)
+#   players / enemies / items / skills 各一段：
+#       u16 removed + u32 ids | u16 added + (u32 id, meta) | u16 changed + (u32 id, state)
+#   bullets：u16 removed + u16 ids | u16 added + u16 ids + u8 styles + i8 vxs + i8 vys | u16 changed + u16 ids + i16 xs + i16 ys
+#   (vx / vy 為發射時每 tick 的位移，前端在兩個快照之間用來外插子彈位置)
+import struct
+import numpy as np
+from bullets import OWNER_CODES
+
+MSG_KEY = 0
+MSG_DELTA = 1
+FLAG_WARNING = 1
+FLAG_STYLES = 2
+FLAG_EVENTS = 4
+FLAG_ACK = 8
+EVENT_POSITIONAL = 0x80
+
+# 前端需要同一份代碼表 (frontend/main.js)
+WEAPON_ICONS = ["🔥", "🔱", "⚡", "🌙"]
+ICON_CODES = {icon: i for i, icon in enumerate(WEAPON_ICONS)}
+ITEM_TYPES = ["spread", "ricochet", "arc", "heal"]
+ITEM_CODES = {t: i for i, t in enumerate(ITEM_TYPES)}
+SFX_TYPES = ["character_hitted", "boss_coming", "boss_hitted", "boss_shot", "enemy_hitted", "enemy_nor_shot",
+             "skill_slime", "powerup"]
+SFX_CODES = {t: i for i, t in enumerate(SFX_TYPES)}
+
+ENTITY_KINDS = ("players", "enemies", "items", "skills")
+# (ids, xs, ys, styles, vxs, vys)
+EMPTY_BULLETS = (np.zeros(0, np.uint16), np.zeros(0, np.int16), np.zeros(0, np.int16), np.zeros(0, np.uint8),
+                 np.zeros(0, np.int8), np.zeros(0, np.int8))
+
+_HEADER = struct.Struct("<BIIB")
+_EVENT_POS = struct.Struct("<hh")
+_U16 = struct.Struct("<H")
+_ID = struct.Struct("<I")
+# 各類實體「會變動的狀態」格式
+_STATE = {
+    "players": struct.Struct("<hhHHIBBBB"), # x, y, hp, max_hp, score, charge, hit_accumulated, invincible, icon
+    "enemies": struct.Struct("<hhH"),       # x, y, hp
+    "items": struct.Struct("<hh"),          # x, y
+    "skills": struct.Struct("<hh"),         # x, y
+}
+# 各類實體「只在出現時送一次」的資料格式 (玩家含字串，另外處理)
+_META = {
+    "enemies": struct.Struct("<HHH"),       # type, size, max_hp
+    "items": struct.Struct("<B"),           # item type code
+    "skills": struct.Struct("<B"),          # skin
+}
+_PLAYER_SKIN = struct.Struct("<B")
+
+def quantize(v):
+    return max(-32768, min(32767, int(v)))
+
+def _pack_str(s):
+    raw = (s or "").encode("utf-8")[:255]
+    return bytes((len(raw),)) + raw
+
+def _pack_meta(kind, meta):
+    if kind == "players":
+        sid, name, color, skin = meta
+        return _pack_str(sid) + _pack_str(name) + _pack_str(color) + _PLAYER_SKIN.pack(skin)
+    return _META[kind].pack(*meta)
+
+def _pack_styles(styles):
+    out = [bytes((len(styles),))]
+    for owner_type, color, size in styles:
+        out.append(bytes((OWNER_CODES[owner_type], int(size))) + _pack_str(color))
+    return b"".join(out)
+
+def pack_events(events):
+    """events: [(code, x, y)]，x 為 None 代表沒有位置；沒有事件時回傳 b"" (封包不附事件段)"""
+    if not events:
+        return b""
+    out = [bytes((len(events),))]
+    for code, x, y in events:
+        if x is None:
+            out.append(bytes((code,)))
+        else:
+            out.append(bytes((code | EVENT_POSITIONAL,)) + _EVENT_POS.pack(quantize(x), quantize(y)))
+    return b"".join(out)
+
+def _diff_entities(kind, cur, base):
+    out = []
+    removed = [i for i in base if i not in cur]
+    out.append(_U16.pack(len(removed)))
+    out.extend(_ID.pack(i & 0xFFFFFFFF) for i in removed)
+
+    added = []
+    changed = []
+    for i, (meta, state) in cur.items():
+        prev = base.get(i)
+        if prev is None or prev[0] != meta:
+            added.append(_ID.pack(i & 0xFFFFFFFF) + _pack_meta(kind, meta))
+        if prev is None or prev[1] != state:
+            changed.append(_ID.pack(i & 0xFFFFFFFF) + _STATE[kind].pack(*state))
+    out.append(_U16.pack(len(added)))
+    out.extend(added)
+    out.append(_U16.pack(len(changed)))
+    out.extend(changed)
+    return b"".join(out)
+
+# delta 中每顆子彈佔的位元組：新增 (id, style, vx, vy)、位置變動 (id, x, y)、消失 (id)
+_BULLET_ADDED_BYTES = 5
+_BULLET_CHANGED_BYTES = 6
+_BULLET_REMOVED_BYTES = 2
+
+def _align_bullets(cur, base):
+    """以排序後的 baseline 對齊目前子彈：回傳 (是否在 baseline 內, 位置是否改變)"""
+    ids, xs, ys = cur[:3]
+    b_ids, b_xs, b_ys = base[:3]
+    order = np.argsort(b_ids, kind="stable")
+    sorted_ids = b_ids[order]
+    pos = np.minimum(np.searchsorted(sorted_ids, ids), max(len(sorted_ids) - 1, 0))
+    if len(sorted_ids):
+        found = sorted_ids[pos] == ids
+        moved = (b_xs[order][pos] != xs) | (b_ys[order][pos] != ys)
+    else:
+        found = np.zeros(len(ids), dtype=bool)
+        moved = found
+    return found, moved
+
+def _fit_bullets(cur, base, optional, room):
+    """cur 最後 optional 顆是可以丟掉的子彈 (依優先序排列)；保留其中最長的前段，讓子彈段的 delta 不超過 room 位元組。
+    前面的子彈一律保留，即使因此超過 room"""
+    found, moved = _align_bullets(cur, base)
+    cost = np.where(found, np.where(moved, _BULLET_CHANGED_BYTES, 0), _BULLET_ADDED_BYTES + _BULLET_CHANGED_BYTES)
+    keep = len(found) - optional
+    # 三個 u16 計數 + 必送子彈 + baseline 裡已經不在候選內的子彈 (都要送 removed)
+    fixed = 3 * _U16.size + int(cost[:keep].sum()) + _BULLET_REMOVED_BYTES * (len(base[0]) - int(found.sum()))
+    # 取前 k 顆可丟子彈的大小；沒取到、但 baseline 有的子彈要送 removed
+    sent = np.concatenate(([0], np.cumsum(cost[keep:])))
+    in_base = np.concatenate(([0], np.cumsum(found[keep:])))
+    total = fixed + sent + _BULLET_REMOVED_BYTES * (in_base[-1] - in_base)
+    fits = np.flatnonzero(total <= room)
+    k = int(fits[-1]) if len(fits) else 0
+    return tuple(column[:keep + k] for column in cur)
+
+def _diff_bullets(cur, base):
+    ids, xs, ys, styles, vxs, vys = cur
+    found, moved = _align_bullets(cur, base)
+    removed = np.setdiff1d(base[0], ids)
+    added = ~found
+    changed = added | moved
+
+    return b"".join((
+        _U16.pack(len(removed)), removed.astype("<u2").tobytes(),
+        _U16.pack(int(added.sum())), ids[added].astype("<u2").tobytes(), styles[added].astype("u1").tobytes(),
+        vxs[added].astype("i1").tobytes(), vys[added].astype("i1").tobytes(),
+        _U16.pack(int(changed.sum())), ids[changed].astype("<u2").tobytes(),
+        xs[changed].astype("<i2").tobytes(), ys[changed].astype("<i2").tobytes(),
+    ))
+
+# 關鍵幀的 baseline (唯讀，所有關鍵幀共用同一份，也讓 cache 的 key 一致)
+_EMPTY_FRAME = {"w": False, "styles": [], "bullets": EMPTY_BULLETS, **{k: {} for k in ENTITY_KINDS}}
+
+def encode_frame(frame, tick, base=None, base_tick=None, send_styles=True, cache=None):
+    """把 frame 相對 base 編碼；base 為 None 時輸出關鍵幀
+    cache: 同一個 tick 內多位玩家共用的 dict，相同 (cur, base) 實體表的差異只算一次
+    frame 有 optional_bullets 時 (interest.filter_frame)，最後那幾顆子彈依 byte_cap 剩下的空間截斷"""
+    is_key = base is None
+    if is_key:
+        base, base_tick = _EMPTY_FRAME, tick
+    events = frame.get("events")
+    ack = frame.get("ack")
+    flags = ((FLAG_WARNING if frame["w"] else 0) | (FLAG_STYLES if send_styles else 0) | (FLAG_EVENTS if events else 0)
+             | (FLAG_ACK if ack is not None else 0))
+    out = [_HEADER.pack(MSG_KEY if is_key else MSG_DELTA, tick, base_tick, flags)]
+    if ack is not None:
+        out.append(_ID.pack(ack & 0xFFFFFFFF))
+    if send_styles:
+        out.append(_pack_styles(frame["styles"]))
+    if events:
+        out.append(events)
+    for kind in ENTITY_KINDS:
+        if cache is None:
+            out.append(_diff_entities(kind, frame[kind], base[kind]))
+            continue
+        # 以物件 id 為 key：呼叫端保證這些 dict 在整個 tick 內存活且不被修改
+        key = (kind, id(frame[kind]), id(base[kind]))
+        chunk = cache.get(key)
+        if chunk is None:
+            chunk = cache[key] = _diff_entities(kind, frame[kind], base[kind])
+        out.append(chunk)
+    optional = frame.get("optional_bullets", 0)
+    if optional:
+        # 子彈段的空間 = 上限扣掉前面實際編碼出的大小；截過的子彈寫回 frame，encoder 以它當下一包的 baseline
+        room = frame["byte_cap"] - sum(len(chunk) for chunk in out)
+        frame["bullets"] = _fit_bullets(frame["bullets"], base["bullets"], optional, room)
+    out.append(_diff_bullets(frame["bullets"], base["bullets"]))
+    return b"".join(out)
+
+class SnapshotEncoder:
+    """保存上一幀作為 baseline，每 keyframe_interval 個 tick 強制送一次關鍵幀"""
+    def __init__(self, keyframe_interval):
+        self.keyframe_interval = keyframe_interval
+        self.base = None
+        self.base_tick = 0
+        self.styles_sent = 0
+        self.since_key = 0
+
+    def encode(self, frame, tick, cache=None):
+        if self.base is None or self.since_key >= self.keyframe_interval:
+            packet = encode_frame(frame, tick, cache=cache)
+            self.since_key = 0
+        else:
+            # 樣式表只有在新增樣式時才重送
+            send_styles = len(frame["styles"]) != self.styles_sent
+            packet = encode_frame(frame, tick, self.base, self.base_tick, send_styles, cache)
+        self.since_key += 1
+        self.base, self.base_tick = frame, tick
+        self.styles_sent = len(frame["styles"])
+        return packet
+
+    def reset(self):
+        """下一次 encode 改送關鍵幀 (例如有新的接收者加入)"""
+        self.base = None
+
+# --- 解碼 (Python 版，與 frontend/main.js 的 applySnapshot 相同)：給 bench_load.py 等工具模擬真實前端 ---
+_BULLET_OWNERS = {code: owner for owner, code in OWNER_CODES.items()}
+
+def _read_str(data, pos):
+    n = data[pos]
+    return data[pos + 1:pos + 1 + n].decode("utf-8"), pos + 1 + n
+
+def _read_meta(kind, data, pos):
+    if kind == "players":
+        sid, pos = _read_str(data, pos)
+        name, pos = _read_str(data, pos)
+        color, pos = _read_str(data, pos)
+        return (sid, name, color, data[pos]), pos + 1
+    fmt = _META[kind]
+    return fmt.unpack_from(data, pos), pos + fmt.size
+
+class SnapshotDecoder:
+    """前端持有的那一份狀態：實體表 id -> [meta, state]，子彈 id -> [style, x, y, vx, vy]"""
+    def __init__(self):
+        self.tick = -1
+        self.w = False
+        self.ack = None
+        self.styles = []
+        self.events = []
+        self.entities = {kind: {} for kind in ENTITY_KINDS}
+        self.bullets = {}
+
+    def apply(self, data):
+        """套用一個封包；delta 的 baseline 不是目前持有的那一幀時回傳 False (等下一個關鍵幀)"""
+        msg_type, tick, base_tick, flags = _HEADER.unpack_from(data)
+        if msg_type == MSG_DELTA and base_tick != self.tick and tick != self.tick:
+            return False
+        pos = _HEADER.size
+        if msg_type == MSG_KEY:
+            for table in self.entities.values():
+                table.clear()
+            self.bullets.clear()
+        self.tick = tick
+        self.w = bool(flags & FLAG_WARNING)
+        self.ack = None
+        if flags & FLAG_ACK:
+            (self.ack,) = _ID.unpack_from(data, pos)
+            pos += _ID.size
+        if flags & FLAG_STYLES:
+            self.styles = []
+            count, pos = data[pos], pos + 1
+            for _ in range(count):
+                owner, size = data[pos], data[pos + 1]
+                color, pos = _read_str(data, pos + 2)
+                self.styles.append((_BULLET_OWNERS.get(owner), color or None, size))
+        self.events = []
+        if flags & FLAG_EVENTS:
+            count, pos = data[pos], pos + 1
+            for _ in range(count):
+                code, pos = data[pos], pos + 1
+                if code & EVENT_POSITIONAL:
+                    x, y = _EVENT_POS.unpack_from(data, pos)
+                    pos += _EVENT_POS.size
+                    self.events.append((SFX_TYPES[code & 0x7F], x, y))
+                else:
+                    self.events.append((SFX_TYPES[code], None, None))
+        for kind in ENTITY_KINDS:
+            pos = self._apply_entities(kind, data, pos)
+        self._apply_bullets(data, pos)
+        return True
+
+    def _apply_entities(self, kind, data, pos):
+        table = self.entities[kind]
+        (n,) = _U16.unpack_from(data, pos)
+        pos += 2
+        for i in struct.unpack_from(f"<{n}I", data, pos):
+            table.pop(i, None)
+        pos += 4 * n
+        (n,) = _U16.unpack_from(data, pos)
+        pos += 2
+        for _ in range(n):
+            (i,) = _ID.unpack_from(data, pos)
+            meta, pos = _read_meta(kind, data, pos + 4)
+            table.setdefault(i, [None, None])[0] = meta
+        (n,) = _U16.unpack_from(data, pos)
+        pos += 2
+        fmt = _STATE[kind]
+        for _ in range(n):
+            (i,) = _ID.unpack_from(data, pos)
+            table.setdefault(i, [None, None])[1] = fmt.unpack_from(data, pos + 4)
+            pos += 4 + fmt.size
+        return pos
+
+    def _apply_bullets(self, data, pos):
+        bullets = self.bullets
+        (n,) = _U16.unpack_from(data, pos)
+        pos += 2
+        for i in np.frombuffer(data, "<u2", n, pos).tolist():
+            bullets.pop(i, None)
+        pos += 2 * n
+        (n,) = _U16.unpack_from(data, pos)
+        pos += 2
+        ids = np.frombuffer(data, "<u2", n, pos).tolist()
+        styles = np.frombuffer(data, "u1", n, pos + 2 * n).tolist()
+        vxs = np.frombuffer(data, "i1", n, pos + 3 * n).tolist()
+        vys = np.frombuffer(data, "i1", n, pos + 4 * n).tolist()
+        for i, style, vx, vy in zip(ids, styles, vxs, vys):
+            bullets[i] = [style, 0, 0, vx, vy]
+        pos += 5 * n
+        (n,) = _U16.unpack_from(data, pos)
+        pos += 2
+        ids = np.frombuffer(data, "<u2", n, pos).tolist()
+        xs = np.frombuffer(data, "<i2", n, pos + 2 * n).tolist()
+        ys = np.frombuffer(data, "<i2", n, pos + 4 * n).tolist()
+        for i, x, y in zip(ids, xs, ys):
+            b = bullets.get(i)
+            if b is not None:
+                b[1] = x
+                b[2] = y
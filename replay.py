@@ -0,0 +1,361 @@
+# replay.py
+# 對局重播紀錄：每個房間一個只會往後寫的紀錄檔，記下 RNG 種子、加入/離開事件與每個 tick 實際套用的輸入，
+# 並定期存一份完整狀態 (checkpoint)。模擬是確定性的，離線重跑就能重現比分爭議與負載下的 bug。
+# 寫檔：tick 內只把位元組附加到記憶體緩衝，壓縮與寫入交給背景執行緒
+#
+#   python replay.py info replays/room_1-1700000000.cwr
+#   python replay.py run replays/room_1-1700000000.cwr --verify      # 從頭快轉並比對每個 checkpoint
+#   python replay.py run replays/room_1-1700000000.cwr --to 9000     # 從最近的 checkpoint 跳到 tick 9000
+#
+# 檔案格式 (little-endian)：
+#   檔頭   4s magic | u8 version | u32 seed | u16 sim_fps | u16 len + room_id
+#   紀錄   u8 kind | u32 tick | u32 len | payload
+#     JOIN        u32 nid | u16 len + sid | u16 len + name
+#     LEAVE       u32 nid
+#     INPUT       (u32 nid | u8 flags [bit0 射擊, bit1 技能, bit2 附向量, bit3~7 移動步數] | 附向量時每一步 f64 dx, f64 dy) * N
+#                 (每一步的向量都與該玩家上一次記錄的相同時省略；checkpoint 之後第一次移動一定附向量)
+#     CHECKPOINT  20s state_digest | zlib(pickle(Room.sim_state()))
+#     END         (空)
+#     SHED        u8 過載降級等級 (overload.py；會影響子彈上限與敵人數)
+# JOIN / LEAVE / SHED 的 tick 為事件發生後下一個要模擬的 tick；INPUT 為套用輸入的 tick；
+# CHECKPOINT 在該 tick 模擬完之後 (tick 為下一個要模擬的 tick)。
+# 注意：重播時使用目前的 config.py，執行中熱更新過設定表 (CONFIG_HOT_RELOAD) 的對局無法完全重現
+import argparse
+import hashlib
+import os
+import pickle
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+from config import SIM_FPS, REPLAY_DIR, REPLAY_CHECKPOINT_EVERY
+from rooms import Room
+
+MAGIC = b"CWRP"
+VERSION = 4 # 模擬邏輯改變 (重播結果會不同) 時一併調高
+KIND_JOIN, KIND_LEAVE, KIND_INPUT, KIND_CHECKPOINT, KIND_END, KIND_SHED = 1, 2, 3, 4, 5, 6
+KIND_NAMES = {KIND_JOIN: "join", KIND_LEAVE: "leave", KIND_INPUT: "input", KIND_CHECKPOINT: "checkpoint", KIND_END: "end",
+              KIND_SHED: "shed"}
+
+FLAG_SHOOT = 1
+FLAG_SKILL = 2
+FLAG_VECTOR = 4
+STEP_SHIFT = 3
+
+_HEADER = struct.Struct("<4sBIH")
+_RECORD = struct.Struct("<BII")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_INPUT = struct.Struct("<IB")
+_MOVE = struct.Struct("<dd")
+DIGEST_SIZE = 20
+
+FLUSH_EVERY = SIM_FPS # 每秒把緩衝交給寫入執行緒一次
+FLUSH_BYTES = 64 * 1024
+
+class ReplayError(Exception):
+    """紀錄檔損毀，或重播結果與紀錄不符 (模擬不再確定)"""
+
+def _pack_str(s):
+    data = s.encode("utf-8")
+    return _U16.pack(len(data)) + data
+
+def _unpack_str(buf, pos):
+    (n,) = _U16.unpack_from(buf, pos)
+    pos += _U16.size
+    return buf[pos:pos + n].decode("utf-8"), pos + n
+
+def state_digest(room):
+    """模擬狀態的摘要 (含 RNG 狀態)；同一份紀錄重跑到同一個 tick 時必須相同"""
+    gs = room.gs
+    n = gs.bullets.n
+    h = hashlib.sha1()
+    h.update(repr((
+        gs.clock.tick, room.rng.getstate(), gs.enemy_store.np_rng.bit_generator.state, sorted(room.game_vars.items()), room.boss_shoot_toggle, gs.warning_active,
+        # 座標一律轉成 float：紀錄中的移動向量是 f64，客戶端送整數時即時模擬的座標會是 int (值相同)
+        [(p.nid, float(p.x), float(p.y), p.hp, p.score, p.charge, p.lives_count, p.weapon_key) for p in gs.players.values()],
+        [(e.id, e.type, float(e.x), float(e.y), e.hp) for e in gs.enemies.values()],
+        [(i.id, i.item_type, float(i.x), float(i.y)) for i in gs.items],
+        # 技能施放者以 nid 比對：重連 (Room.rebind) 會換掉 sid，重播中的房間仍是舊的 sid
+        gs.skills.ids, [gs.players[sid].nid if sid in gs.players else None for sid in gs.skills.owners],
+    )).encode())
+    for column in (gs.bullets.x, gs.bullets.y, gs.bullets.dx, gs.bullets.dy, gs.bullets.damage, gs.bullets.bounce_left):
+        h.update(column[:n].tobytes())
+    for column in (gs.skills.x, gs.skills.y, gs.skills.durability):
+        h.update(column[:gs.skills.n].tobytes())
+    return h.digest()
+
+# --- 寫入 ---
+# 所有房間共用一條寫入執行緒；佇列項目為 (檔案, kind, tick, 資料)：kind None 為原始位元組，
+# CHECKPOINT 為待壓縮的狀態，END 寫完後關檔；檔案為 None 時結束執行緒
+_queue = queue.SimpleQueue()
+_writer_thread = None
+_writer_lock = threading.Lock()
+
+def _writer_loop():
+    while True:
+        f, kind, tick, data = _queue.get()
+        if f is None:
+            return
+        try:
+            if kind is None:
+                f.write(data)
+            elif kind == KIND_CHECKPOINT:
+                digest, state = data
+                payload = digest + zlib.compress(state, 1)
+                f.write(_RECORD.pack(KIND_CHECKPOINT, tick, len(payload)) + payload)
+                f.flush()
+            elif kind == KIND_END:
+                f.write(data)
+                f.close()
+        except (OSError, ValueError) as e:
+            print(f"[replay] write failed: {e}")
+
+def _submit(item):
+    global _writer_thread
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name="replay-writer", daemon=True)
+            _writer_thread.start()
+    _queue.put(item)
+
+def shutdown(timeout=5.0):
+    """等寫入執行緒把佇列寫完 (行程結束前呼叫，先 close 各房間)"""
+    global _writer_thread
+    with _writer_lock:
+        thread, _writer_thread = _writer_thread, None
+    if thread is not None:
+        _queue.put((None, None, 0, None))
+        thread.join(timeout)
+
+class ReplayWriter:
+    """Room.recorder 介面：join / leave / input / tick_done / close，全部只在模擬執行緒呼叫"""
+    def __init__(self, path, room, checkpoint_every=REPLAY_CHECKPOINT_EVERY):
+        self.path = path
+        self.file = open(path, "wb")
+        self.checkpoint_every = checkpoint_every
+        self.buf = bytearray(_HEADER.pack(MAGIC, VERSION, room.seed, SIM_FPS) + _pack_str(room.id))
+        self.inputs = bytearray() # 目前 tick 的輸入
+        self.vectors = {} # nid -> 最後記錄的 (dx, dy)
+        self.last_flush_tick = 0
+
+    def _record(self, kind, tick, payload=b""):
+        self.buf += _RECORD.pack(kind, tick, len(payload))
+        self.buf += payload
+
+    def _flush(self, tick):
+        if self.buf:
+            _submit((self.file, None, tick, bytes(self.buf)))
+            self.buf = bytearray()
+        self.last_flush_tick = tick
+
+    def join(self, tick, nid, sid, name):
+        self._record(KIND_JOIN, tick, _U32.pack(nid) + _pack_str(sid) + _pack_str(name))
+
+    def leave(self, tick, nid):
+        self.vectors.pop(nid, None)
+        self._record(KIND_LEAVE, tick, _U32.pack(nid))
+
+    def shed(self, tick, level):
+        self._record(KIND_SHED, tick, bytes((level,)))
+
+    def input(self, nid, steps, shoot, skill):
+        """steps：這個 tick 實際套用的移動 [(dx, dy, seq)] (最多 MAX_MOVE_STEPS_PER_TICK 步)"""
+        flags = (len(steps) << STEP_SHIFT) | (FLAG_SHOOT if shoot else 0) | (FLAG_SKILL if skill else 0)
+        last = self.vectors.get(nid)
+        if any((dx, dy) != last for dx, dy, _ in steps):
+            self.vectors[nid] = steps[-1][:2]
+            self.inputs += _INPUT.pack(nid, flags | FLAG_VECTOR)
+            for dx, dy, _ in steps:
+                self.inputs += _MOVE.pack(dx, dy)
+        else:
+            self.inputs += _INPUT.pack(nid, flags)
+
+    def tick_done(self, room):
+        """Room.update() 結束時呼叫 (時鐘已前進)"""
+        tick = room.gs.clock.tick
+        if self.inputs:
+            self._record(KIND_INPUT, tick - 1, bytes(self.inputs))
+            self.inputs.clear()
+        if tick % self.checkpoint_every == 0:
+            self.checkpoint(room)
+        elif tick - self.last_flush_tick >= FLUSH_EVERY or len(self.buf) >= FLUSH_BYTES:
+            self._flush(tick)
+
+    def checkpoint(self, room):
+        # 狀態必須在 tick 之間同步取得；壓縮與寫檔在背景執行緒
+        tick = room.gs.clock.tick
+        self._flush(tick)
+        self.vectors.clear() # 從 checkpoint 開始重播時不知道之前的向量
+        _submit((self.file, KIND_CHECKPOINT, tick, (state_digest(room), pickle.dumps(room.sim_state(), 5))))
+
+    def close(self, tick):
+        self._flush(tick)
+        _submit((self.file, KIND_END, tick, _RECORD.pack(KIND_END, tick, 0)))
+
+def attach(room, directory=REPLAY_DIR):
+    """REPLAY_DIR 有設定時幫新房間掛上 ReplayWriter (須在第一位玩家加入前呼叫)；
+    由 roomstate.py 還原、對局已進行到一半的房間，紀錄以一份 checkpoint 開頭"""
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        room.recorder = ReplayWriter(os.path.join(directory, f"{room.id}-{int(time.time())}.cwr"), room)
+        if room.gs.clock.tick:
+            room.recorder.checkpoint(room)
+    return room
+
+# --- 讀取與重播 ---
+class ReplayReader:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.data = f.read()
+        if len(self.data) < _HEADER.size:
+            raise ReplayError(f"{path}: too short")
+        magic, version, self.seed, self.sim_fps = _HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            raise ReplayError(f"{path}: not a replay log (or unsupported version {version})")
+        self.room_id, self.start = _unpack_str(self.data, _HEADER.size)
+
+    def records(self, pos=None):
+        """依序產生 (kind, tick, payload, 下一筆的位置)；寫到一半的最後一筆直接略過"""
+        data = self.data
+        pos = self.start if pos is None else pos
+        while pos + _RECORD.size <= len(data):
+            kind, tick, n = _RECORD.unpack_from(data, pos)
+            end = pos + _RECORD.size + n
+            if end > len(data):
+                return
+            yield kind, tick, data[pos + _RECORD.size:end], end
+            pos = end
+
+    def checkpoints(self):
+        """[(tick, 該 checkpoint 之後第一筆紀錄的位置, payload)]"""
+        return [(tick, end, payload) for kind, tick, payload, end in self.records() if kind == KIND_CHECKPOINT]
+
+def _apply_inputs(room, players, payload, vectors):
+    """vectors：nid -> 最後記錄的向量 (重播過程中維護，遇到 checkpoint 清空)"""
+    pos = 0
+    while pos < len(payload):
+        nid, flags = _INPUT.unpack_from(payload, pos)
+        pos += _INPUT.size
+        inp = room.inputs[players[nid]]
+        steps = flags >> STEP_SHIFT
+        inp.moves.clear()
+        for _ in range(steps):
+            if flags & FLAG_VECTOR:
+                vectors[nid] = _MOVE.unpack_from(payload, pos)
+                pos += _MOVE.size
+            inp.moves.append((*vectors[nid], None))
+        inp.shoot = bool(flags & FLAG_SHOOT)
+        inp.skill = bool(flags & FLAG_SKILL)
+
+def _advance(room, tick):
+    while room.gs.clock.tick < tick:
+        room.update()
+
+def replay(reader, to_tick=None, seek=True, verify=False):
+    """重跑紀錄，回傳 (room, 統計)；to_tick 為停下時「下一個要模擬的 tick」
+    seek=True 時從 to_tick 之前最近的 checkpoint 開始，verify=True 時比對途經的每個 checkpoint"""
+    room = Room(reader.room_id, seed=reader.seed)
+    pos = None
+    if seek and to_tick is not None:
+        usable = [c for c in reader.checkpoints() if c[0] <= to_tick]
+        if usable:
+            tick, pos, payload = usable[-1]
+            room.load_sim_state(pickle.loads(zlib.decompress(payload[DIGEST_SIZE:])))
+    if pos is None:
+        # 還原房間的紀錄從對局中途開始，只能從開頭的 checkpoint 重跑
+        kind, tick, payload, end = next(reader.records(), (None, 0, b"", None))
+        if kind == KIND_CHECKPOINT and tick > 0:
+            room.load_sim_state(pickle.loads(zlib.decompress(payload[DIGEST_SIZE:])))
+            pos = end
+    players = {p.nid: sid for sid, p in room.gs.players.items()}
+    start_tick = room.gs.clock.tick
+    verified = 0
+    vectors = {}
+    started = time.perf_counter()
+    for kind, tick, payload, _ in reader.records(pos):
+        if to_tick is not None and tick >= to_tick:
+            break
+        _advance(room, tick)
+        if kind == KIND_INPUT:
+            _apply_inputs(room, players, payload, vectors)
+        elif kind == KIND_JOIN:
+            (nid,) = _U32.unpack_from(payload)
+            sid, p2 = _unpack_str(payload, _U32.size)
+            name, _ = _unpack_str(payload, p2)
+            room.join(sid, name)
+            if room.gs.players[sid].nid != nid:
+                raise ReplayError(f"tick {tick}: {sid} joined as nid {room.gs.players[sid].nid}, log says {nid}")
+            players[nid] = sid
+        elif kind == KIND_LEAVE:
+            (nid,) = _U32.unpack_from(payload)
+            room.leave(players.pop(nid))
+        elif kind == KIND_SHED:
+            room.shed_level = payload[0]
+        elif kind == KIND_CHECKPOINT:
+            vectors.clear()
+            if verify:
+                if state_digest(room) != payload[:DIGEST_SIZE]:
+                    raise ReplayError(f"tick {tick}: state differs from checkpoint")
+                verified += 1
+        elif kind == KIND_END:
+            break
+    if to_tick is not None:
+        _advance(room, to_tick)
+    elapsed = time.perf_counter() - started
+    ticks = room.gs.clock.tick - start_tick
+    return room, {"start_tick": start_tick, "ticks": ticks, "elapsed": elapsed, "verified": verified}
+
+# --- CLI ---
+def _info(reader):
+    counts = Counter()
+    last_tick = 0
+    for kind, tick, _, _ in reader.records():
+        counts[KIND_NAMES.get(kind, "unknown")] += 1
+        last_tick = tick
+    print(f"room {reader.room_id}  seed {reader.seed}  sim_fps {reader.sim_fps}  {len(reader.data)} bytes")
+    print(f"last tick {last_tick} ({last_tick / reader.sim_fps:.1f} s)  " + "  ".join(f"{k}={v}" for k, v in counts.items()))
+    print("checkpoints at ticks:", ", ".join(str(tick) for tick, _, _ in reader.checkpoints()) or "-")
+
+def _summary(room, stats, sim_fps):
+    gs = room.gs
+    ticks, elapsed = stats["ticks"], stats["elapsed"]
+    speed = ticks / elapsed if elapsed > 0 else float("inf")
+    print(f"simulated ticks {stats['start_tick']}..{gs.clock.tick} ({ticks} ticks) in {elapsed:.2f} s"
+          f"  {speed:.0f} ticks/s (realtime x{speed / sim_fps:.1f})")
+    if stats["verified"]:
+        print(f"verified {stats['verified']} checkpoints")
+    print(f"boss phase {room.game_vars['boss_phase']}  enemies {len(gs.enemies)}  bullets {len(gs.bullets)}  items {len(gs.items)}")
+    for sid, p in sorted(gs.players.items(), key=lambda kv: -kv[1].score):
+        print(f"  {p.name:<8} nid {p.nid:<5} score {p.score:<6} hp {p.hp}/{p.max_hp}  weapon {p.weapon_key}  charge {p.charge}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or re-simulate a Cell Wars replay log")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    info = sub.add_parser("info", help="header, record counts and checkpoints")
+    info.add_argument("log")
+    run = sub.add_parser("run", help="re-simulate headlessly as fast as possible")
+    run.add_argument("log")
+    run.add_argument("--to", type=int, default=None, help="stop before simulating this tick")
+    run.add_argument("--from-start", action="store_true", help="ignore checkpoints when seeking")
+    run.add_argument("--verify", action="store_true", help="check the state against every checkpoint passed")
+    args = parser.parse_args(argv)
+
+    reader = ReplayReader(args.log)
+    if args.cmd == "info":
+        _info(reader)
+        return 0
+    try:
+        room, stats = replay(reader, args.to, seek=not (args.from_start or args.verify), verify=args.verify)
+    except ReplayError as e:
+        print(f"replay diverged: {e}", file=sys.stderr)
+        return 1
+    _summary(room, stats, reader.sim_fps)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
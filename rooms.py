@@ -0,0 +1,716 @@
+# rooms.py
+# 房間分片：每個房間有自己的 GameState / Boss 階段狀態與遊戲迴圈，
+# 這裡只負責模擬 (不碰 socket)，發送由 server.py 處理
+import asyncio
+import itertools
+import math
+import random
+import time
+from collections import deque
+import numpy as np
+
+from config import *
+import archetypes
+from utils import compress_state, check_collision, SimClock
+from game_objects import Player, Enemy, Item, EntityPool
+from protocol import SnapshotEncoder, SFX_CODES, pack_events
+from interest import filter_frame
+from bullets import OWNER_PLAYER, HIT_BOUNCED, BulletStore
+from spatial import SpatialGrid, PointIndex
+from enemies import EnemyStore, CONTACT_HIT_CHANCE
+from skills import SkillStore
+from overload import CAP_BULLETS, SHED_ENEMIES, SHED_SNAPSHOTS
+
+# 使用物件管理 State
+class GameState:
+    def __init__(self, rng, np_rng):
+        self.clock = SimClock(SIM_FPS) # 模擬時間只由 tick 推進
+        self.players = {}
+        self.enemies = {}
+        self.enemy_store = EnemyStore(np_rng) # 普通敵人的批次 AI 陣列 (Boss 不在內)
+        self.boss_id = None
+        self.bullets = BulletStore(rng)
+        self.items = []
+        self.skills = SkillStore()
+        self.warning_active = False
+        self.next_id = itertools.count(1).__next__ # 房間內的整數實體 id (玩家 nid / 敵人 / 道具 / 技能)
+        # 敵人與道具死亡/消失後回收重用，避免長時間遊玩不斷配置新物件
+        self.enemy_pool = EntityPool(Enemy)
+        self.item_pool = EntityPool(Item)
+
+# --- Helper: 固定步長排程 ---
+class LoopTimer:
+    """牆上時間只用來決定「該跑幾個 tick」；落後時追趕，超過 max_steps 的積欠直接丟棄"""
+    def __init__(self, fps, max_steps=MAX_CATCHUP_STEPS, metrics=None):
+        self.frame_duration = 1.0 / fps
+        self.max_steps = max_steps
+        self.metrics = metrics # metrics.Metrics，記錄掉幀
+        self.next_tick = time.time()
+
+    async def wait(self):
+        sleep_time = self.next_tick - time.time()
+        if sleep_time > 0:
+            await asyncio.sleep(sleep_time)
+
+    def consume(self):
+        """回傳現在應推進的 tick 數 (至少 1)"""
+        now = time.time()
+        steps = max(1, int((now - self.next_tick) / self.frame_duration) + 1)
+        dropped = 0
+        if steps > self.max_steps:
+            dropped = steps - self.max_steps
+            steps = self.max_steps
+            self.next_tick = now + self.frame_duration
+        else:
+            self.next_tick += steps * self.frame_duration
+        if steps > 1 and self.metrics is not None:
+            self.metrics.frame_overrun(dropped)
+        return steps
+
+def _move_axis(value):
+    """移動向量的一個分量：只接受有限的 int / float，限制在 [-1, 1]；其他值回傳 None"""
+    if type(value) not in (int, float) or not math.isfinite(value): return None
+    return max(-1, min(1, value))
+
+class PlayerInput:
+    """兩個 tick 之間累積的玩家輸入；moves 為尚未套用的移動 (dx, dy, seq)，每一步用自己的向量 (與前端的預測相同)"""
+    __slots__ = ("moves", "shoot", "skill")
+
+    def __init__(self):
+        self.moves = deque()
+        self.reset()
+
+    def reset(self):
+        self.shoot = False
+        self.skill = False
+
+class Room:
+    def __init__(self, room_id, seed=None):
+        self.id = room_id
+        # 每個房間一個可指定種子的 RNG，模擬中的所有隨機都從這裡取
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.gs = GameState(self.rng, np.random.default_rng(self.seed))
+        self.max_enemies = MAX_ENEMIES
+        self.enemy_spawns_per_tick = ENEMY_SPAWNS_PER_TICK
+        self.shed_level = 0 # 過載降級等級 (見 overload.py)，由遊戲迴圈透過 set_shed_level 設定
+        self.sfx_buffer = []
+        self.game_vars = {
+            "boss_phase": "initial", # 初始狀態
+            "phase_start_tick": 0,
+            "elite_kill_count": 0,
+            "target_kills": 5,        # 測試用設 5，正式可改回 10
+            "boss_score_threshold": 500 # 分數達到 500 啟動第一次魔王
+        }
+        self.boss_shoot_toggle = 0
+        # 碰撞網格：每個 tick 重建一次 (玩家/敵人各一張)
+        self.player_grid = SpatialGrid()
+        self.enemy_grid = SpatialGrid()
+        self.skill_grid = SpatialGrid() # 技能 (給敵方子彈的 broadphase 用)
+        self.target_index = PointIndex() # 彈射子彈轉向用的敵人中心點 (見 ricochet_targets)
+        self.target_index_tick = -1
+        self.encoders = {} # sid -> SnapshotEncoder (每位玩家各自的 baseline)
+        self.send_every = {} # sid -> 每幾個快照送一次 (送出佇列跟不上的玩家降頻，見 outbound.py)
+        self.snapshot_count = 0
+        self.score_updates = {} # 名字 -> 最新分數，由 server/worker 轉交排行榜 (見 leaderboard.py)
+        self.last_snapshot_tick = -SNAPSHOT_EVERY
+        self.inputs = {} # sid -> PlayerInput
+        self.sessions = {} # sid -> 斷線重連用的 token (見 RoomManager.resume)
+        self.last_checkpoint_tick = 0 # 上次取完整快照的 tick (見 roomstate.py)
+        # 分段計時 hook：有 start() / lap(phase) 的物件 (見 bench_sim.py)，None 時完全不計時
+        self.profiler = None
+        # 重播紀錄 hook：replay.ReplayWriter (見 replay.attach)，None 時不記錄
+        self.recorder = None
+        self.task = None # 由 server.py 掛上的遊戲迴圈 task
+
+    @property
+    def player_count(self):
+        return len(self.gs.players)
+
+    def close(self):
+        if self.task:
+            self.task.cancel()
+        if self.recorder is not None:
+            self.recorder.close(self.gs.clock.tick)
+            self.recorder = None
+
+    def sim_state(self):
+        """影響模擬結果的全部狀態 (可 pickle；encoder / profiler / recorder 不在內)"""
+        return {
+            "gs": self.gs, "rng": self.rng, "game_vars": self.game_vars, "boss_shoot_toggle": self.boss_shoot_toggle,
+            "inputs": self.inputs, "last_snapshot_tick": self.last_snapshot_tick, "shed_level": self.shed_level,
+        }
+
+    def load_sim_state(self, state):
+        self.gs = state["gs"]
+        self.rng = state["rng"]
+        self.game_vars = state["game_vars"]
+        self.boss_shoot_toggle = state["boss_shoot_toggle"]
+        self.inputs = state["inputs"]
+        self.last_snapshot_tick = state["last_snapshot_tick"]
+        self.shed_level = state.get("shed_level", 0)
+        # 還原後的第一包一律是關鍵幀
+        self.encoders = {sid: SnapshotEncoder(KEYFRAME_INTERVAL) for sid in self.gs.players}
+
+    def spawn_boss(self):
+        gs = self.gs
+        boss = gs.enemy_pool.acquire(gs.next_id(), 999, self.rng)
+        boss.x, boss.y = 150, -300
+        gs.enemies[boss.id] = boss
+        gs.boss_id = boss.id
+        self.game_vars["boss_phase"] = "boss_active"
+        self.gs.warning_active = False
+
+    def spawn_item(self, x, y, forced_type=None):
+        types = ["spread", "ricochet", "arc"]
+        itype = forced_type if forced_type else self.rng.choice(types)
+        gs = self.gs
+        gs.items.append(gs.item_pool.acquire(gs.next_id(), x, y, itype))
+
+    # --- 主遊戲迴圈的一個 tick ---
+    def update(self):
+        """以固定步長推進一個 tick (不看牆上時間，可比即時更快地連續呼叫)"""
+        gs, game_vars = self.gs, self.game_vars
+        player_grid, enemy_grid = self.player_grid, self.enemy_grid
+        rng = self.rng
+        tick = gs.clock.tick
+        sfx_buffer = self.sfx_buffer
+        prof = self.profiler
+        if prof is not None: prof.start()
+
+        # 0. 批次套用上一個 tick 之後累積的玩家輸入
+        self._drain_inputs(sfx_buffer)
+        if prof is not None: prof.lap("inputs")
+
+        # 1. 敵人生成與 Boss 狀態機
+        
+        # 取得當前最高分
+        max_score = max([p.score for p in gs.players.values()] or [0])
+
+        # --- 狀態轉換邏輯 ---
+        if game_vars["boss_phase"] == "initial":
+            # 條件 A: 分數達標 OR 條件 B: 已經殺了一些小怪 (這裡用分數判定)
+            if max_score >= game_vars["boss_score_threshold"]:
+                game_vars["boss_phase"] = "countdown"
+                game_vars["phase_start_tick"] = tick
+
+        elif game_vars["boss_phase"] == "countdown":
+            # 倒數 25 秒準備進入警告
+            if tick - game_vars["phase_start_tick"] > 25 * SIM_FPS:
+                game_vars["boss_phase"] = "warning"
+                game_vars["phase_start_tick"] = tick
+                gs.warning_active = True
+                sfx_buffer.append((SFX_CODES['boss_coming'], None, None))
+
+        elif game_vars["boss_phase"] == "warning":
+            # 警告 5 秒後正式出生
+            if tick - game_vars["phase_start_tick"] > 5 * SIM_FPS:
+                self.spawn_boss()
+                sfx_buffer.append((SFX_CODES['boss_coming'], None, None))
+
+        # --- 敵人生成控制 ---
+        # 只有在非 Boss 戰期間才生成普通小怪
+        if game_vars["boss_phase"] != "boss_active":
+            max_enemies, spawns = self.max_enemies, self.enemy_spawns_per_tick
+            if self.shed_level >= SHED_ENEMIES: # 過載：少一點敵人 (已在場上的不會被移除)
+                max_enemies = int(max_enemies * OVERLOAD_ENEMY_SCALE)
+                spawns = max(1, int(spawns * OVERLOAD_ENEMY_SCALE))
+            for _ in range(min(spawns, max_enemies - len(gs.enemies))):
+                rand_val = rng.random()
+                # 根據狀態調整精英怪出現機率
+                v_type = 3 if rand_val < 0.15 else (2 if rand_val < 0.4 else 1)
+                enemy = gs.enemy_pool.acquire(gs.next_id(), v_type, rng)
+                gs.enemies[enemy.id] = enemy
+                gs.enemy_store.add(enemy)
+        if prof is not None: prof.lap("spawn")
+
+        # 玩家位置在 tick 內不會被 socket 事件改動，這裡建一次網格給 2~5 步共用 (敵人到 AI 階段之前也不會移動)
+        player_grid.clear()
+        for pid, player in gs.players.items():
+            player_grid.insert((pid, player), player)
+        enemy_grid.clear()
+        for eid, enemy in gs.enemies.items():
+            enemy_grid.insert((eid, enemy), enemy)
+
+        # 2. 道具移動 (出界與被吃掉的道具回收到物件池)
+        item_pool = gs.item_pool
+        remaining_items = []
+        for item in gs.items:
+            if not item.update():
+                item_pool.release(item)
+                continue
+            # 玩家吃道具 (同一顆道具由迭代順序最前面碰到的玩家吃掉)
+            for pid, player in player_grid.query(item):
+                if check_collision(player, item):
+                    player.apply_item(item.item_type)
+                    sfx_buffer.append((SFX_CODES['powerup'], item.x, item.y)) # 假設前端有這音效
+                    item_pool.release(item)
+                    break
+            else:
+                remaining_items.append(item)
+        gs.items = remaining_items
+        if prof is not None: prof.lap("items")
+
+        # 3. 技能：整批繞施放者旋轉，撞怪只查 enemy_grid 附近的格子；同時登記進 skill_grid 給下面的敵方子彈篩選
+        skills, skill_grid = gs.skills, self.skill_grid
+        skills.update(gs.players, tick)
+        skill_grid.clear()
+        for i in range(skills.n):
+            skill_grid.insert(i, skills.ref(i))
+        for i in skills.ready(tick).tolist():
+            ref = skills.ref(i)
+            for eid, enemy in enemy_grid.query(ref):
+                if gs.enemies.get(eid) is not enemy: continue # 本 tick 已被擊殺
+                if check_collision(ref, enemy):
+                    enemy.hp -= skills.hit_enemy(i, tick)
+                    sfx_buffer.append((SFX_CODES['boss_hitted' if enemy.type == 999 else 'enemy_hitted'],
+                                       enemy.x + enemy.size / 2, enemy.y + enemy.size / 2))
+                    if enemy.hp <= 0:
+                        self._kill_enemy(enemy, skills.owners[i])
+                    break # 每次間隔只撞一隻
+        if prof is not None: prof.lap("skills")
+
+        # 4. 子彈移動與碰撞 (核心重構)
+        # 整批移動後，只有外接框碰到有目標格子的子彈才逐顆判定
+        bullets = gs.bullets
+        bullets.update(gs.clock.now)
+        keep = np.ones(bullets.n, dtype=bool)
+        is_player = bullets.owner_type[:bullets.n] == OWNER_PLAYER
+        candidates = np.union1d(bullets.near(enemy_grid, is_player), bullets.near(player_grid, ~is_player))
+        if skills.n:
+            candidates = np.union1d(candidates, bullets.near(skill_grid, ~is_player))
+        for i in candidates.tolist():
+            b = bullets.ref(i)
+            hit = survives = False
+            # A. 玩家子彈打怪
+            if b.owner_type == 'player':
+                hit_set = b.hit_set
+                for eid, enemy in enemy_grid.query(b):
+                    if gs.enemies.get(eid) is not enemy: continue # 本 tick 已被擊殺
+                    if eid in hit_set: continue # 彈射子彈不重複打同一隻
+
+                    if check_collision(b, enemy):
+                        enemy.hp -= b.damage
+                        hit = True
+                        sfx_buffer.append((SFX_CODES['boss_hitted' if enemy.type == 999 else 'enemy_hitted'],
+                                           enemy.x + enemy.size / 2, enemy.y + enemy.size / 2))
+                        
+                        # 處理彈射：轉向最近、還沒打過的敵人
+                        survives = b.handle_hit(eid, self.ricochet_targets() if b.b_type == "bounce" else None)
+                        
+                        # 處理玩家充能
+                        if b.owner_id in gs.players:
+                            p = gs.players[b.owner_id]
+                            p.hit_accumulated += 1
+                            if p.hit_accumulated >= 20:
+                                p.hit_accumulated = 0
+                                p.charge = min(3, p.charge + 1)
+
+                        # 怪物死亡
+                        if enemy.hp <= 0:
+                            self._kill_enemy(enemy, b.owner_id)
+
+                        # 子彈消失，或彈射子彈已轉向下一個目標 (下一個 tick 再判定)；原路彈回的繼續判定其他敵人
+                        if survives != HIT_BOUNCED: break
+                        hit_set = b.hit_set
+
+            # B. 怪物子彈打人 (先被技能擋下的就不會打到人)
+            else:
+                for si in skill_grid.query(b) if skills.n else ():
+                    if check_collision(b, skills.ref(si)) and skills.block(si):
+                        hit = True
+                        break
+                for pid, player in player_grid.query(b) if not hit else ():
+                    if player.is_invincible(): continue
+                    
+                    if check_collision(b, player, r2_override=15):
+                        is_dead = player.take_damage(b.damage)
+                        hit = True
+                        sfx_buffer.append((SFX_CODES['character_hitted'], player.x + 15, player.y + 15))
+                        if is_dead:
+                             # 重生已在 take_damage 處理
+                             pass 
+                        break
+                if hit: survives = b.handle_hit(None) # 彈射子彈原路彈回
+
+            # 命中後只有還有彈射次數的子彈保留
+            keep[i] = not hit or survives
+
+        bullets.compact(keep)
+        if prof is not None: prof.lap("bullets")
+
+        # 5. 怪物 AI 與 射擊
+        boss = gs.enemies.get(gs.boss_id)
+        if boss is not None: # Boss Movement
+            enemy, eid = boss, boss.id
+            enemy.move_timer += 1
+            if enemy.move_timer > 60:
+                enemy.dx = rng.choice([-2, -1, 0, 1, 2])
+                enemy.dy = rng.choice([-1, 0, 1])
+                enemy.move_timer = 0
+            enemy.x = max(0, min(MAP_WIDTH - enemy.size, enemy.x + enemy.dx))
+            enemy.y = max(0, min(MAP_HEIGHT - enemy.size, enemy.y + enemy.dy))
+            
+            # Boss Fire
+            is_enraged = (enemy.hp < enemy.max_hp * 0.5)
+            fire_rate = 0.05 if is_enraged else 0.03
+            if rng.random() < fire_rate:
+                cx, cy = enemy.x + enemy.size/2, enemy.y + enemy.size/2
+                if is_enraged:
+                    configs = [(0, 10), (0, -10), (10, 0), (-10, 0)]
+                else:
+                    self.boss_shoot_toggle += 1
+                    configs = [(0, 10), (0, -10)] if self.boss_shoot_toggle % 2 == 0 else [(10, 0), (-10, 0)]
+                
+                boss_bullet = archetypes.current.boss_bullet
+                for dx, dy in configs:
+                    # Boss 子彈直接指定向量
+                    gs.bullets.spawn(cx, cy, eid, "boss", boss_bullet, dx, dy)
+                sfx_buffer.append((SFX_CODES['boss_shot'], cx, cy))
+
+        # 普通怪物：整批移動，遊走/撞人/射擊的亂數一次取完 (見 enemies.py)
+        store = gs.enemy_store
+        if store.n:
+            contact_draws, fire_draws = store.step()
+            # 普通怪物撞人 (受傷後進入無敵，每位玩家每 tick 最多扣一次)
+            hits = contact_draws < CONTACT_HIT_CHANCE
+            for pid, player in gs.players.items():
+                if player.is_invincible(): continue
+                if np.any(store.touching(player) & hits):
+                    player.take_damage(1)
+                    sfx_buffer.append((SFX_CODES['character_hitted'], player.x + 15, player.y + 15))
+
+            # 普通怪物射擊 (敵人子彈向下，同一種子彈批次寫入)
+            xs, ys, size = store.x, store.y, store.size
+            for arch, idx in store.firing(fire_draws):
+                owners = [store.objs[i].id for i in idx.tolist()]
+                cx, cy = xs[idx] + size[idx] / 2, ys[idx] + size[idx]
+                bullet = arch.bullet
+                for offset in arch.fire_offsets:
+                    gs.bullets.spawn_many(cx + offset, cy, owners, "enemy", bullet, 0, bullet.speed)
+            store.sync()
+        if prof is not None: prof.lap("ai")
+
+        gs.clock.advance()
+        if self.recorder is not None: self.recorder.tick_done(self)
+
+    def snapshot_due(self):
+        """距離上次快照是否已滿 SNAPSHOT_EVERY 個 tick (模擬頻率高於發送頻率；過載時拉長間隔)"""
+        every = SNAPSHOT_EVERY * OVERLOAD_SNAPSHOT_SCALE if self.shed_level >= SHED_SNAPSHOTS else SNAPSHOT_EVERY
+        return self.gs.clock.tick - self.last_snapshot_tick >= every
+
+    def snapshot(self):
+        """產生狀態封包，回傳 [(sid, 封包)]；追趕多個 tick 時只在最後呼叫一次
+        上一個快照之後的音效 (同種只留最後一次) 打包成事件段，跟著每位玩家的封包送出"""
+        gs = self.gs
+        tick = gs.clock.tick
+        self.last_snapshot_tick = tick
+        prof = self.profiler
+        if prof is not None: prof.start()
+        # 6. 產生狀態封包 (二進位 keyframe / delta，見 protocol.py)
+        frame = compress_state({
+            "players": gs.players, "enemies": gs.enemies, "bullets": gs.bullets, 
+            "items": gs.items, "skills": gs.skills, "warning_active": gs.warning_active
+        })
+        frame["events"] = pack_events(list({event[0]: event for event in self.sfx_buffer}.values()))
+        self.sfx_buffer = []
+        # 依每位玩家的位置裁切後各自編碼；新玩家的 encoder 沒有 baseline，第一包自然是關鍵幀
+        # 玩家/敵人/技能表在各視野間共用，差異編碼透過 cache 只算一次
+        # 降頻的玩家跳過的快照不編碼，下一包的 delta 直接以上次送出的那包為 baseline
+        packets = []
+        cache = {}
+        radius = INTEREST_RADIUS * OVERLOAD_INTEREST_SCALE if self.shed_level >= SHED_SNAPSHOTS else INTEREST_RADIUS
+        self.snapshot_count += 1
+        for sid, encoder in self.encoders.items():
+            if sid in self.send_every and self.snapshot_count % self.send_every[sid]: continue
+            p = gs.players[sid]
+            view = filter_frame(frame, p.nid, (p.x + p.size / 2, p.y + p.size / 2), radius)
+            view["ack"] = p.input_seq
+            packets.append((sid, encoder.encode(view, tick, cache)))
+        if prof is not None: prof.lap("serialize")
+        return packets
+
+    # --- 玩家操作 ---
+    # socket handler 只把輸入寫進 PlayerInput (O(1))，真正的狀態修改在 tick 開頭批次執行
+    def join(self, sid, name, token=None):
+        skin_type = self.rng.randint(1, 3)
+        p = self.gs.players[sid] = Player(sid, name, skin_type, self.gs.clock, self.rng, self.gs.next_id())
+        self.encoders[sid] = SnapshotEncoder(KEYFRAME_INTERVAL)
+        self.inputs[sid] = PlayerInput()
+        self.sessions[sid] = token
+        if self.recorder is not None: self.recorder.join(self.gs.clock.tick, p.nid, sid, name)
+
+    def leave(self, sid):
+        gs = self.gs
+        if sid in gs.players:
+            if self.recorder is not None: self.recorder.leave(gs.clock.tick, gs.players[sid].nid)
+            del gs.players[sid]
+        self.encoders.pop(sid, None)
+        self.send_every.pop(sid, None)
+        self.inputs.pop(sid, None)
+        self.sessions.pop(sid, None)
+
+    def suspend(self, sid):
+        """玩家斷線等待重連：角色留在場上，但不再產生封包 (rebind 時重新開始)"""
+        self.encoders.pop(sid, None)
+        self.send_every.pop(sid, None)
+
+    def rebind(self, old_sid, new_sid):
+        """玩家重連 (新的 socket sid) 時接回原本的角色；字典順序不變，重播紀錄以 nid 記錄不受影響"""
+        gs = self.gs
+        if old_sid not in gs.players: return False
+        rename = lambda d: {new_sid if k == old_sid else k: v for k, v in d.items()}
+        gs.players = rename(gs.players)
+        gs.players[new_sid].sid = new_sid
+        self.inputs = rename(self.inputs)
+        self.sessions = rename(self.sessions)
+        self.encoders.pop(old_sid, None)
+        self.encoders[new_sid] = SnapshotEncoder(KEYFRAME_INTERVAL) # 新連線從關鍵幀開始
+        self.send_every.pop(old_sid, None)
+        for owners in (gs.bullets.owner_id, gs.skills.owners):
+            for i, owner in enumerate(owners):
+                if owner == old_sid: owners[i] = new_sid
+        return True
+
+    def set_shed_level(self, level):
+        """過載降級等級會影響模擬 (子彈上限、敵人數)，變動時寫進重播紀錄"""
+        if level == self.shed_level: return
+        self.shed_level = level
+        if self.recorder is not None: self.recorder.shed(self.gs.clock.tick, level)
+
+    def drain_scores(self):
+        """上次呼叫之後有變動的 [(名字, 分數)]"""
+        if not self.score_updates: return []
+        updates = list(self.score_updates.items())
+        self.score_updates.clear()
+        return updates
+
+    # --- 送出佇列的回饋 (outbound.py) ---
+    def resync(self, sid):
+        """該玩家有封包被丟掉，下一包改送關鍵幀"""
+        encoder = self.encoders.get(sid)
+        if encoder is not None:
+            encoder.reset()
+
+    def set_send_every(self, sid, every):
+        if every > 1:
+            self.send_every[sid] = every
+        else:
+            self.send_every.pop(sid, None)
+
+    def move(self, sid, data):
+        inp = self.inputs.get(sid)
+        if inp is not None and isinstance(data, dict):
+            # 排隊等 tick 開頭套用；最多留兩個 tick 的量，輸入洪水時丟掉最舊的
+            if len(inp.moves) >= 2 * MAX_MOVE_STEPS_PER_TICK:
+                inp.moves.popleft()
+            dx, dy = _move_axis(data.get('dx', 0)), _move_axis(data.get('dy', 0))
+            if dx is None or dy is None: return # 格式錯誤的輸入直接丟棄，不能進到 tick 裡
+            seq = data.get('seq')
+            inp.moves.append((dx, dy, seq if type(seq) is int else None)) # 舊版前端不帶序號
+
+    def shoot(self, sid):
+        inp = self.inputs.get(sid)
+        if inp is not None:
+            inp.shoot = True # 每個 tick 最多嘗試射擊一次，其餘直接丟棄
+
+    def use_skill(self, sid):
+        inp = self.inputs.get(sid)
+        if inp is not None:
+            inp.skill = True
+
+    def _drain_inputs(self, sfx_buffer):
+        players = self.gs.players
+        rec = self.recorder
+        for sid, inp in self.inputs.items():
+            p = players.get(sid)
+            if p is None: continue
+            # 移動步數有上限，輸入洪水不會讓玩家跑得更快；網路抖動擠在同一個 tick 的輸入留到下個 tick
+            moves = inp.moves
+            steps = [moves.popleft() for _ in range(min(len(moves), MAX_MOVE_STEPS_PER_TICK))]
+            if rec is not None and (steps or inp.shoot or inp.skill):
+                rec.input(p.nid, steps, inp.shoot, inp.skill)
+            speed = p.stats.speed
+            for dx, dy, seq in steps:
+                p.x = max(0, min(MAP_WIDTH - 30, p.x + dx * speed))
+                p.y = max(0, min(MAP_HEIGHT - 30, p.y + dy * speed))
+                # 回報實際套用的最後一個序號，還在排隊的輸入前端會繼續重放
+                if seq is not None: p.input_seq = seq
+            if inp.shoot:
+                self._fire(sid, p)
+            if inp.skill and self._cast_skill(sid, p):
+                sfx_buffer.append((SFX_CODES['skill_slime'], p.x + 15, p.y + 15))
+            inp.reset()
+
+    def _fire(self, sid, p):
+        gs = self.gs
+        tick = gs.clock.tick
+        
+        # 根據武器類型調整射速 (冷卻已在編譯時換算成 tick)
+        weapon = p.get_shoot_config()
+        if tick - p.last_shot_tick < weapon.cooldown_ticks: return
+        # 過載：場上子彈已達上限的玩家這次不射 (冷卻照常計算)
+        if self.shed_level >= CAP_BULLETS and gs.bullets.count_owner(sid) >= OVERLOAD_BULLETS_PER_OWNER: return
+        p.last_shot_tick = tick
+
+        # 產生子彈 (支援散射/特殊發射)
+        bullet = weapon.bullet
+        if weapon.random_arc: # 弧射 (隨機前方)
+            angle = math.radians(self.rng.uniform(*archetypes.ARC_RANGE)) # 上方隨機
+            gs.bullets.spawn(p.x + 15, p.y, sid, "player", bullet, math.cos(angle) * bullet.speed, math.sin(angle) * bullet.speed)
+        else: # 固定角度 (一般/散射)，方向向量已預先算好
+            for dx, dy in weapon.directions:
+                gs.bullets.spawn(p.x + 15, p.y, sid, "player", bullet, dx, dy)
+
+    def _cast_skill(self, sid, p):
+        """技能發動成功回傳 True"""
+        tick = self.gs.clock.tick
+        if p.charge >= 1 and (tick - p.last_skill_tick > 2 * SIM_FPS):
+            p.charge -= 1
+            p.last_skill_tick = tick
+            self.gs.skills.add(self.gs.next_id(), sid, p.skin, tick)
+            return True
+        return False
+
+    def ricochet_targets(self):
+        """彈射子彈轉向用的敵人中心點索引 (含 Boss)：每個 tick 第一次有彈射命中時才建，之後擊殺的由 _kill_enemy 移除"""
+        gs = self.gs
+        if self.target_index_tick != gs.clock.tick:
+            self.target_index_tick = gs.clock.tick
+            # 普通敵人直接取 EnemyStore 的陣列 (AI 階段之前與 Enemy 物件一致)
+            store = gs.enemy_store
+            n = store.n
+            half = store.size[:n] / 2
+            ids, xs, ys = [e.id for e in store.objs], store.x[:n] + half, store.y[:n] + half
+            boss = gs.enemies.get(gs.boss_id)
+            if boss is not None:
+                ids.append(boss.id)
+                xs = np.append(xs, boss.x + boss.size / 2)
+                ys = np.append(ys, boss.y + boss.size / 2)
+            self.target_index.build(ids, xs, ys)
+        return self.target_index
+
+    def _kill_enemy(self, enemy, killer):
+        """敵人死亡：掉寶、計分 (killer 為玩家 sid)、推進 Boss 階段並回收物件"""
+        gs, game_vars = self.gs, self.game_vars
+        gs.enemies.pop(enemy.id, None)
+        self.target_index.discard(enemy.id)
+        # 掉寶邏輯
+        if self.rng.random() < enemy.prob_drop:
+            self.spawn_item(enemy.x, enemy.y)
+
+        # 分數邏輯
+        p = gs.players.get(killer)
+        if p is not None:
+            p.score += enemy.score
+            if enemy.type == 999: # Boss Kill
+                p.score += enemy.arch.kill_bonus
+            self.score_updates[p.name] = p.score
+
+        # Boss 階段邏輯
+        if enemy.type == 3: # Elite
+            if game_vars["boss_phase"] == "collecting":
+                game_vars["elite_kill_count"] += 1
+                if game_vars["elite_kill_count"] >= game_vars["target_kills"]:
+                    game_vars["boss_phase"] = "warning"
+                    game_vars["phase_start_tick"] = gs.clock.tick
+                    gs.warning_active = True
+        elif enemy.type == 999:
+            game_vars["boss_phase"] = "collecting"
+            game_vars["elite_kill_count"] = 0
+            gs.warning_active = False
+        # 網格中殘留的 (eid, enemy) 會被存活檢查略過，下個 tick 之前不會被重用
+        gs.enemy_store.remove(enemy)
+        gs.enemy_pool.release(enemy)
+
+class RoomManager:
+    """依容量把玩家分配到房間，房間清空時移除；斷線的玩家在 RESUME_GRACE 內可帶 token 接回原本的角色"""
+    def __init__(self, capacity=ROOM_CAPACITY, room_factory=None):
+        self.capacity = capacity
+        self.room_factory = room_factory or Room # workers.WorkerPool.create_room 會回傳遠端房間代理
+        self.rooms = {}
+        self.sid_room = {}
+        self.tokens = {} # 重連 token -> sid
+        self.orphans = {} # 斷線中的 sid -> 保留期限 (time.time())
+        self._room_ids = itertools.count(1)
+
+    def get(self, sid):
+        return self.sid_room.get(sid)
+
+    def assign(self, sid, token=None):
+        """回傳 (room, 是否新建)；優先塞進人數最多但未滿的房間"""
+        room = self.sid_room.get(sid)
+        if room is not None:
+            return room, False
+        created = False
+        open_rooms = [r for r in self.rooms.values() if r.player_count < self.capacity]
+        if open_rooms:
+            room = max(open_rooms, key=lambda r: r.player_count)
+        else:
+            room = self.room_factory(f"room_{next(self._room_ids)}")
+            self.rooms[room.id] = room
+            created = True
+        self.sid_room[sid] = room
+        if token is not None: self.tokens[token] = sid
+        return room, created
+
+    def leave(self, sid):
+        """回傳 (room, 是否已清空並移除)"""
+        room = self.sid_room.pop(sid, None)
+        if room is None:
+            return None, False
+        self.orphans.pop(sid, None)
+        for token in [t for t, s in self.tokens.items() if s == sid]:
+            del self.tokens[token]
+        room.leave(sid)
+        if room.player_count == 0:
+            del self.rooms[room.id]
+            return room, True
+        return room, False
+
+    # --- 斷線重連 ---
+    def orphan(self, sid, deadline):
+        """連線中斷但保留角色到 deadline；沒有 token 的玩家無法接回，回傳 False (呼叫端直接 leave)"""
+        if sid not in self.sid_room or sid not in self.tokens.values():
+            return False
+        self.orphans[sid] = deadline
+        self.sid_room[sid].suspend(sid)
+        return True
+
+    def resume(self, token, new_sid):
+        """帶 token 重連：把斷線中的角色改綁到新的 sid，回傳房間；token 無效或已過期回傳 None"""
+        old_sid = self.tokens.get(token)
+        if old_sid is None or old_sid not in self.orphans:
+            return None
+        room = self.sid_room.pop(old_sid)
+        del self.orphans[old_sid]
+        room.rebind(old_sid, new_sid)
+        self.sid_room[new_sid] = room
+        self.tokens[token] = new_sid
+        return room
+
+    def expired(self, now):
+        return [sid for sid, deadline in self.orphans.items() if deadline <= now]
+
+    def adopt(self, room, players, deadline):
+        """接手還原的房間 (roomstate.py)；players 為 [[token, sid, name]]，全部視為斷線中，等待重連"""
+        self.rooms[room.id] = room
+        for token, sid, _ in players:
+            self.sid_room[sid] = room
+            if token is not None:
+                self.tokens[token] = sid
+            self.orphans[sid] = deadline
+        # 之後新建的房間編號不與還原的房間重複
+        taken = max([int(r.rsplit("_", 1)[1]) for r in self.rooms if r.rsplit("_", 1)[1].isdigit()] or [0])
+        self._room_ids = itertools.count(max(taken + 1, next(self._room_ids)))
+
+    def release(self, room):
+        """房間交給其他行程 (不呼叫 room.leave，模擬狀態已經交出)；回傳原本在房間內的 sid"""
+        self.rooms.pop(room.id, None)
+        sids = [sid for sid, r in self.sid_room.items() if r is room]
+        for sid in sids:
+            del self.sid_room[sid]
+            self.orphans.pop(sid, None)
+        for token in [t for t, s in self.tokens.items() if s in sids]:
+            del self.tokens[token]
+        return sids
@@ -0,0 +1,169 @@
+# roomstate.py
+# 房間完整狀態的版本化二進位快照，用於部署/當機後還原對戰 (含 Boss 階段計時、武器等級、充能)。
+#   u32 magic "CWRS" | u8 VERSION | u32 meta 長度 | meta (JSON) | payload (pickle protocol 5)
+#   meta：{"room_id", "seed", "tick", "players": [[token, sid, name], ...]}，前端行程不必解開模擬狀態就能建立房間代理
+#   payload：Room.sim_state() + 房間參數；只在同一份部署的行程之間傳遞 (pickle 不可用於不受信任的來源)
+# 取得快照必須在 tick 之間同步進行 (pickle 約數毫秒)；寫檔在背景執行緒。
+# 搭配 server.py 的 drain：定期存檔到 ROOM_STATE_DIR，或透過 HANDOFF_SOCKET 直接交給接手的行程
+import asyncio
+import json
+import os
+import pickle
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ROOM_CHECKPOINT_EVERY
+from rooms import Room
+
+MAGIC = b"CWRS"
+VERSION = 3 # sim_state 內容或物件欄位改變時加一，舊版本的檔案直接拒絕
+SUFFIX = ".cwroom"
+_HEADER = struct.Struct("<4sBI")
+_LEN = struct.Struct("<I")
+
+class RoomStateError(ValueError):
+    """不是房間快照或版本不符"""
+
+def dump_room(room):
+    """房間目前的完整狀態 (在 tick 之間呼叫)"""
+    gs = room.gs
+    meta = json.dumps({
+        "room_id": room.id, "seed": room.seed, "tick": gs.clock.tick,
+        "players": [[room.sessions.get(sid), sid, p.name] for sid, p in gs.players.items()],
+    }).encode("utf-8")
+    payload = pickle.dumps({
+        "sim": room.sim_state(), "sessions": room.sessions,
+        "max_enemies": room.max_enemies, "enemy_spawns_per_tick": room.enemy_spawns_per_tick,
+    }, 5)
+    room.last_checkpoint_tick = gs.clock.tick
+    return _HEADER.pack(MAGIC, VERSION, len(meta)) + meta + payload
+
+def read_meta(blob):
+    if len(blob) < _HEADER.size:
+        raise RoomStateError("room state: too short")
+    magic, version, n = _HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise RoomStateError("room state: not a room snapshot")
+    if version != VERSION:
+        raise RoomStateError(f"room state: unsupported version {version}")
+    return json.loads(blob[_HEADER.size:_HEADER.size + n])
+
+def load_room(blob):
+    """由 dump_room 的結果重建 Room；玩家都視為斷線中 (沒有 encoder)，重連 rebind 後從關鍵幀開始"""
+    meta = read_meta(blob)
+    state = pickle.loads(blob[_HEADER.size + _HEADER.unpack_from(blob)[2]:])
+    room = Room(meta["room_id"], seed=meta["seed"])
+    room.load_sim_state(state["sim"])
+    room.encoders.clear()
+    room.sessions = state["sessions"]
+    room.max_enemies = state["max_enemies"]
+    room.enemy_spawns_per_tick = state["enemy_spawns_per_tick"]
+    room.last_checkpoint_tick = room.gs.clock.tick
+    return room
+
+# --- 本機存檔 ---
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="roomstate-writer") # 依序寫入，同一間房不會交錯
+
+def _path(directory, room_id):
+    return os.path.join(directory, room_id + SUFFIX)
+
+def save(directory, room_id, blob):
+    """寫到暫存檔再改名，當機時不會留下寫一半的快照"""
+    os.makedirs(directory, exist_ok=True)
+    path = _path(directory, room_id)
+    with open(path + ".tmp", "wb") as f:
+        f.write(blob)
+    os.replace(path + ".tmp", path)
+
+def checkpoint(room, directory, force=False):
+    """距離上次存檔滿 ROOM_CHECKPOINT_EVERY 個 tick 時取快照，寫檔交給背景執行緒"""
+    if not directory: return
+    if not force and room.gs.clock.tick - room.last_checkpoint_tick < ROOM_CHECKPOINT_EVERY: return
+    _writer.submit(save, directory, room.id, dump_room(room))
+
+def discard(directory, room_id):
+    """房間正常結束 (玩家都離開) 時刪除存檔"""
+    if directory:
+        _writer.submit(_remove, _path(directory, room_id))
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def flush():
+    """等背景寫入全部完成 (關閉前呼叫)"""
+    _writer.submit(lambda: None).result()
+
+def load(directory, room_id):
+    """讀回單一房間的存檔 (meta, blob)；沒有存檔或無法使用時回傳 None"""
+    if not directory: return None
+    try:
+        with open(_path(directory, room_id), "rb") as f:
+            blob = f.read()
+        return read_meta(blob), blob
+    except FileNotFoundError:
+        return None
+    except (RoomStateError, ValueError) as e:
+        print(f"[roomstate] skipping {room_id}: {e}")
+        return None
+
+def load_dir(directory):
+    """讀回目錄中所有可用的快照 [(meta, blob)]；損壞或版本不符的檔案略過並印出原因"""
+    found = []
+    if not directory or not os.path.isdir(directory):
+        return found
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SUFFIX): continue
+        with open(os.path.join(directory, name), "rb") as f:
+            blob = f.read()
+        try:
+            found.append((read_meta(blob), blob))
+        except (RoomStateError, ValueError) as e:
+            print(f"[roomstate] skipping {name}: {e}")
+    return found
+
+# --- 行程間交接 (Unix socket) ---
+# 新行程連上舊行程的 HANDOFF_SOCKET 送出 DRAIN，舊行程逐間取快照送出 (u32 長度 + 快照，長度 0 結束)，
+# 並停止模擬、讓玩家斷線重連到新行程
+DRAIN_REQUEST = b"DRAIN\n"
+
+async def pull(path, timeout=5.0):
+    """向舊行程要所有房間；沒有舊行程 (socket 不存在/無人監聽) 時回傳 []"""
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(path), timeout)
+    except (FileNotFoundError, ConnectionRefusedError, asyncio.TimeoutError):
+        return []
+    found = []
+    try:
+        writer.write(DRAIN_REQUEST)
+        await writer.drain()
+        while True:
+            (n,) = _LEN.unpack(await asyncio.wait_for(reader.readexactly(_LEN.size), timeout))
+            if n == 0: break
+            blob = await asyncio.wait_for(reader.readexactly(n), timeout)
+            found.append((read_meta(blob), blob))
+    finally:
+        writer.close()
+    return found
+
+async def serve(path, drain):
+    """監聽交接 socket；drain(send) 為 coroutine，逐間房間呼叫 await send(blob)"""
+    try:
+        os.remove(path) # 舊行程留下的 socket 檔 (已交接完或已結束)
+    except FileNotFoundError:
+        pass
+
+    async def handle(reader, writer):
+        try:
+            if await reader.readline() != DRAIN_REQUEST: return
+            async def send(blob):
+                writer.write(_LEN.pack(len(blob)) + blob)
+                await writer.drain()
+            await drain(send)
+            writer.write(_LEN.pack(0))
+            await writer.drain()
+        finally:
+            writer.close()
+    return await asyncio.start_unix_server(handle, path)
@@ -1,16 +1,26 @@
-# 4.1 server.py 
+# 4.1 server.py
 import socketio
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response, FileResponse
 import asyncio
-import random
+import gc
+import secrets
 import time
-import math
+import traceback
 
 # 引入模組
 from config import *
-from utils import compress_state, check_collision
-from game_objects import Player, Enemy, Bullet, Item
+from rooms import Room, RoomManager, LoopTimer
+from workers import WorkerPool
+from metrics import METRICS, SamplingProfiler, render as render_metrics
+from frontend_build import AssetStore, build_bundle
+from outbound import Outbox
+from overload import OverloadController
+from leaderboard import Leaderboard, ScoreStore
+import archetypes
+import replay
+import roomstate
 
 # --- 初始化 ---
 sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
@@ -18,314 +28,260 @@ app = FastAPI()
 sio_app = socketio.ASGIApp(sio, app)
 
 # --- 全域狀態 ---
-game_vars = {
-    "boss_phase": "initial", # 初始狀態
-    "phase_start_time": 0,
-    "elite_kill_count": 0,
-    "target_kills": 5,        # 測試用設 5，正式可改回 10
-    "boss_score_threshold": 500 # 分數達到 500 啟動第一次魔王
-}
-
-# 使用物件管理 State
-class GameState:
-    def __init__(self):
-        self.players = {}
-        self.enemies = {}
-        self.bullets = []
-        self.items = []
-        self.skill_objects = []
-        self.warning_active = False
-
-gs = GameState()
-
-# --- Helper: 穩定 FPS ---
-class LoopTimer:
-    def __init__(self, fps):
-        self.frame_duration = 1.0 / fps
-        self.next_tick = time.time()
-    async def tick(self):
-        now = time.time()
-        sleep_time = self.next_tick - now
-        if sleep_time > 0:
-            await asyncio.sleep(sleep_time)
-            self.next_tick += self.frame_duration
+# 每個房間各自持有 GameState 與 Boss 階段狀態 (見 rooms.py)
+# ROOM_WORKERS > 0 時模擬在 worker 行程執行，這裡只轉送輸入與封包 (見 workers.py)
+metrics = METRICS if METRICS_ENABLED else None
+
+async def transport_flushed(sid):
+    """等 engine.io 把這個 client 先前排入的封包都交給傳輸層 (慢連線會卡在這裡，只卡住該 client 的 sender)"""
+    socket = sio.eio.sockets.get(sio.manager.eio_sid_from_sid(sid, "/"))
+    if socket is not None:
+        await socket.queue.join()
+
+def room_control(sid, op, *args):
+    room = rooms.get(sid)
+    if room is not None:
+        getattr(room, op)(sid, *args)
+
+# 每位玩家各自的送出佇列：遊戲迴圈只排入封包，不等網路 (見 outbound.py)
+outbox = Outbox(sio.emit, flushed=transport_flushed, control=room_control, evict=sio.disconnect, metrics=metrics)
+
+# 全服排行榜：房間回報分數變動，這裡維護前 K 名並定期只廣播變動的名次
+leaderboard = Leaderboard(LEADERBOARD_SIZE, ScoreStore(LEADERBOARD_DB, LEADERBOARD_FLUSH_INTERVAL) if LEADERBOARD_DB else None)
+
+def submit_scores(scores):
+    for name, score in scores:
+        leaderboard.submit(name, score)
+
+def drop_rooms(lost):
+    """worker 一直當掉而被放棄的房間：移除並讓其中的玩家斷線 (前端自動重連，token 已失效，會以新角色分到其他房間)"""
+    for room in lost:
+        METRICS.forget_room(room.id)
+        for sid in rooms.release(room):
+            asyncio.create_task(sio.disconnect(sid))
+
+pool = WorkerPool(ROOM_WORKERS, outbox.push, metrics=metrics, on_scores=submit_scores,
+                  on_rooms_lost=drop_rooms) if ROOM_WORKERS > 0 else None
+rooms = RoomManager(room_factory=pool.create_room if pool else lambda room_id: replay.attach(Room(room_id)))
+profiler = SamplingProfiler()
+assets = AssetStore()
+# 所有房間共用事件迴圈，過載時一起降級 (見 overload.py)；worker 模式由各 worker 自行判斷
+overload = OverloadController(metrics)
+draining = False # 房間已交接給新行程，不再接受加入
+
+# --- 房間遊戲迴圈 ---
+def tick_room(room, steps):
+    room.set_shed_level(overload.level)
+    for _ in range(steps):
+        room.update()
+    roomstate.checkpoint(room, ROOM_STATE_DIR) # 取快照在 tick 之間，寫檔在背景執行緒
+    if room.snapshot_due():
+        packets = room.snapshot()
+        sent_at = time.perf_counter()
+        submit_scores(room.drain_scores())
+
+        # 狀態封包依玩家視野各自編碼 (見 interest.py)；音效事件已包含在封包內
+        # 只排入各玩家的送出佇列，tick 不等待網路
+        for sid, packet in packets:
+            outbox.push(sid, packet)
+        if metrics is not None:
+            nbytes = sum(len(packet) for _, packet in packets)
+            metrics.emitted(time.perf_counter() - sent_at, nbytes)
+            metrics.observe_room(room)
+
+async def room_loop(room):
+    timer = LoopTimer(fps=SIM_FPS, metrics=metrics)
+    room.profiler = metrics
+    while True:
+        await timer.wait()
+        started = time.perf_counter()
+        # 落後時一次追趕多個固定步長的 tick；快照依 SNAPSHOT_RATE 送出，音效累積到下一個快照
+        steps = timer.consume()
+        try:
+            tick_room(room, steps)
+        except Exception:
+            # 單一 tick 出錯只記錄下來，不能讓整個房間的迴圈結束 (玩家會全部卡住)
+            print(f"[room_loop] {room.id}: tick failed")
+            traceback.print_exc()
+        overload.observe(time.perf_counter() - started, steps)
+
+# --- 靜態資源 (同步 handler，壓縮在 threadpool 執行不卡遊戲迴圈) ---
+@app.get("/assets/{path:path}")
+def asset_endpoint(path: str, request: Request, v: str = None):
+    found = assets.lookup(path, v, request.headers.get("if-none-match"), request.headers.get("accept-encoding", ""))
+    if found is None:
+        return Response(status_code=404)
+    status, headers, body = found
+    if isinstance(body, str):
+        return FileResponse(body, headers=headers)
+    return Response(body, status_code=status, headers=headers)
+
+@app.get("/bundle/{name}")
+def bundle_endpoint(name: str):
+    bundle = build_bundle()
+    for kind, media_type in (("js", "application/javascript"), ("css", "text/css")):
+        if name == bundle[f"{kind}_name"]:
+            return Response(bundle[kind], media_type=media_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    return Response(status_code=404)
+
+# --- 量測 ---
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    sources = [({}, METRICS.export())]
+    if pool:
+        sources += pool.metric_sources()
+    return render_metrics(sources)
+
+if METRICS_PROFILE_ENDPOINT: # 會改變伺服器狀態且加重負載，預設不註冊
+    @app.get("/metrics/profile", response_class=PlainTextResponse)
+    async def profile_endpoint():
+        """目前累積的 collapsed stacks"""
+        return profiler.collapsed()
+
+    @app.post("/metrics/profile", response_class=PlainTextResponse)
+    async def profile_toggle_endpoint(enable: int):
+        """enable=1/0 開關取樣 profiler (用 POST，爬蟲或預先載入連結不會誤觸)"""
+        profiler.start() if enable else profiler.stop()
+        return f"profiler {'running' if profiler.running else 'stopped'}\n"
+
+async def leaderboard_broadcaster():
+    while True:
+        await asyncio.sleep(LEADERBOARD_BROADCAST_INTERVAL)
+        delta = leaderboard.delta()
+        if delta is not None:
+            await sio.emit('leaderboard', delta)
+
+async def orphan_reaper():
+    """斷線後超過 RESUME_GRACE 沒有重連的玩家正式離開"""
+    while True:
+        await asyncio.sleep(1.0)
+        for sid in rooms.expired(time.time()):
+            leave_room(sid)
+
+# --- 房間還原與部署交接 (見 roomstate.py) ---
+def adopt_room(meta, blob):
+    """接手還原的房間：原本的玩家都視為斷線中，帶 token 重連即接回角色"""
+    if not meta["players"]: return
+    if pool:
+        room = pool.restore_room(meta, blob)
+    else:
+        room = replay.attach(roomstate.load_room(blob))
+        room.task = asyncio.create_task(room_loop(room))
+    rooms.adopt(room, meta["players"], time.time() + RESUME_GRACE)
+    print(f"[roomstate] restored {room.id} at tick {meta['tick']} ({len(meta['players'])} players)")
+
+async def hand_off_rooms(send):
+    """新行程要求交接：逐間取快照送出並停止模擬，再讓玩家斷線 (前端帶 token 重連到新行程)"""
+    global draining
+    draining = True
+    for room in list(rooms.rooms.values()):
+        if pool:
+            blob = await room.hand_off()
         else:
-            self.next_tick = now + self.frame_duration
-
-def spawn_boss():
-    eid = "THE_BOSS"
-    boss = Enemy(999)
-    boss.x, boss.y = 150, -300
-    gs.enemies[eid] = boss
-    game_vars["boss_phase"] = "boss_active"
-    gs.warning_active = False
-
-def spawn_item(x, y, forced_type=None):
-    types = ["spread", "ricochet", "arc"]
-    itype = forced_type if forced_type else random.choice(types)
-    gs.items.append(Item(x, y, itype))
-
-# --- 主遊戲迴圈 ---
-async def game_loop():
-    timer = LoopTimer(fps=30)
-    boss_shoot_toggle = 0
-    
+            blob = roomstate.dump_room(room) # 與 room_loop 同一個事件迴圈，中間不會有 tick
+            room.close()
+        sids = rooms.release(room)
+        METRICS.forget_room(room.id)
+        if blob is not None:
+            await send(blob)
+        for sid in sids:
+            await sio.disconnect(sid)
+
+async def config_watcher():
+    """CONFIG_HOT_RELOAD 開啟時定期重新編譯設定表 (worker 行程各自檢查)"""
     while True:
-        curr = time.time()
-        sfx_buffer = []
-
-        # 1. 玩家/技能 邏輯 (簡化: 這裡省略 Skill Object 的詳細類別化，保留原結構但用新邏輯)
-        # (此處為保持代碼長度適中，重點放在道具與射擊重構)
-        active_skills = []
-        for obj in gs.skill_objects:
-             # ... 保留原本技能邏輯，或者也可以移到 game_objects ...
-             if curr - obj["start_time"] > obj["duration"]: continue
-             # (技能移動與判定邏輯略，建議也封裝)
-             active_skills.append(obj)
-        gs.skill_objects = active_skills
-
-        # 2. 敵人生成與 Boss 狀態機
-        
-        # 取得當前最高分
-        max_score = max([p.score for p in gs.players.values()] or [0])
-
-        # --- 狀態轉換邏輯 ---
-        if game_vars["boss_phase"] == "initial":
-            # 條件 A: 分數達標 OR 條件 B: 已經殺了一些小怪 (這裡用分數判定)
-            if max_score >= game_vars["boss_score_threshold"]:
-                game_vars["boss_phase"] = "countdown"
-                game_vars["phase_start_time"] = curr
-
-        elif game_vars["boss_phase"] == "countdown":
-            # 倒數 25 秒準備進入警告
-            if curr - game_vars["phase_start_time"] > 25:
-                game_vars["boss_phase"] = "warning"
-                game_vars["phase_start_time"] = curr
-                gs.warning_active = True
-                sfx_buffer.append({'type': 'boss_coming'})
-
-        elif game_vars["boss_phase"] == "warning":
-            # 警告 5 秒後正式出生
-            if curr - game_vars["phase_start_time"] > 5:
-                spawn_boss()
-                sfx_buffer.append({'type': 'boss_coming'})
-
-        # --- 敵人生成控制 ---
-        # 只有在非 Boss 戰期間才生成普通小怪
-        if len(gs.enemies) < MAX_ENEMIES and game_vars["boss_phase"] != "boss_active":
-            rand_val = random.random()
-            # 根據狀態調整精英怪出現機率
-            v_type = 3 if rand_val < 0.15 else (2 if rand_val < 0.4 else 1)
-            enemy = Enemy(v_type)
-            gs.enemies[enemy.id] = enemy
-
-        # 3. 道具移動
-        gs.items = [i for i in gs.items if i.update()]
-        # 玩家吃道具
-        for pid, player in gs.players.items():
-            for item in gs.items[:]:
-                if check_collision(player, item):
-                    player.apply_item(item.item_type)
-                    gs.items.remove(item)
-                    sfx_buffer.append({'type': 'powerup'}) # 假設前端有這音效
-
-        # 4. 子彈移動與碰撞 (核心重構)
-        active_bullets = []
-        for b in gs.bullets:
-            still_alive = b.update()
-            if not still_alive: continue
-            
-            hit = False
-            # A. 玩家子彈打怪
-            if b.owner_type == 'player':
-                for eid, enemy in list(gs.enemies.items()):
-                    if enemy in b.ignore_list: continue # 彈射忽略
-
-                    if check_collision(b, enemy):
-                        enemy.hp -= b.damage
-                        hit = True
-                        sfx_buffer.append({'type': 'boss_hitted' if enemy.type == 999 else 'enemy_hitted'})
-                        
-                        # 處理彈射
-                        bullet_survives = b.handle_hit(enemy)
-                        
-                        # 處理玩家充能
-                        if b.owner_id in gs.players:
-                            p = gs.players[b.owner_id]
-                            p.hit_accumulated += 1
-                            if p.hit_accumulated >= 20:
-                                p.hit_accumulated = 0
-                                p.charge = min(3, p.charge + 1)
-
-                        # 怪物死亡
-                        if enemy.hp <= 0:
-                            if eid in gs.enemies: del gs.enemies[eid]
-                            # 掉寶邏輯
-                            if random.random() < enemy.prob_drop:
-                                spawn_item(enemy.x, enemy.y)
-                                
-                            # 分數邏輯
-                            if b.owner_id in gs.players:
-                                gs.players[b.owner_id].score += enemy.score
-                                if enemy.type == 999: # Boss Kill
-                                    gs.players[b.owner_id].score += VIRUS_CONFIG[999]["kill_bonus"]
-
-                            # Boss 階段邏輯
-                            if enemy.type == 3: # Elite
-                                if game_vars["boss_phase"] == "collecting":
-                                    game_vars["elite_kill_count"] += 1
-                                    if game_vars["elite_kill_count"] >= game_vars["target_kills"]:
-                                        game_vars["boss_phase"] = "warning"
-                                        game_vars["phase_start_time"] = time.time()
-                                        gs.warning_active = True
-                            elif enemy.type == 999:
-                                game_vars["boss_phase"] = "collecting"
-                                game_vars["elite_kill_count"] = 0
-                                gs.warning_active = False
-
-                        if not bullet_survives: break # 子彈消失
-
-            # B. 怪物子彈打人
-            else:
-                for pid, player in gs.players.items():
-                    if player.is_invincible(): continue
-                    
-                    if check_collision(b, player, r2_override=15):
-                        is_dead = player.take_damage(b.damage)
-                        hit = True
-                        sfx_buffer.append({'type': 'character_hitted'})
-                        if is_dead:
-                             # 重生已在 take_damage 處理
-                             pass 
-                        break
-
-            if not hit or (hit and b.b_type == "bounce" and b.bounce_left >= 0):
-                if not (hit and not b.handle_hit(None)): # 如果命中了且不是反彈子彈，就不要加入 active
-                    active_bullets.append(b)
-
-        gs.bullets = active_bullets
-
-        # 5. 怪物 AI 與 射擊
-        for eid, enemy in list(gs.enemies.items()):
-            if enemy.type == 999: # Boss Movement
-                enemy.move_timer += 1
-                if enemy.move_timer > 60:
-                    enemy.dx = random.choice([-2, -1, 0, 1, 2])
-                    enemy.dy = random.choice([-1, 0, 1])
-                    enemy.move_timer = 0
-                enemy.x = max(0, min(MAP_WIDTH - enemy.size, enemy.x + enemy.dx))
-                enemy.y = max(0, min(MAP_HEIGHT - enemy.size, enemy.y + enemy.dy))
-                
-                # Boss Fire
-                is_enraged = (enemy.hp < enemy.max_hp * 0.5)
-                fire_rate = 0.05 if is_enraged else 0.03
-                if random.random() < fire_rate:
-                    cx, cy = enemy.x + enemy.size/2, enemy.y + enemy.size/2
-                    configs = [(0, 10), (0, -10), (10, 0), (-10, 0)] if is_enraged else (
-                        [(0, 10), (0, -10)] if (boss_shoot_toggle := boss_shoot_toggle + 1) % 2 == 0 else [(10, 0), (-10, 0)])
-                    
-                    for dx, dy in configs:
-                        # 這裡 Boss 子彈也可以用 Bullet Class，但為了簡化先手動塞
-                        b = Bullet(cx, cy, "boss", "boss", {"damage":1, "speed":0, "size":10})
-                        b.dx, b.dy = dx, dy # 覆蓋向量
-                        gs.bullets.append(b)
-                    sfx_buffer.append({'type': 'boss_shot'})
-            
-            else:
-                enemy.update() # 普通怪物移動
-                # 普通怪物撞人
-                for pid, player in gs.players.items():
-                    if player.is_invincible(): continue
-                    if check_collision(player, enemy, r1_override=15):
-                        if random.random() < 0.2:
-                            player.take_damage(1)
-                            sfx_buffer.append({'type': 'character_hitted'})
-                
-                # 普通怪物射擊
-                atk = VIRUS_CONFIG[enemy.type]['attack']
-                if random.random() < atk['fire_rate']:
-                    cx, cy = enemy.x + enemy.size/2, enemy.y + enemy.size
-                    bullets_pos = [{"x": cx-15, "y": cy}, {"x": cx+15, "y": cy}] if atk['mode'] == 'double' else [{"x": cx, "y": cy}]
-                    for pos in bullets_pos:
-                        b = Bullet(pos['x'], pos['y'], eid, "enemy", {"damage": atk['damage'], "speed": atk['bullet_speed']})
-                        # 敵人子彈向下
-                        b.dx, b.dy = 0, atk['bullet_speed']
-                        gs.bullets.append(b)
-
-        # 6. 發送狀態
-        state_data = compress_state({
-            "players": gs.players, "enemies": gs.enemies, "bullets": gs.bullets, 
-            "items": gs.items, "skill_objects": gs.skill_objects, "warning_active": gs.warning_active
-        })
-        emit_tasks = [sio.emit('state_update', state_data)]
-        
-        if sfx_buffer:
-            unique_sfx = list({v['type']: v for v in sfx_buffer}.values())
-            for sfx in unique_sfx:
-                emit_tasks.append(sio.emit('sfx', sfx))
-
-        await asyncio.gather(*emit_tasks)
-        await timer.tick()
+        await asyncio.sleep(CONFIG_RELOAD_INTERVAL)
+        archetypes.log_reload("server")
 
 # --- 事件處理 ---
 @app.on_event("startup")
-async def startup_event(): asyncio.create_task(game_loop())
+async def startup_event():
+    if pool: pool.start()
+    # 還原房間：優先向舊行程交接 (最新狀態)，其餘從 ROOM_STATE_DIR 的存檔讀回
+    if pool and HANDOFF_SOCKET: await pool.wait_ready()
+    restored = await roomstate.pull(HANDOFF_SOCKET) if HANDOFF_SOCKET else []
+    handed = {meta["room_id"] for meta, _ in restored}
+    restored += [(meta, blob) for meta, blob in roomstate.load_dir(ROOM_STATE_DIR) if meta["room_id"] not in handed]
+    for meta, blob in restored:
+        adopt_room(meta, blob)
+    if HANDOFF_SOCKET: app.state.handoff = await roomstate.serve(HANDOFF_SOCKET, hand_off_rooms)
+    app.state.orphan_reaper = asyncio.create_task(orphan_reaper())
+    if METRICS_PROFILER: profiler.start()
+    if CONFIG_HOT_RELOAD: app.state.config_watcher = asyncio.create_task(config_watcher())
+    app.state.leaderboard_broadcaster = asyncio.create_task(leaderboard_broadcaster())
+    asyncio.get_running_loop().run_in_executor(None, assets.precompress)
+    # 啟動時載入的模組/設定表移到永久世代，之後的完整 GC 不必再掃描它們
+    gc.freeze()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if pool: pool.stop() # worker 停機前自行存檔
+    for room in list(rooms.rooms.values()):
+        if pool is None: roomstate.checkpoint(room, ROOM_STATE_DIR, force=True)
+        room.close()
+    roomstate.flush()
+    replay.shutdown()
+    leaderboard.close()
 
 @sio.event
 async def join_game(sid, data):
-    name = data.get("name", "Cell")[:8]
-    skin_type = random.randint(1, 3)
-    gs.players[sid] = Player(sid, name, skin_type)
+    if draining:
+        await sio.disconnect(sid) # 讓前端重連到接手的新行程
+        return
+    overload.poll() # 房間都清空後沒有遊戲迴圈更新等級
+    if not (isinstance(data.get("token"), str) and data["token"] in rooms.tokens) and (
+            pool.rejecting() if pool else overload.rejecting):
+        # 過載時不收新玩家 (帶 token 重連的照常接回)
+        if metrics is not None: metrics.counters["joins_rejected"] += 1
+        await sio.emit('server_busy', {"retry_after": OVERLOAD_RECOVER_WINDOWS * OVERLOAD_WINDOW}, to=sid)
+        return
+    # 帶 token 重連 (斷線或部署交接) 時接回原本的角色，否則當作新玩家
+    token = data.get("token")
+    room = rooms.resume(token, sid) if isinstance(token, str) else None
+    if room is None:
+        name = data.get("name", "Cell")[:8]
+        token = secrets.token_urlsafe(16)
+        room, created = rooms.assign(sid, token)
+        room.join(sid, name, token)
+        leaderboard.joined(name)
+        if created and pool is None:
+            room.task = asyncio.create_task(room_loop(room))
+    await sio.enter_room(sid, room.id)
+    await sio.emit('session', {"token": token}, to=sid)
+    await sio.emit('leaderboard', leaderboard.full(), to=sid)
+
+def leave_room(sid):
+    room, emptied = rooms.leave(sid)
+    if emptied:
+        room.close()
+        METRICS.forget_room(room.id)
+        if pool is None: roomstate.discard(ROOM_STATE_DIR, room.id) # worker 模式由 worker 刪除
 
 @sio.event
 async def disconnect(sid):
-    if sid in gs.players: del gs.players[sid]
+    outbox.forget(sid)
+    # 保留角色一段時間等待重連 (由 orphan_reaper 清除)
+    if RESUME_GRACE > 0 and rooms.orphan(sid, time.time() + RESUME_GRACE):
+        return
+    leave_room(sid)
 
 @sio.event
 async def move(sid, data):
-    if sid in gs.players:
-        p = gs.players[sid]
-        p.x = max(0, min(MAP_WIDTH - 30, p.x + data.get('dx', 0) * p.stats['speed']))
-        p.y = max(0, min(MAP_HEIGHT - 30, p.y + data.get('dy', 0) * p.stats['speed']))
+    room = rooms.get(sid)
+    if room is not None:
+        room.move(sid, data)
 
 @sio.event
 async def shoot(sid):
-    if sid in gs.players:
-        p = gs.players[sid]
-        curr = time.time()
-        
-        # 根據武器類型調整射速
-        w_conf = p.get_shoot_config()
-        cooldown = FIRE_COOLDOWN / w_conf.get("fire_rate_mult", 1.0)
-        
-        if curr - p.last_shot_time < cooldown: return
-        p.last_shot_time = curr
-
-        # 產生子彈 (支援散射/特殊發射)
-        angles = w_conf["angles"]
-        if isinstance(angles, list): # 固定角度 (一般/散射)
-            for angle in angles:
-                b = Bullet(p.x + 15, p.y, sid, "player", w_conf, angle_deg=angle)
-                gs.bullets.append(b)
-        elif angles == "random_45_135": # 弧射 (隨機前方)
-            angle = random.uniform(-135, -45) # 上方隨機
-            b = Bullet(p.x + 15, p.y, sid, "player", w_conf, angle_deg=angle)
-            gs.bullets.append(b)
+    room = rooms.get(sid)
+    if room is not None:
+        room.shoot(sid)
 
 @sio.event
 async def use_skill(sid):
-    # 技能邏輯暫時保持原樣，因為需求主要在一般子彈
-    if sid in gs.players:
-        p = gs.players[sid]
-        curr = time.time()
-        if p.charge >= 1 and (curr - p.last_skill_time > 2):
-            p.charge -= 1
-            p.last_skill_time = curr
-            gs.skill_objects.append({
-                "owner_id": sid, "x": p.x, "y": p.y, "size": 30, "damage": 1,
-                "durability": 10, "duration": 10, "start_time": curr, "angle_offset": 0, "skin": p.skin
-            })
-            await sio.emit('sfx', {'type': 'skill_slime'})
+    room = rooms.get(sid)
+    if room is not None:
+        room.use_skill(sid)
 
 if __name__ == "__main__":
     uvicorn.run(socketio.ASGIApp(sio, app), host="0.0.0.0", port=8000)
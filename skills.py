@@ -0,0 +1,117 @@
+# skills.py
+# 技能物件 (繞行護盾) 的 Structure-of-Arrays，同 bullets.py / enemies.py：全部技能在一次批次步驟內繞著施放者旋轉、
+# 判斷到期與耐久，刪除時 swap-remove 壓實。碰撞走與子彈相同的網格 broadphase：
+# 撞怪用 enemy_grid 查附近的敵人；擋敵方子彈則把技能登記進網格，由 BulletStore.near 一次篩出候選子彈
+import math
+import numpy as np
+from config import (SKILL_DURATION_TICKS, SKILL_DURABILITY, SKILL_DAMAGE, SKILL_HIT_INTERVAL,
+                    SKILL_ORBIT_RADIUS, SKILL_ORBIT_SPEED)
+
+SKILL_SIZE = 30
+MAX_SKILLS_PER_PLAYER = 3 # 同一位玩家的技能平均分布在圓周上 (與充能上限相同)
+PLAYER_HALF = 15 # 玩家中心相對於左上角的偏移
+
+class SkillRef:
+    """單個技能的輕量視圖，給 SpatialGrid / check_collision 使用"""
+    __slots__ = ("store", "i")
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    x = property(lambda self: float(self.store.x[self.i]))
+    y = property(lambda self: float(self.store.y[self.i]))
+    size = property(lambda self: float(self.store.size[self.i]))
+
+class SkillStore:
+    FIELDS = (
+        ("x", np.float64), ("y", np.float64), ("size", np.float64), ("angle", np.float64),
+        ("damage", np.float64), ("durability", np.int32), ("expire_tick", np.int64), ("next_hit_tick", np.int64),
+    )
+
+    def __init__(self, capacity=16):
+        self.n = 0
+        self.capacity = capacity
+        for name, dtype in self.FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+        self.ids = []    # 實體 id (快照用)
+        self.owners = [] # 施放者 sid
+        self.skins = []  # 施放者的外觀
+
+    def __len__(self):
+        return self.n
+
+    def _grow(self):
+        self.capacity *= 2
+        for name, dtype in self.FIELDS:
+            old = getattr(self, name)
+            arr = np.zeros(self.capacity, dtype=dtype)
+            arr[:self.n] = old[:self.n]
+            setattr(self, name, arr)
+
+    def add(self, skill_id, owner, skin, tick):
+        """施放一個技能；起始角度錯開，同一位玩家的技能不會疊在一起 (座標在下一次 update 算出)"""
+        if self.n == self.capacity:
+            self._grow()
+        i = self.n
+        self.angle[i] = self.owners.count(owner) * 2 * math.pi / MAX_SKILLS_PER_PLAYER
+        self.size[i] = SKILL_SIZE
+        self.damage[i] = SKILL_DAMAGE
+        self.durability[i] = SKILL_DURABILITY
+        self.expire_tick[i] = tick + SKILL_DURATION_TICKS
+        self.next_hit_tick[i] = tick
+        self.ids.append(skill_id)
+        self.owners.append(owner)
+        self.skins.append(skin)
+        self.n += 1
+
+    def update(self, players, tick):
+        """全部技能繞施放者轉一步；到期、耐久歸零或施放者已離開的技能移除"""
+        n = self.n
+        if n == 0: return
+        owners = [players.get(sid) for sid in self.owners]
+        present = np.fromiter((p is not None for p in owners), dtype=bool, count=n)
+        ox = np.fromiter((p.x if p is not None else 0.0 for p in owners), dtype=np.float64, count=n)
+        oy = np.fromiter((p.y if p is not None else 0.0 for p in owners), dtype=np.float64, count=n)
+        angle = self.angle[:n]
+        angle += SKILL_ORBIT_SPEED
+        half = self.size[:n] / 2
+        self.x[:n] = ox + PLAYER_HALF + np.cos(angle) * SKILL_ORBIT_RADIUS - half
+        self.y[:n] = oy + PLAYER_HALF + np.sin(angle) * SKILL_ORBIT_RADIUS - half
+        self.compact(present & (self.expire_tick[:n] > tick) & (self.durability[:n] > 0))
+
+    def compact(self, keep):
+        """批次 swap-remove (同 BulletStore.compact)"""
+        n = self.n
+        new_n = int(np.count_nonzero(keep))
+        if new_n == n: return
+        holes = np.flatnonzero(~keep[:new_n])
+        fillers = np.flatnonzero(keep[new_n:n]) + new_n
+        for name, _ in self.FIELDS:
+            arr = getattr(self, name)
+            arr[holes] = arr[fillers]
+        for column in (self.ids, self.owners, self.skins):
+            for h, f in zip(holes.tolist(), fillers.tolist()):
+                column[h] = column[f]
+            del column[new_n:]
+        self.n = new_n
+
+    def ready(self, tick):
+        """本 tick 可以撞怪的技能索引 (撞怪有間隔，耐久已歸零的略過)"""
+        n = self.n
+        return np.flatnonzero((self.next_hit_tick[:n] <= tick) & (self.durability[:n] > 0))
+
+    def hit_enemy(self, i, tick):
+        """撞到敵人：扣耐久並進入間隔，回傳造成的傷害"""
+        self.durability[i] -= 1
+        self.next_hit_tick[i] = tick + SKILL_HIT_INTERVAL
+        return float(self.damage[i])
+
+    def block(self, i):
+        """擋下一顆敵方子彈；耐久已歸零 (本 tick 稍早用完) 時回傳 False"""
+        if self.durability[i] <= 0: return False
+        self.durability[i] -= 1
+        return True
+
+    def ref(self, i):
+        return SkillRef(self, i)
@@ -0,0 +1,144 @@
+# spatial.py
+# 均勻網格 Broadphase：每個 tick 重建一次，只挑出「可能」相撞的候選者，
+# 精確判定仍交給 utils.check_collision (含 0.8 半徑係數)，結果與逐一比對完全相同
+import math
+import numpy as np
+from config import MAP_WIDTH, MAP_HEIGHT, GRID_CELL_SIZE
+
+class SpatialGrid:
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cols = max(1, math.ceil(width / cell_size))
+        self.rows = max(1, math.ceil(height / cell_size))
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+        self.entries = []
+
+    def clear(self):
+        for cell in self.cells:
+            cell.clear()
+        self.entries.clear()
+
+    def _span(self, pos, diameter, limit):
+        # 地圖外的物件夾到邊緣格子，重疊關係不會因此遺失
+        lo = int(pos // self.cell_size)
+        hi = int((pos + diameter) // self.cell_size)
+        return max(0, min(limit - 1, lo)), max(0, min(limit - 1, hi))
+
+    def insert(self, entry, obj, r_override=None):
+        """以 check_collision 的圓心/半徑定義計算外接框並登記到涵蓋的格子"""
+        r = r_override if r_override is not None else obj.size / 2
+        c0, c1 = self._span(obj.x, r * 2, self.cols)
+        r0, r1 = self._span(obj.y, r * 2, self.rows)
+        idx = len(self.entries)
+        self.entries.append(entry)
+        for row in range(r0, r1 + 1):
+            base = row * self.cols
+            for col in range(c0, c1 + 1):
+                self.cells[base + col].append(idx)
+
+    def occupancy(self):
+        """每個格子是否有物件 (扁平化 bool 陣列，給 NumPy 批次前置篩選用)"""
+        return np.fromiter((bool(cell) for cell in self.cells), dtype=bool, count=len(self.cells))
+
+    def query(self, obj, r_override=None):
+        """回傳外接框重疊的候選 entry，依插入順序排列 (與原本 dict 迭代順序一致)"""
+        r = r_override if r_override is not None else obj.size / 2
+        c0, c1 = self._span(obj.x, r * 2, self.cols)
+        r0, r1 = self._span(obj.y, r * 2, self.rows)
+        entries = self.entries
+        if c0 == c1 and r0 == r1:
+            return [entries[i] for i in self.cells[r0 * self.cols + c0]]
+
+        found = set()
+        for row in range(r0, r1 + 1):
+            base = row * self.cols
+            for col in range(c0, c1 + 1):
+                found.update(self.cells[base + col])
+        return [entries[i] for i in sorted(found)]
+
+POINT_SCAN_LIMIT = 32 # 點數不超過這個值時 nearest 不走網格，直接全部比較
+
+class PointIndex:
+    """點的均勻網格：依格子排序的 CSR 排列 (每格的點連續存放)，支援 k 近鄰與半徑查詢。
+    每個 tick 用 build() 整批重建 (排序用 NumPy)；單次查詢只看附近幾格的少數點，
+    逐一比較比 NumPy 的呼叫成本低，從所在格子往外擴大範圍，確定範圍外不可能更近才停止"""
+    def __init__(self, width=MAP_WIDTH, height=MAP_HEIGHT, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cols = max(1, math.ceil(width / cell_size))
+        self.rows = max(1, math.ceil(height / cell_size))
+        self.build([], [], [])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _cell(self, x, y):
+        cs = self.cell_size
+        return (min(self.cols - 1, max(0, int(x // cs))), min(self.rows - 1, max(0, int(y // cs))))
+
+    def build(self, ids, xs, ys):
+        """ids 為整數 id，(xs, ys) 為點座標；地圖外的點歸到邊緣格子"""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        cs = self.cell_size
+        cols = np.clip(xs // cs, 0, self.cols - 1).astype(np.intp)
+        rows = np.clip(ys // cs, 0, self.rows - 1).astype(np.intp)
+        cells = rows * self.cols + cols
+        order = np.argsort(cells, kind="stable")
+        self.ids = np.asarray(ids, dtype=np.int64)[order].tolist()
+        self.x, self.y = xs[order].tolist(), ys[order].tolist()
+        self.starts = np.searchsorted(cells[order], np.arange(self.cols * self.rows + 1)).tolist()
+        self.alive = [True] * len(self.ids)
+        self.slots = dict(zip(self.ids, range(len(self.ids))))
+
+    def discard(self, id_):
+        """本 tick 內移除 (例如已被擊殺)，之後的查詢不再回傳"""
+        slot = self.slots.get(id_)
+        if slot is not None:
+            self.alive[slot] = False
+
+    def position(self, id_):
+        slot = self.slots[id_]
+        return self.x[slot], self.y[slot]
+
+    def _spans(self, c0, c1, r0, r1):
+        # 同一列相鄰的格子在 CSR 中是連續的一段
+        starts, cols = self.starts, self.cols
+        return [(starts[row * cols + c0], starts[row * cols + c1 + 1]) for row in range(r0, r1 + 1)]
+
+    def _select(self, spans, x, y, radius, k, exclude):
+        ids, xs, ys, alive = self.ids, self.x, self.y, self.alive
+        limit = radius * radius
+        found = []
+        for lo, hi in spans:
+            for j in range(lo, hi):
+                if not alive[j] or ids[j] in exclude: continue
+                d2 = (xs[j] - x) ** 2 + (ys[j] - y) ** 2
+                if d2 <= limit:
+                    found.append((d2, j))
+        # 距離相同時依排列順序，結果只取決於 build 的輸入 (重播一致)
+        found.sort()
+        return [ids[j] for _, j in found[:k]]
+
+    def within(self, x, y, radius, exclude=()):
+        """距離 radius 以內的 id，由近到遠"""
+        c0, r0 = self._cell(x - radius, y - radius)
+        c1, r1 = self._cell(x + radius, y + radius)
+        return self._select(self._spans(c0, c1, r0, r1), x, y, radius, len(self.ids), exclude)
+
+    def nearest(self, x, y, k=1, radius=math.inf, exclude=()):
+        """最近的 k 個 id (由近到遠，最遠不超過 radius)；exclude 內的 id 略過"""
+        if len(self.ids) <= POINT_SCAN_LIMIT:
+            return self._select([(0, len(self.ids))], x, y, radius, k, exclude)
+        cs = self.cell_size
+        col, row = self._cell(x, y)
+        reach = 1
+        while True:
+            c0, c1 = max(0, col - reach), min(self.cols - 1, col + reach)
+            r0, r1 = max(0, row - reach), min(self.rows - 1, row + reach)
+            # 已搜尋矩形到未搜尋區域的最短距離 (貼齊地圖邊緣的那一側外面沒有點)
+            safe = min([x - c0 * cs] * (c0 > 0) + [(c1 + 1) * cs - x] * (c1 < self.cols - 1) +
+                       [y - r0 * cs] * (r0 > 0) + [(r1 + 1) * cs - y] * (r1 < self.rows - 1), default=math.inf)
+            found = self._select(self._spans(c0, c1, r0, r1), x, y, min(radius, safe), k, exclude)
+            if len(found) >= k or safe >= radius:
+                return found
+            reach *= 2
@@ -1,6 +1,23 @@
 # utils.py
 import math
 import time
+import numpy as np
+from protocol import quantize, ICON_CODES, ITEM_CODES
+from bullets import OWNER_PLAYER
+from interest import OWNER_HOSTILE, OWNER_ORPHAN
+
+class SimClock:
+    """模擬時鐘：以整數 tick 計時，秒數由 tick 推得，與牆上時間無關"""
+    def __init__(self, fps):
+        self.fps = fps
+        self.tick = 0
+
+    @property
+    def now(self):
+        return self.tick / self.fps
+
+    def advance(self):
+        self.tick += 1
 
 def check_collision(obj1, obj2, r1_override=None, r2_override=None):
     # 支援字典或物件屬性存取
@@ -30,40 +47,47 @@ def get_distance(obj1, obj2):
     return math.sqrt((x1-x2)**2 + (y1-y2)**2)
 
 def compress_state(state):
-    # 將複雜的物件轉為前端需要的精簡 JSON
-    compressed = {
-        "players": {}, "enemies": {}, "bullets": [], 
-        "items": [], "skill_objects": [], "w": state["warning_active"]
+    # 將複雜的物件轉為以實體 id 為 key 的精簡 frame：(只送一次的 meta, 每 tick 比對的 state)
+    # 實際的二進位 keyframe / delta 編碼在 protocol.py
+    q = quantize
+    frame = {
+        "players": {}, "enemies": {}, "items": {}, "skills": {},
+        "w": state["warning_active"]
     }
-    
+
     for pid, p in state["players"].items():
-        compressed["players"][pid] = {
-            "x": int(p.x), "y": int(p.y), "skin": p.skin, "name": p.name,
-            "hp": max(0, int(p.hp)), "max_hp": int(p.max_hp), "score": int(p.score),
-            "charge": p.charge, "c": p.color,
-            "invincible": p.is_invincible(),
-            "w_icon": p.weapon_icon # 用於前端顯示 FIRE 鍵圖騰
-        }
-    
+        frame["players"][p.nid] = (
+            (pid, p.name, p.color, p.skin),
+            (q(p.x), q(p.y), max(0, int(p.hp)), int(p.max_hp), int(p.score),
+             p.charge, p.hit_accumulated, int(p.is_invincible()),
+             ICON_CODES.get(p.weapon_icon, 0)) # 用於前端顯示 FIRE 鍵圖騰
+        )
+
     for eid, e in state["enemies"].items():
-        compressed["enemies"][eid] = {
-            "x": int(e.x), "y": int(e.y), "type": e.type,
-            "size": e.size, "hp": max(0, int(e.hp)), "max_hp": int(e.max_hp)
-        }
-        
-    for b in state["bullets"]:
-        compressed["bullets"].append({
-            "x": int(b.x), "y": int(b.y), "owner": b.owner_type, 
-            "c": getattr(b, 'color', None), "s": int(b.size)
-        })
-        
+        frame["enemies"][e.id] = ((e.type, e.size, int(e.max_hp)), (q(e.x), q(e.y), max(0, int(e.hp))))
+
     for i in state["items"]:
-        compressed["items"].append({
-            "x": int(i.x), "y": int(i.y), "type": i.item_type
-        })
+        frame["items"][i.id] = ((ITEM_CODES[i.item_type],), (q(i.x), q(i.y)))
 
-    # Skill Objects (保留原本邏輯)
-    for s in state["skill_objects"]:
-         compressed["skill_objects"].append({"x": int(s["x"]), "y": int(s["y"]), "skin": s["skin"]})
+    skills = state["skills"]
+    for sid, x, y, skin in zip(skills.ids, skills.x[:skills.n].tolist(), skills.y[:skills.n].tolist(), skills.skins):
+        frame["skills"][sid] = ((skin,), (q(x), q(y)))
 
-    return compressed
+    # 子彈為 BulletStore (SoA)，直接整批量化成打包陣列
+    store = state["bullets"]
+    n = store.n
+    frame["bullets"] = (
+        store.bid[:n].copy(),
+        np.clip(store.x[:n], -32768, 32767).astype(np.int16),
+        np.clip(store.y[:n], -32768, 32767).astype(np.int16),
+        store.style[:n].astype(np.uint8),
+        np.clip(np.rint(store.dx[:n]), -127, 127).astype(np.int8),
+        np.clip(np.rint(store.dy[:n]), -127, 127).astype(np.int8),
+    )
+    # 每顆子彈的發射者 (玩家 nid / 敵方 / 孤兒)，給 interest.filter_frame 判斷優先序，不會被編碼
+    owner_nids = {pid: p.nid for pid, p in state["players"].items()}
+    owner = np.fromiter((owner_nids.get(o, OWNER_ORPHAN) for o in store.owner_id), dtype=np.int64, count=n)
+    owner[store.owner_type[:n] != OWNER_PLAYER] = OWNER_HOSTILE
+    frame["bullet_owner"] = owner
+    frame["styles"] = list(store.styles)
+    return frame
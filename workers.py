@@ -0,0 +1,425 @@
+# workers.py
+# 多行程房間模擬：房間的 tick 在 worker 行程中執行，ASGI/socket.io 前端行程只透過
+# multiprocessing Pipe 轉送 move/shoot/use_skill 輸入與編碼好的封包。單機即可用滿多核心，不需外部 broker
+import asyncio
+import multiprocessing as mp
+import os
+import threading
+import time
+import traceback
+
+from config import SIM_FPS, METRICS_ENABLED, CONFIG_HOT_RELOAD, CONFIG_RELOAD_INTERVAL, ROOM_STATE_DIR
+from rooms import Room, LoopTimer
+from metrics import METRICS
+from overload import OverloadController, REJECT_JOINS
+import archetypes
+import replay
+import roomstate
+
+# 每次最多先處理多少筆輸入再回頭檢查 tick，避免輸入洪水把模擬餓死
+MAX_INPUTS_PER_POLL = 256
+# worker 每隔幾秒把量測快照送回前端
+METRICS_INTERVAL = 1.0
+# 部署交接時等 worker 回傳房間快照的秒數
+HAND_OFF_TIMEOUT = 2.0
+# worker 當掉後的重啟間隔：從 WORKER_RESTART_DELAY 起每次加倍，最多 WORKER_RESTART_MAX_DELAY 秒
+WORKER_RESTART_DELAY = 0.5
+WORKER_RESTART_MAX_DELAY = 30.0
+# WORKER_CRASH_WINDOW 秒內當掉超過 WORKER_CRASH_BUDGET 次：放棄該槽位的房間 (存檔可能就是當掉的原因)，玩家斷線
+WORKER_CRASH_WINDOW = 300.0
+WORKER_CRASH_BUDGET = 5
+
+def _open_room(room, rooms, timers, fps):
+    rooms[room.id] = replay.attach(room)
+    metrics = METRICS if METRICS_ENABLED else None
+    room.profiler = metrics
+    timers[room.id] = LoopTimer(fps, metrics=metrics)
+    return room
+
+def _handle_message(msg, rooms, timers, fps, conn):
+    """處理前端送來的一筆訊息；回傳 False 代表要結束 worker"""
+    op, room_id, *args = msg
+    if op == "stop":
+        return False
+    room = rooms.get(room_id)
+    if op == "join":
+        if room is None:
+            room = _open_room(Room(room_id), rooms, timers, fps)
+        room.join(*args)
+    elif op == "restore":
+        blob, online = args
+        room = _open_room(roomstate.load_room(blob), rooms, timers, fps)
+        for sid in online: # 仍在線上的玩家直接接回 (新的 encoder，從關鍵幀開始)
+            room.rebind(sid, sid)
+    elif op == "hand_off":
+        # 取快照後立刻停止模擬，中間不會再跑任何 tick；房間已交出則回傳 None
+        conn.send(("room_state", room_id, roomstate.dump_room(room) if room is not None else None))
+        if room is not None:
+            rooms.pop(room_id).close()
+            del timers[room_id]
+            METRICS.forget_room(room_id)
+    elif room is None:
+        pass # 房間已關閉，丟棄遲到的輸入
+    elif op == "leave":
+        room.leave(*args)
+    elif op == "move":
+        room.move(*args)
+    elif op == "shoot":
+        room.shoot(*args)
+    elif op == "use_skill":
+        room.use_skill(*args)
+    elif op == "resync":
+        room.resync(*args)
+    elif op == "set_send_every":
+        room.set_send_every(*args)
+    elif op == "suspend":
+        room.suspend(*args)
+    elif op == "rebind":
+        room.rebind(*args)
+    elif op == "close":
+        rooms.pop(room_id).close()
+        del timers[room_id]
+        METRICS.forget_room(room_id)
+        roomstate.discard(ROOM_STATE_DIR, room_id)
+    return True
+
+def worker_main(conn, fps):
+    """worker 行程進入點：自行排程所有房間的 tick，輸出各玩家的封包 (含音效事件) 與分數變動回前端"""
+    rooms = {}
+    timers = {}
+    next_metrics = time.time() + METRICS_INTERVAL
+    next_reload = time.time() + CONFIG_RELOAD_INTERVAL
+    # 同一個 worker 的房間共用一條執行緒，一起降級；等級變動時告知前端 (決定是否拒絕新玩家)
+    overload = OverloadController(METRICS if METRICS_ENABLED else None, f"room-worker pid {os.getpid()}")
+    reported_level = 0
+    try:
+        conn.send(("ready", None)) # 模組載入完成 (spawn 啟動要 1~2 秒)
+        while True:
+            now = time.time()
+            if METRICS_ENABLED and now >= next_metrics:
+                conn.send(("metrics", None, METRICS.export()))
+                next_metrics = now + METRICS_INTERVAL
+            if CONFIG_HOT_RELOAD and now >= next_reload:
+                archetypes.log_reload(f"room-worker pid {os.getpid()}")
+                next_reload = now + CONFIG_RELOAD_INTERVAL
+            next_due = min((t.next_tick for t in timers.values()), default=now + 0.5)
+            next_due = min(next_due, next_metrics) if METRICS_ENABLED else next_due
+            if conn.poll(max(0.0, next_due - now)):
+                for _ in range(MAX_INPUTS_PER_POLL):
+                    msg = conn.recv()
+                    try:
+                        if not _handle_message(msg, rooms, timers, fps, conn): return
+                    except (EOFError, OSError):
+                        raise
+                    except Exception: # 處理失敗的訊息只記錄下來，不拖垮整個 worker
+                        print(f"[room-worker pid {os.getpid()}] {msg[0]} {msg[1]}: failed")
+                        traceback.print_exc()
+                    if not conn.poll(0): break
+
+            now = time.time()
+            for room_id, timer in list(timers.items()):
+                if now < timer.next_tick: continue
+                room = rooms[room_id]
+                started = time.perf_counter()
+                steps = timer.consume()
+                try:
+                    room.set_shed_level(overload.level)
+                    for _ in range(steps):
+                        room.update()
+                    roomstate.checkpoint(room, ROOM_STATE_DIR)
+                    if room.snapshot_due():
+                        packets = room.snapshot()
+                        if METRICS_ENABLED: METRICS.observe_room(room)
+                        # 附上送出時間 (前端據此量測佇列延遲) 與變動的分數 (交給前端行程的排行榜)
+                        conn.send(("tick", room_id, packets, time.time(), room.drain_scores()))
+                except (EOFError, OSError):
+                    raise # 前端行程已關閉
+                except Exception:
+                    # 單一房間的 tick 出錯只記錄下來，不能讓 worker 結束 (同一個 worker 的房間會全部回到存檔)
+                    print(f"[room-worker pid {os.getpid()}] {room_id}: tick failed")
+                    traceback.print_exc()
+                overload.observe(time.perf_counter() - started, steps)
+            if not timers: overload.poll()
+            if overload.level != reported_level:
+                reported_level = overload.level
+                conn.send(("overload", None, reported_level))
+    except (EOFError, OSError, KeyboardInterrupt):
+        pass # 前端行程已關閉
+    finally:
+        # 停機前存下所有房間，重新啟動後還原 (見 roomstate.py)
+        for room in rooms.values():
+            roomstate.checkpoint(room, ROOM_STATE_DIR, force=True)
+            room.close()
+        roomstate.flush()
+        replay.shutdown()
+
+class RemoteRoom:
+    """前端行程中的房間代理，介面與 rooms.Room 的玩家操作相同"""
+    def __init__(self, room_id, worker):
+        self.id = room_id
+        self.worker = worker
+        self.sids = {} # sid -> name，worker 重啟時用來重新加入
+        self.sessions = {} # sid -> 重連 token
+        self.suspended = set() # 斷線中等待重連的 sid
+        self.lost = set() # worker 當掉時沒有存檔可還原的斷線玩家：角色已不存在，重連時重新加入
+        self.task = None
+
+    @property
+    def player_count(self):
+        return len(self.sids)
+
+    def join(self, sid, name, token=None):
+        self.sids[sid] = name
+        self.sessions[sid] = token
+        self.worker.send(("join", self.id, sid, name, token))
+
+    def leave(self, sid):
+        self.sids.pop(sid, None)
+        self.sessions.pop(sid, None)
+        self.suspended.discard(sid)
+        self.lost.discard(sid)
+        self.worker.send(("leave", self.id, sid))
+
+    def suspend(self, sid):
+        self.suspended.add(sid)
+        self.worker.send(("suspend", self.id, sid))
+
+    def rebind(self, old_sid, new_sid):
+        name = self.sids[new_sid] = self.sids.pop(old_sid)
+        token = self.sessions[new_sid] = self.sessions.pop(old_sid, None)
+        self.suspended.discard(old_sid)
+        if old_sid in self.lost:
+            self.lost.discard(old_sid)
+            self.worker.send(("join", self.id, new_sid, name, token))
+        else:
+            self.worker.send(("rebind", self.id, old_sid, new_sid))
+
+    def move(self, sid, data):
+        self.worker.send(("move", self.id, sid, data))
+
+    def shoot(self, sid):
+        self.worker.send(("shoot", self.id, sid))
+
+    def use_skill(self, sid):
+        self.worker.send(("use_skill", self.id, sid))
+
+    def resync(self, sid):
+        self.worker.send(("resync", self.id, sid))
+
+    def set_send_every(self, sid, every):
+        self.worker.send(("set_send_every", self.id, sid, every))
+
+    def close(self):
+        self.worker.rooms.pop(self.id, None)
+        self.worker.send(("close", self.id))
+
+    async def hand_off(self):
+        """部署交接：worker 取快照並停止模擬，回傳快照 (worker 沒有回應時為 None)"""
+        self.worker.rooms.pop(self.id, None)
+        return await self.worker.pool.request_state(self)
+
+class WorkerHandle:
+    def __init__(self, pool, index):
+        self.pool = pool
+        self.index = index
+        self.rooms = {}
+        self.process = None
+        self.conn = None
+        self.metrics = None # worker 最近一次回報的 Metrics.export()
+        self.ready = None # asyncio.Event：worker 行程已可處理訊息
+        self.shed_level = 0 # worker 回報的過載降級等級
+        self.crashes = [] # 最近 WORKER_CRASH_WINDOW 秒內當掉的時間 (time.monotonic())
+
+    @property
+    def load(self):
+        return sum(room.player_count for room in self.rooms.values())
+
+    def start(self):
+        self.ready = asyncio.Event()
+        self.shed_level = 0
+        parent_conn, child_conn = self.pool.ctx.Pipe()
+        self.process = self.pool.ctx.Process(
+            target=worker_main, args=(child_conn, self.pool.fps),
+            name=f"room-worker-{self.index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        threading.Thread(target=self._reader, args=(parent_conn,), daemon=True).start()
+
+    def send(self, msg):
+        try:
+            self.conn.send(msg)
+        except (OSError, ValueError):
+            pass # worker 已掛掉，由 reader 執行緒觸發重啟
+
+    def _reader(self, conn):
+        loop = self.pool.loop
+        try:
+            while True:
+                msg = conn.recv()
+                if msg[0] == "metrics":
+                    self.metrics = msg[2] # 只保留最新的一份，不需經過事件迴圈
+                    continue
+                if msg[0] == "overload":
+                    self.shed_level = msg[2]
+                    continue
+                if msg[0] == "ready":
+                    loop.call_soon_threadsafe(self.ready.set)
+                    continue
+                loop.call_soon_threadsafe(self.pool.queue.put_nowait, msg)
+        except (EOFError, OSError):
+            loop.call_soon_threadsafe(self.pool.on_worker_exit, self, conn)
+
+class WorkerPool:
+    """管理 worker 行程、依負載放置房間，並把 worker 的輸出交給各玩家的送出佇列 (send = Outbox.push)"""
+    def __init__(self, size, send, fps=SIM_FPS, metrics=None, on_scores=None, on_rooms_lost=None):
+        self.size = size
+        self.send = send
+        self.on_scores = on_scores # [(名字, 分數)] -> None，轉給 leaderboard.Leaderboard.submit
+        self.on_rooms_lost = on_rooms_lost # [RemoteRoom] -> None，worker 一直當掉而放棄的房間 (前端讓玩家斷線)
+        self.fps = fps
+        self.metrics = metrics # 前端行程的 Metrics，記錄發送延遲與位元組數
+        self.ctx = mp.get_context("spawn")
+        self.workers = [WorkerHandle(self, i) for i in range(size)]
+        self.loop = None
+        self.queue = None
+        self.relay_task = None
+        self.stopping = False
+        self.pending_states = {} # room_id -> 等待 worker 回傳房間快照的 Future
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        for worker in self.workers:
+            worker.start()
+        self.relay_task = asyncio.create_task(self._relay())
+
+    async def wait_ready(self, timeout=10.0):
+        """等所有 worker 啟動完成 (部署交接前呼叫，避免接手的房間在 worker 啟動期間停擺)"""
+        await asyncio.wait_for(asyncio.gather(*(w.ready.wait() for w in self.workers)), timeout)
+
+    def stop(self):
+        self.stopping = True
+        for worker in self.workers:
+            worker.send(("stop", None))
+        for worker in self.workers:
+            if worker.process is None: continue # 等待重啟中
+            worker.process.join(timeout=1)
+            if worker.process.is_alive():
+                worker.process.terminate()
+        if self.relay_task:
+            self.relay_task.cancel()
+
+    def create_room(self, room_id):
+        """放到目前玩家最少 (同分時房間最少) 的 worker，等待重啟或正在拒絕新玩家的 worker 排最後"""
+        worker = min(self.workers, key=lambda w: (w.process is None, w.shed_level >= REJECT_JOINS, w.load, len(w.rooms)))
+        room = RemoteRoom(room_id, worker)
+        worker.rooms[room_id] = room
+        return room
+
+    def restore_room(self, meta, blob):
+        """接手 roomstate 快照：放到負載最低的 worker，回傳房間代理"""
+        worker = min(self.workers, key=lambda w: (w.process is None, w.load, len(w.rooms)))
+        room = RemoteRoom(meta["room_id"], worker)
+        for token, sid, name in meta["players"]:
+            room.sids[sid] = name
+            room.sessions[sid] = token
+            room.suspended.add(sid) # 還原的玩家都視為斷線中
+        worker.rooms[room.id] = room
+        worker.send(("restore", room.id, blob, []))
+        return room
+
+    async def request_state(self, room):
+        future = self.pending_states[room.id] = self.loop.create_future()
+        room.worker.send(("hand_off", room.id))
+        try:
+            return await asyncio.wait_for(future, HAND_OFF_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self.pending_states.pop(room.id, None)
+
+    def rejecting(self):
+        """所有 worker 都過載到拒絕新玩家"""
+        return all(w.shed_level >= REJECT_JOINS for w in self.workers)
+
+    def on_worker_exit(self, worker, conn):
+        if self.stopping or conn is not worker.conn:
+            return
+        # worker 當掉：等一段時間 (連續當掉時加倍) 後重啟同一個槽位，房間從 ROOM_STATE_DIR 最近的存檔還原
+        worker.process.join(timeout=0.1)
+        exitcode = worker.process.exitcode
+        worker.process = None # 等待重啟中，不放新房間
+        now = time.monotonic()
+        worker.crashes = [t for t in worker.crashes if now - t < WORKER_CRASH_WINDOW] + [now]
+        if len(worker.crashes) > WORKER_CRASH_BUDGET:
+            # 一直當掉 (設定檔壞掉、房間狀態會觸發錯誤...)：放棄這個槽位的房間，之後以最長間隔重啟空的 worker
+            lost = list(worker.rooms.values())
+            worker.rooms.clear()
+            worker.crashes.clear()
+            delay = WORKER_RESTART_MAX_DELAY
+            for room in lost:
+                roomstate.discard(ROOM_STATE_DIR, room.id)
+            print(f"[workers] room-worker-{worker.index} exited ({exitcode}), crash budget exhausted: "
+                  f"dropping {len(lost)} rooms, restarting in {delay:.1f}s")
+            if lost and self.on_rooms_lost is not None:
+                self.on_rooms_lost(lost)
+        else:
+            delay = min(WORKER_RESTART_MAX_DELAY, WORKER_RESTART_DELAY * 2 ** (len(worker.crashes) - 1))
+            print(f"[workers] room-worker-{worker.index} exited ({exitcode}), restarting in {delay:.1f}s")
+        self.loop.call_later(delay, self._restart, worker)
+
+    def _restart(self, worker):
+        if self.stopping: return
+        worker.start()
+        for room in worker.rooms.values():
+            self._recover(worker, room)
+
+    def _recover(self, worker, room):
+        """在重啟的 worker 上重建房間：有存檔就還原並補上存檔之後的加入/離開/重連，沒有存檔才讓玩家重新加入；
+        斷線中的玩家不重建角色 (存檔裡有的保持斷線，沒有的等重連時再加入)"""
+        saved = roomstate.load(ROOM_STATE_DIR, room.id)
+        kept = set()
+        if saved is not None:
+            meta, blob = saved
+            kept = {sid for _, sid, _ in meta["players"]}
+            online = [sid for sid in room.sids if sid in kept and sid not in room.suspended]
+            worker.send(("restore", room.id, blob, online))
+            by_token = {token: sid for sid, token in room.sessions.items() if token is not None and sid not in kept}
+            for token, sid, _ in meta["players"]:
+                if sid in room.sids: continue
+                new_sid = by_token.pop(token, None) if token is not None else None
+                if new_sid is None: # 存檔之後離開的玩家
+                    worker.send(("leave", room.id, sid))
+                    continue
+                # 存檔之後重連過 (sid 已改變)
+                kept.add(new_sid)
+                worker.send(("rebind", room.id, sid, new_sid))
+                if new_sid in room.suspended: worker.send(("suspend", room.id, new_sid))
+            print(f"[workers] {room.id} restored from checkpoint at tick {meta['tick']}")
+        for sid, name in room.sids.items():
+            if sid in kept: continue
+            if sid in room.suspended:
+                room.lost.add(sid)
+            else:
+                worker.send(("join", room.id, sid, name, room.sessions.get(sid)))
+
+    async def _relay(self):
+        while True:
+            msg = await self.queue.get()
+            if msg[0] == "tick":
+                _, room_id, packets, sent_at, scores = msg
+                if scores and self.on_scores is not None:
+                    self.on_scores(scores)
+                for sid, packet in packets:
+                    self.send(sid, packet)
+                if self.metrics is not None:
+                    self.metrics.emitted(time.time() - sent_at, sum(len(packet) for _, packet in packets))
+            elif msg[0] == "room_state":
+                future = self.pending_states.get(msg[1])
+                if future is not None and not future.done():
+                    future.set_result(msg[2])
+
+    def metric_sources(self):
+        """給 metrics.render 的 (labels, 資料) 清單，每個 worker 一組"""
+        return [({"worker": str(w.index)}, w.metrics) for w in self.workers if w.metrics is not None]